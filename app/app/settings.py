@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
@@ -47,14 +48,39 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.PathScopedMiddleware',
+]
+
+# Middleware for the admin and other browser pages, skipped by requests
+# to the LEAN_PATHS prefixes, see core.middleware.PathScopedMiddleware
+SITE_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+LEAN_PATHS = ['/api/', '/health/', '/media/']
+
+# The admin finds its middleware in SITE_MIDDLEWARE instead
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
+# Responses of at least MIN_SIZE bytes under the LEAN_PATHS prefixes are
+# compressed with brotli, when installed, or gzip. Higher levels trade CPU for bandwidth. CACHE_BYTES
+# bounds the compressed bodies kept per process, see
+# core.middleware.CompressionMiddleware
+COMPRESSION = {
+    'MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    'GZIP_LEVEL': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    'BROTLI_QUALITY': int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4)),
+    'CACHE_BYTES': int(
+        os.environ.get('COMPRESSION_CACHE_BYTES', 16 * 1024 * 1024)
+    ),
+}
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -81,15 +107,104 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USERNAME'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': '5432',
+        # Connections go back to the pool at the end of each request
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'CHECK_INTERVAL': int(os.environ.get('DB_POOL_CHECK_INTERVAL', 30)),
+        },
+        # Server-side prepared statements per connection, 0 disables them
+        'PREPARE': {
+            'MAX_STATEMENTS': int(os.environ.get('DB_PREPARED_STATEMENTS', 0)),
+            'THRESHOLD': int(os.environ.get('DB_PREPARE_THRESHOLD', 2)),
+        },
     }
 }
 
+# Read replicas used for safe API reads, see core.db.routers.ReplicaRouter
+DATABASE_REPLICAS = []
+
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+
+# Databases holding user data, see core.db.sharding. Extra shards are
+# given as a comma separated list of hosts sharing the default credentials.
+# Each has a test database of its own, so tests can list the default host
+# as a shard, as CI does.
+DATABASE_SHARDS = ['default']
+
+for number, host in enumerate(
+        filter(None, os.environ.get('DB_SHARD_HOSTS', '').split(',')), 1):
+    DATABASES[f'shard{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'NAME': f'test_{os.environ.get("DB_NAME")}_shard{number}'},
+    }
+    DATABASE_SHARDS.append(f'shard{number}')
+
+DATABASE_ROUTERS = [
+    'core.db.routers.ShardRouter',
+    'core.db.routers.ReplicaRouter',
+]
+
+# Seconds the change feed holds back rows for, to cover the time between
+# a row being stamped and written, see recipe.sync.horizon
+SYNC_COMMIT_MARGIN = float(os.environ.get('SYNC_COMMIT_MARGIN', 1))
+
+# Seconds a user's reads stay on the primary after they write
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+# Seconds move_user_shard lets writes already under way finish before it
+# copies a user's data, at least the worker timeout of the serve command
+SHARD_MOVE_DRAIN_SECONDS = int(os.environ.get('WEB_TIMEOUT', 30))
+
+# The cache holds state every worker must agree on: the shard directory,
+# read-your-writes pins and the versions of the per-user indexes. By
+# default it is shared by the processes of a host. Point CACHE_BACKEND and
+# CACHE_LOCATION at memcached or redis when serving from several hosts.
+#
+# Each active user takes up to 5 entries: a shard directory entry, a pin
+# and 3 index versions. Once over MAX_ENTRIES the local backends drop a
+# random third of the keys, pins included, breaking read-your-writes, so
+# keep CACHE_MAX_ENTRIES above 5 times the users active in a day, the
+# time index versions are kept.
+# The file backend lists its directory on every write, so past some tens
+# of thousands of active users use memcached or redis, sized to hold them
+# all without evicting.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', '/vol/web/cache'),
+    }
+}
+
+# memcached and redis pass OPTIONS on to their clients
+if not os.environ.get('CACHE_BACKEND'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 50000)),
+    }
+
+# Directory of the lock files coalescing identical reads between the
+# processes of a host, see core.singleflight. Unset, reads are only
+# coalesced between the threads of a process.
+SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR') or None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -131,6 +246,41 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# How media files are handed to the front-end server once access is
+# checked: 'x-accel-redirect' (nginx, with an internal location at
+# MEDIA_INTERNAL_URL aliasing MEDIA_ROOT), 'x-sendfile' (Apache), or
+# unset to stream them from Django. See core.media
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+MEDIA_INTERNAL_URL = '/protected-media/'
+
+# Widths and formats recipe images can be resized to, the size cap of the
+# rendered variants kept under MEDIA_ROOT, and how often each process
+# rescans them for the size cap, see recipe.images
+IMAGE_VARIANTS = {
+    'WIDTHS': [160, 320, 640, 1280],
+    'FORMATS': ['jpeg', 'webp', 'png'],
+    'CACHE_BYTES': int(
+        os.environ.get('IMAGE_VARIANTS_CACHE_BYTES', 512 * 1024 * 1024)
+    ),
+    'EVICT_INTERVAL': 5 * 60,
+}
+
+# Size cap of resumable image uploads, and how long a session may sit idle
+# before it and its partial file are deleted, see recipe.uploads
+UPLOAD_SESSIONS = {
+    'MAX_SIZE': int(os.environ.get('UPLOAD_MAX_SIZE', 20 * 1024 * 1024)),
+    'EXPIRE_AFTER': 24 * 60 * 60,
+    'SWEEP_INTERVAL': 60 * 60,
+}
+
+# How old an image no recipe refers to must be before the collect_media
+# command removes it, and whether it is moved under MEDIA_ROOT/quarantine
+# rather than deleted, see recipe.orphans
+MEDIA_GC = {
+    'GRACE_PERIOD': 24 * 60 * 60,
+    'QUARANTINE': os.environ.get('MEDIA_GC_QUARANTINE') == '1',
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
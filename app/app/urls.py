@@ -14,12 +14,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
 from django.conf import settings
 
+from recipe.views import RecipeImageView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('user.urls')),
     path('api/recipes/', include('recipe.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('', include('core.urls')),
+    re_path(
+        rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$',
+        RecipeImageView.as_view(),
+        name='media'
+    ),
+]
@@ -1,13 +1,83 @@
+import json
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
-from core import models
+from core import models, purge
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using the row estimates of PostgreSQL instead of COUNT(*)
+    once a table is large, so changelist pages cost the same at any size
+    """
+    exact_below = 10000
+
+    def estimate(self, queryset, connection):
+        """ Return the planner's row estimate for a queryset """
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                return cursor.fetchone()[0]
+
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            return plan[0]['Plan']['Plan Rows']
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+
+        if connection.vendor == 'postgresql':
+            estimate = self.estimate(queryset, connection)
+            if estimate >= self.exact_below:
+                return estimate
+
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ Changelist settings that stay fast on tables with millions of rows """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    ordering = ['-id']
+
+
+class TagAdmin(LargeTableAdmin):
+    list_display = ['name', 'user']
+    search_fields = ['name']
+
+
+class IngredientAdmin(LargeTableAdmin):
+    list_display = ['name', 'user']
+    search_fields = ['name']
+
+
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ['title', 'user', 'time_minutes', 'price', 'updated_at']
+    search_fields = ['title']
+    autocomplete_fields = ['tags', 'ingredients']
 
 
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
+    actions = ['purge_users']
 
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
@@ -32,7 +102,40 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    @admin.action(description=_('Purge selected users and their data'))
+    def purge_users(self, request, queryset):
+        """ Queue the batched deletion of users, run in the background """
+        purges = purge.enqueue(queryset)
+        transaction.on_commit(purge.start_background)
+
+        self.message_user(
+            request,
+            _('Purging %(count)d users, see the user purges for progress.')
+            % {'count': len(purges)}
+        )
+
+
+class UserPurgeAdmin(admin.ModelAdmin):
+    list_display = ['email', 'status', 'progress', 'deleted_rows',
+                    'total_rows', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['user_id', 'email', 'status', 'total_rows',
+                       'deleted_rows', 'error', 'created_at', 'updated_at']
+    ordering = ['-id']
+
+    @admin.display(description=_('Progress'))
+    def progress(self, obj):
+        return f'{obj.progress}%'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.UserPurge, UserPurgeAdmin)
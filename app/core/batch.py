@@ -0,0 +1,151 @@
+import json
+import re
+import uuid
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import resolve, Resolver404
+
+from rest_framework import status
+from rest_framework.response import Response
+
+ALLOWED_PREFIXES = ('/api/recipes/', '/api/users/')
+REFERENCE = re.compile(r'\$\{(\w+(?:\.\w+)+)\}')
+
+
+class UnknownReference(ValueError):
+    """ Raised when an operation references an unknown result """
+
+
+def lookup(results, reference):
+    """ Return the value at a dotted path such as 'tag.id' in results """
+    value = results
+    for key in reference.split('.'):
+        try:
+            value = value[int(key) if isinstance(value, list) else key]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise UnknownReference(f'Unknown reference ${{{reference}}}.')
+
+    return value
+
+
+def substitute(value, results):
+    """ Replace ${ref.field} references in value with earlier results """
+    if isinstance(value, dict):
+        return {key: substitute(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute(item, results) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    match = REFERENCE.fullmatch(value)
+    if match:
+        return lookup(results, match.group(1))
+
+    return REFERENCE.sub(
+        lambda match: str(lookup(results, match.group(1))),
+        value
+    )
+
+
+def encode_multipart(data, files):
+    """ Encode form fields and uploaded files as a multipart body """
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+
+    for key, value in data.items():
+        for item in value if isinstance(value, list) else [value]:
+            body.write(
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+                f'{item}\r\n'.encode()
+            )
+
+    for key, upload in files.items():
+        upload.seek(0)
+        body.write(
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{key}"; '
+            f'filename="{upload.name}"\r\n'
+            f'Content-Type: {upload.content_type}\r\n\r\n'.encode()
+        )
+        body.write(upload.read())
+        body.write(b'\r\n')
+
+    body.write(f'--{boundary}--\r\n'.encode())
+
+    return f'multipart/form-data; boundary={boundary}', body.getvalue()
+
+
+def build_request(request, method, path, data, files):
+    """
+    Build a sub-request for an operation, reusing the user and token
+    already authenticated on the batch request
+    """
+    path, _, query = path.partition('?')
+
+    if files:
+        content_type, body = encode_multipart(data, files)
+    else:
+        content_type, body = 'application/json', json.dumps(data).encode()
+
+    environ = dict(request.META)
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+        'wsgi.url_scheme': request.scheme,
+    })
+
+    sub_request = WSGIRequest(environ)
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+
+    return sub_request
+
+
+def run_operation(request, operation, results):
+    """ Run one operation of a batch and return its response """
+    try:
+        path = substitute(operation['path'], results)
+        data = substitute(operation['body'], results)
+    except UnknownReference as error:
+        return Response(
+            {'detail': str(error)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not path.startswith(ALLOWED_PREFIXES):
+        return Response(
+            {'detail': 'Path is not allowed in a batch.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        files = {
+            key: request.FILES[name]
+            for key, name in operation['files'].items()
+        }
+    except KeyError as error:
+        return Response(
+            {'detail': f'Missing file {error}.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    sub_request = build_request(
+        request, operation['method'], path, data, files
+    )
+
+    try:
+        match = resolve(sub_request.path_info)
+    except Resolver404:
+        return Response(
+            {'detail': 'Not found.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return match.func(sub_request, *match.args, **match.kwargs)
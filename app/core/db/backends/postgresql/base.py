@@ -0,0 +1,116 @@
+"""
+PostgreSQL backend that hands out connections from a process-wide pool.
+
+Configure it with a POOL entry in the database settings:
+
+    'POOL': {'MIN_SIZE': 0, 'MAX_SIZE': 10, 'TIMEOUT': 10,
+             'CHECK_INTERVAL': 30}
+
+and opt in to server-side prepared statements with a PREPARE entry, see
+core.db.backends.postgresql.prepared:
+
+    'PREPARE': {'MAX_STATEMENTS': 100, 'THRESHOLD': 2}
+"""
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions, extras
+
+from core.db.backends.postgresql import prepared
+from core.db.pool import ConnectionPool, PoolTimeout, get_pool, close_pools
+
+
+def check_connection(connection):
+    """ Return whether an idle connection still answers """
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def reset_connection(connection):
+    """ Leave no transaction open on a connection going back to the pool """
+    if connection.closed:
+        raise ValueError('Connection is closed.')
+    if connection.get_transaction_status() != \
+            extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        """ Close pooled connections so the test database can be dropped """
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        """ Return the pool shared by every connection to this database """
+        settings = self.settings_dict
+        key = (settings['NAME'], settings['HOST'], settings['PORT'],
+               settings['USER'])
+
+        return get_pool(key, self.create_pool)
+
+    def create_pool(self):
+        options = self.settings_dict.get('POOL', {})
+        prepare = self.settings_dict.get('PREPARE', {})
+        conn_params = self.get_connection_params()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+
+        if prepare.get('MAX_STATEMENTS'):
+            conn_params.update(
+                connection_factory=prepared.PreparingConnection,
+                cursor_factory=prepared.PreparingCursor
+            )
+
+        def connect():
+            connection = base.Database.connect(**conn_params)
+            if prepare.get('MAX_STATEMENTS'):
+                connection.statements = prepared.StatementCache(
+                    prepare['MAX_STATEMENTS'], prepare.get('THRESHOLD', 2)
+                )
+            if isolation_level is not None:
+                connection.set_session(isolation_level=isolation_level)
+            extras.register_default_jsonb(
+                conn_or_curs=connection, loads=lambda x: x
+            )
+            return connection
+
+        return ConnectionPool(
+            connect,
+            check_connection,
+            reset_connection,
+            min_size=options.get('MIN_SIZE', 0),
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 10),
+            check_interval=options.get('CHECK_INTERVAL', 30),
+        )
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.pool.getconn()
+        except PoolTimeout as error:
+            raise base.Database.OperationalError(str(error))
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(
+                    self.connection,
+                    discard=self.errors_occurred and not self.is_usable()
+                )
@@ -0,0 +1,138 @@
+"""
+Server-side prepared statements for psycopg2 connections.
+
+A SELECT run often enough on a connection is sent once as PREPARE and
+then as EXECUTE, so PostgreSQL parses and plans it once per session
+instead of on every request. Statements are only prepared and executed
+outside transactions, where a failed attempt can safely fall back to
+running the query as is. A statement a migration made invalid, such as
+one whose result changed shape, fails on EXECUTE and is discarded, then
+prepared again once the query is seen often enough.
+"""
+import itertools
+import re
+from collections import OrderedDict
+
+import psycopg2
+from psycopg2 import errors, extensions
+
+PLACEHOLDER = re.compile(r'%([%s])')
+
+
+def placeholders(sql):
+    """ Return the number of %s placeholders in a query """
+    return sum(match.group(1) == 's' for match in PLACEHOLDER.finditer(sql))
+
+
+def to_positional(sql):
+    """ Turn the %s placeholders of a query into $1, $2... """
+    numbers = itertools.count(1)
+
+    return PLACEHOLDER.sub(
+        lambda match: '%' if match.group(1) == '%' else f'${next(numbers)}',
+        sql
+    )
+
+
+class StatementCache:
+    """
+    Bounded LRU of the queries seen on one connection, holding a use
+    count until a query is prepared, then its statement name, or False
+    once it failed to prepare
+    """
+
+    def __init__(self, max_size, threshold):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.statements = OrderedDict()
+        self.names = itertools.count(1)
+        self.evicted = []
+        self.hits = 0
+        self.prepared = 0
+
+    def use(self, sql):
+        """
+        Record a use of sql and return the name of its statement, or None,
+        and whether the statement still has to be prepared
+        """
+        entry = self.statements.pop(sql, 0)
+        self.statements[sql] = entry
+
+        if entry is False:
+            return None, False
+        if isinstance(entry, str):
+            self.hits += 1
+            return entry, False
+        if entry + 1 < self.threshold:
+            self.statements[sql] = entry + 1
+            return None, False
+
+        name = f'django_{next(self.names)}'
+        self.statements[sql] = name
+        self.prepared += 1
+
+        while len(self.statements) > self.max_size:
+            _, oldest = self.statements.popitem(last=False)
+            if isinstance(oldest, str):
+                self.evicted.append(oldest)
+
+        return name, True
+
+    def discard(self, sql, preparable=True):
+        """ Forget the statement of sql, never preparing it again if asked """
+        name = self.statements.pop(sql, None)
+        if isinstance(name, str):
+            self.evicted.append(name)
+        if not preparable:
+            self.statements[sql] = False
+
+
+class PreparingConnection(extensions.connection):
+    """ Connection keeping the statements prepared on its session """
+    statements = None
+
+
+class PreparingCursor(extensions.cursor):
+    """ Cursor running hot SELECT queries through prepared statements """
+
+    def _deallocate(self, statements):
+        while statements.evicted:
+            try:
+                super().execute(f'DEALLOCATE {statements.evicted.pop()}')
+            except errors.InvalidSqlStatementName:
+                pass
+
+    def execute(self, query, vars=None):
+        statements = self.connection.statements
+
+        if statements is None or self.name is not None \
+                or not self.connection.autocommit \
+                or not isinstance(vars, (list, tuple)) \
+                or not isinstance(query, str) \
+                or query.lstrip()[:6].upper() != 'SELECT' \
+                or placeholders(query) != len(vars):
+            return super().execute(query, vars)
+
+        self._deallocate(statements)
+        name, prepare = statements.use(query)
+        if name is None:
+            return super().execute(query, vars)
+
+        if prepare:
+            try:
+                super().execute(f'PREPARE {name} AS {to_positional(query)}')
+            except psycopg2.Error:
+                statements.discard(query, preparable=False)
+                return super().execute(query, vars)
+
+        arguments = f"({', '.join(['%s'] * len(vars))})" if vars else ''
+        try:
+            return super().execute(f'EXECUTE {name}{arguments}', vars)
+        except (errors.InvalidSqlStatementName, errors.FeatureNotSupported):
+            # Deallocated, or its result changed shape after a migration
+            statements.discard(query)
+        except psycopg2.Error:
+            # Let the query report its own error
+            pass
+
+        return super().execute(query, vars)
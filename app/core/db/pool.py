@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """ Raised when no connection becomes available in time """
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+
+    Idle connections are reused most recently used first and checked with
+    `check` when they have been idle for longer than `check_interval`
+    seconds. `reset` is called on every connection given back to the pool.
+    """
+
+    def __init__(self, connect, check, reset, min_size=0, max_size=10,
+                 timeout=10, check_interval=30):
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._condition = threading.Condition()
+        self._forget()
+
+    def _forget(self):
+        """ Start over without touching connections from a parent process """
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        """ Return a connection, waiting up to timeout for a free one """
+        deadline = time.monotonic() + self.timeout
+
+        with self._condition:
+            if self._pid != os.getpid():
+                self._forget()
+
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f'No connection available after {self.timeout}s.'
+                    )
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if self._idle:
+                connection, idle_since = self._idle.pop()
+            else:
+                connection, idle_since = None, None
+                self._size += 1
+            self._in_use += 1
+
+        try:
+            if connection is not None and \
+                    time.monotonic() - idle_since > self.check_interval and \
+                    not self.check(connection):
+                self._close(connection)
+                connection = None
+
+            if connection is None:
+                connection = self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+        return connection
+
+    def putconn(self, connection, discard=False):
+        """ Give a connection back to the pool, or close it if discard """
+        if not discard:
+            try:
+                self.reset(connection)
+            except Exception:
+                discard = True
+
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+                self._close(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def fill(self):
+        """ Open connections until the pool holds min_size of them """
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self.connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+            with self._condition:
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+
+    def close(self):
+        """ Close every idle connection """
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._size -= 1
+                self._close(connection)
+
+    def stats(self):
+        """ Return the current usage of the pool """
+        with self._condition:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'max_size': self.max_size,
+                'saturation': round(self._in_use / self.max_size, 2),
+            }
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """ Return the pool registered under key, creating it with factory """
+    with pools_lock:
+        if key not in pools:
+            pools[key] = factory()
+        return pools[key]
+
+
+def close_pools(name=None):
+    """ Close the idle connections of every pool, or of one database """
+    with pools_lock:
+        for key, pool in list(pools.items()):
+            if name is None or key[0] == name:
+                pool.close()
@@ -0,0 +1,90 @@
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db import routing, sharding
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ShardRouter:
+    """
+    Send sharded models to the shard of their user, found from the
+    instance hint or else from the user of the current request
+    """
+
+    def _shard(self, model, hints):
+        if len(sharding.shards()) < 2 or not sharding.is_sharded(model):
+            return None
+
+        instance = hints.get('instance')
+        if isinstance(instance, get_user_model()):
+            return sharding.shard_for_user(instance.pk)
+        if instance is not None:
+            if instance._state.db:
+                return instance._state.db
+            if getattr(instance, 'user_id', None) is not None:
+                return sharding.shard_for_user(instance.user_id)
+
+        state = routing.current()
+
+        return state.shard if state is not None else None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        shard = self._shard(model, hints)
+        state = routing.current()
+        if shard is not None and state is not None:
+            state.wrote = True
+
+        return shard
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = set(sharding.shards())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+
+class ReplicaRouter:
+    """
+    Send reads to a replica when the current request asked for it, until
+    the request writes anything. Everything else goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing.current()
+
+        if state is None or not state.use_replica or state.wrote \
+                or not replicas() \
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = routing.current()
+        if state is not None:
+            state.wrote = True
+
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+
+        return None
@@ -0,0 +1,57 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+class RoutingState:
+    """ Routing decisions taken for the request being handled """
+
+    def __init__(self, parent=None):
+        self.use_replica = False
+        self.wrote = parent.wrote if parent is not None else False
+        self.shard = parent.shard if parent is not None else None
+
+
+def current():
+    """ Return the routing state of the current request, if any """
+    return _state.get()
+
+
+@contextmanager
+def request_scope():
+    """
+    Open a routing scope for a request. Nested scopes, such as batch
+    sub-requests, inherit and report back whether a write happened.
+    """
+    parent = _state.get()
+    state = RoutingState(parent)
+    token = _state.set(state)
+
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+        if parent is not None and state.wrote:
+            parent.wrote = True
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """ Keep the reads of a user on the primary for a short while """
+    cache.set(
+        _pin_key(user_id),
+        True,
+        getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+    )
+
+
+def pinned_to_primary(user_id):
+    """ Return whether a user wrote recently enough to read the primary """
+    return cache.get(_pin_key(user_id), False)
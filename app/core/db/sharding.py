@@ -0,0 +1,143 @@
+"""
+Placement of user data across the databases listed in DATABASE_SHARDS.
+
+Users, tokens and the shard directory stay on the default database. The
+models in SHARDED_MODELS, and their many-to-many tables, live on the
+shard of their user. Each shard keeps a stub row of its users so foreign
+keys hold within the shard. Every shard after the first hands out ids from
+its own range, so rows keep their ids when a user moves between shards.
+"""
+import bisect
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SHARDED_MODELS = {
+    'core.tag',
+    'core.ingredient',
+    'core.recipe',
+    'core.tombstone',
+    'core.recipestats',
+    'core.tagstats',
+    'core.uploadsession',
+}
+VIRTUAL_NODES = 64
+DIRECTORY_CACHE_SECONDS = 300
+ID_RANGE = 10 ** 12
+
+_rings = {}
+
+
+def shards():
+    """ Return the aliases of the databases holding user data """
+    return getattr(settings, 'DATABASE_SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def is_sharded(model):
+    """ Return whether a model, or the model owning a M2M table, is sharded """
+    if model._meta.auto_created:
+        model = model._meta.auto_created
+
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def sharded_models():
+    """ Return the sharded models, including their many-to-many tables """
+    return [
+        model for model in apps.get_models(include_auto_created=True)
+        if is_sharded(model)
+    ]
+
+
+def user_rows(model, using, user_id):
+    """ Return the rows of a sharded model, or M2M table, owned by a user """
+    queryset = model._base_manager.using(using)
+    if model._meta.auto_created:
+        return queryset.filter(recipe__user_id=user_id)
+
+    return queryset.filter(user_id=user_id)
+
+
+def reserve_id_range(using):
+    """ Move the id sequences of a PostgreSQL shard to its own range """
+    if using not in shards() or connections[using].vendor != 'postgresql':
+        return
+
+    start = shards().index(using) * ID_RANGE
+    if not start:
+        return
+
+    with connections[using].cursor() as cursor:
+        for model in sharded_models():
+            table = connections[using].ops.quote_name(model._meta.db_table)
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                f"GREATEST((SELECT MAX(id) FROM {table}), %s))",
+                [model._meta.db_table, start]
+            )
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+
+def ring_shard(user_id):
+    """ Place a user on the consistent hash ring of the current shards """
+    names = tuple(shards())
+    ring = _rings.get(names)
+    if ring is None:
+        ring = _rings[names] = sorted(
+            (_hash(f'{name}#{node}'), name)
+            for name in names for node in range(VIRTUAL_NODES)
+        )
+
+    index = bisect.bisect(ring, (_hash(str(user_id)),)) % len(ring)
+
+    return ring[index][1]
+
+
+def _cache_key(user_id):
+    return f'user-shard:{user_id}'
+
+
+def directory(user_id, fresh=False):
+    """
+    Return (shard, moving) for a user, from cache or the directory. Writes
+    pass fresh to read the directory itself, so a move started since the
+    entry was cached is never missed.
+    """
+    if len(shards()) < 2:
+        return shards()[0], False
+
+    entry = None if fresh else cache.get(_cache_key(user_id))
+    if entry is None:
+        from core.models import UserShard
+
+        row = UserShard.objects\
+            .using(DEFAULT_DB_ALIAS)\
+            .filter(user_id=user_id)\
+            .values_list('shard', 'moving')\
+            .first()
+        entry = row or (ring_shard(user_id), False)
+        cache.set(_cache_key(user_id), entry, DIRECTORY_CACHE_SECONDS)
+
+    return tuple(entry)
+
+
+def shard_for_user(user_id, fresh=False):
+    """ Return the alias of the database holding a user's data """
+    return directory(user_id, fresh)[0]
+
+
+def assign(user_id, shard, moving=False):
+    """ Record the shard of a user in the directory """
+    from core.models import UserShard
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=user_id,
+        defaults={'shard': shard, 'moving': moving}
+    )
+    cache.set(_cache_key(user_id), (shard, moving), DIRECTORY_CACHE_SECONDS)
@@ -0,0 +1,31 @@
+import time
+
+from django.db import connections, DatabaseError
+
+
+def check_database(alias):
+    """
+    Measure the round trip of a trivial query on a database, without
+    waiting on its connection pool when the pool is saturated
+    """
+    connection = connections[alias]
+    pool = connection.pool if hasattr(connection, 'pool') else None
+    stats = pool.stats() if pool is not None else None
+
+    if stats and connection.connection is None and \
+            stats['in_use'] >= stats['max_size']:
+        return {'ok': False, 'error': 'Connection pool saturated.',
+                'pool': stats}
+
+    start = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError as error:
+        return {'ok': False, 'error': str(error), 'pool': stats}
+
+    return {
+        'ok': True,
+        'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+        'pool': stats,
+    }
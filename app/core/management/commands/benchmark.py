@@ -0,0 +1,236 @@
+import json
+import statistics
+import time
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Count
+from django.core.handlers.base import BaseHandler
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.serializers import ModelSerializer
+
+from core.db.backends.postgresql.prepared import to_positional
+from core.models import Tag, Ingredient, Recipe
+
+
+def hot_queries(user):
+    """ Return the querysets run on most API requests of a user """
+    token, _ = Token.objects.get_or_create(user=user)
+
+    return {
+        'recipes': Recipe.objects.filter(user=user).order_by('-id'),
+        'tags': Tag.objects.filter(user=user).order_by('-name').distinct(),
+        'ingredients': Ingredient.objects
+        .filter(user=user).order_by('-name').distinct(),
+        'token': Token.objects.select_related('user').filter(key=token.key),
+    }
+
+
+def explain(cursor, sql, params):
+    """ Return the planning and execution times of a query, in ms """
+    cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return plan[0]['Planning Time'], plan[0]['Execution Time']
+
+
+def benchmark_prepared(command, user, repeat):
+    """ Compare planning time of the hot queries with and without PREPARE """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'postgresql':
+        raise CommandError('The prepared benchmark needs PostgreSQL.')
+
+    command.stdout.write(
+        f'{"query":<12} {"plan ms":>10} {"prepared":>10} '
+        f'{"total ms":>10} {"prepared":>10}'
+    )
+
+    for label, queryset in hot_queries(user).items():
+        sql, params = queryset.query.sql_with_params()
+        arguments = f"({', '.join(['%s'] * len(params))})" if params else ''
+        queries = {'plain': sql, 'prepared': f'EXECUTE benchmark{arguments}'}
+        totals = {name: [0, 0] for name in queries}
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'PREPARE benchmark AS {to_positional(sql)}')
+            try:
+                for _ in range(repeat):
+                    for name, query in queries.items():
+                        planning, execution = explain(cursor, query, params)
+                        totals[name][0] += planning
+                        totals[name][1] += planning + execution
+            finally:
+                cursor.execute('DEALLOCATE benchmark')
+
+        plain, prepared = totals['plain'], totals['prepared']
+        command.stdout.write(
+            f'{label:<12} {plain[0] / repeat:>10.3f} '
+            f'{prepared[0] / repeat:>10.3f} {plain[1] / repeat:>10.3f} '
+            f'{prepared[1] / repeat:>10.3f}'
+        )
+
+
+def benchmark_writes(command, user, repeat):
+    """ Compare statements per recipe write with the ORM's set() path """
+    from recipe.serializers import RecipeSerializer
+
+    connection = connections[router.db_for_write(Recipe)]
+    serializer = RecipeSerializer()
+    paths = {'orm': ModelSerializer, 'bulk': RecipeSerializer}
+
+    def measure(write):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            write()
+            elapsed = time.perf_counter() - start
+
+        statements = [
+            query for query in queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        return len(statements), elapsed * 1000
+
+    command.stdout.write(
+        f'{"write":<18} {"orm stmts":>10} {"bulk stmts":>10} '
+        f'{"orm ms":>10} {"bulk ms":>10}'
+    )
+
+    with transaction.atomic(using=connection.alias):
+        tags = [
+            Tag.objects.create(user=user, name=f'Benchmark {number}')
+            for number in range(5)
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=user, name=f'Benchmark {number}')
+            for number in range(5)
+        ]
+        fields = {'title': 'Benchmark', 'time_minutes': 5, 'price': 1}
+        before = {'tags': tags[:3], 'ingredients': ingredients[:3]}
+        after = {'tags': tags[2:], 'ingredients': ingredients[2:]}
+
+        def new_recipe():
+            recipe = serializer.create({**fields, **before, 'user': user})
+            return Recipe.objects.get(pk=recipe.pk)
+
+        writes = {
+            'create': lambda path: partial(
+                path.create, serializer, {**fields, **before, 'user': user}
+            ),
+            'update unchanged': lambda path: partial(
+                path.update, serializer, new_recipe(), {**fields, **before}
+            ),
+            'update changed': lambda path: partial(
+                path.update, serializer, new_recipe(), {**fields, **after}
+            ),
+        }
+
+        for label, prepare in writes.items():
+            results = {}
+            for name, path in paths.items():
+                runs = [measure(prepare(path)) for _ in range(repeat)]
+                results[name] = [sum(column) / repeat for column in zip(*runs)]
+
+            command.stdout.write(
+                f'{label:<18} {results["orm"][0]:>10.1f} '
+                f'{results["bulk"][0]:>10.1f} {results["orm"][1]:>10.3f} '
+                f'{results["bulk"][1]:>10.3f}'
+            )
+
+        transaction.set_rollback(True, using=connection.alias)
+
+
+def benchmark_middleware(command, user, repeat):
+    """ Compare per-request time of API calls under both middleware stacks """
+    token, _ = Token.objects.get_or_create(user=user)
+    factory = RequestFactory(
+        SERVER_NAME='localhost',
+        HTTP_AUTHORIZATION=f'Token {token.key}'
+    )
+    scoped = 'core.middleware.PathScopedMiddleware'
+    stacks = {
+        'full': [
+            path for path in settings.MIDDLEWARE if path != scoped
+        ] + settings.SITE_MIDDLEWARE,
+        'lean': settings.MIDDLEWARE,
+    }
+    paths = {'liveness': '/health/live', 'tags': '/api/recipes/tags/'}
+    handlers = {}
+
+    for name, middleware in stacks.items():
+        with override_settings(MIDDLEWARE=middleware):
+            handlers[name] = BaseHandler()
+            handlers[name].load_middleware()
+
+    def measure(handler, path):
+        request = factory.get(path)
+        start = time.perf_counter()
+        handler.get_response(request)
+        return (time.perf_counter() - start) * 1e6
+
+    command.stdout.write(
+        f'{"request":<12} {"full us":>10} {"lean us":>10} {"saved us":>10}'
+    )
+
+    with override_settings(ALLOWED_HOSTS=['localhost']):
+        for label, path in paths.items():
+            timings = {name: [] for name in handlers}
+
+            # Interleaved so drift of the machine affects both stacks alike
+            for _ in range(repeat):
+                for name, handler in handlers.items():
+                    timings[name].append(measure(handler, path))
+
+            full, lean = (
+                statistics.median(timings[name]) for name in ('full', 'lean')
+            )
+            command.stdout.write(
+                f'{label:<12} {full:>10.1f} {lean:>10.1f} '
+                f'{full - lean:>10.1f}'
+            )
+
+
+SCENARIOS = {
+    'prepared': benchmark_prepared,
+    'writes': benchmark_writes,
+    'middleware': benchmark_middleware,
+}
+
+
+class Command(BaseCommand):
+    """ Django command to measure the cost of hot code paths """
+    help = 'Run a benchmark scenario against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument(
+            '--user',
+            help='Email of the user whose data is used, defaults to the '
+                 'user with the most recipes'
+        )
+        parser.add_argument('--repeat', type=int, default=100)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['user']:
+            user = users.filter(email=options['user']).first()
+        else:
+            user = users\
+                .annotate(recipes=Count('recipe'))\
+                .order_by('-recipes')\
+                .first()
+
+        if user is None:
+            raise CommandError('No user to run the benchmark with.')
+
+        start = time.perf_counter()
+        SCENARIOS[options['scenario']](self, user, options['repeat'])
+        self.stdout.write(
+            f'Done in {time.perf_counter() - start:.2f}s'
+        )
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.template.defaultfilters import filesizeformat
+
+from recipe import orphans
+
+
+class Command(BaseCommand):
+    """ Django command to remove recipe images no recipe refers to """
+    help = 'Delete, or quarantine, orphaned recipe images and variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-period', type=int,
+            help='Keep orphans younger than this many seconds'
+        )
+        parser.add_argument(
+            '--quarantine', action='store_true', default=None,
+            help='Move orphans under the quarantine directory instead'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int,
+                            default=orphans.BATCH_SIZE)
+        parser.add_argument(
+            '--every', type=int,
+            help='Keep running, collecting every this many seconds'
+        )
+
+    def collect(self, options):
+        removed, reclaimed = orphans.collect(
+            grace_period=options['grace_period'],
+            quarantine=options['quarantine'],
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size']
+        )
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} orphaned files, '
+            f'reclaiming {filesizeformat(reclaimed)}'
+        ))
+
+    def handle(self, *args, **options):
+        self.collect(options)
+
+        while options['every']:
+            connections.close_all()
+            time.sleep(options['every'])
+            self.collect(options)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipe import uploads
+
+
+class Command(BaseCommand):
+    """ Django command to delete idle resumable upload sessions """
+    help = 'Delete upload sessions idle for longer than EXPIRE_AFTER'
+
+    def handle(self, *args, **options):
+        expired = uploads.expire()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Expired {expired} upload sessions')
+        )
@@ -0,0 +1,135 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.db import sharding
+from core.models import Tag, Ingredient, Recipe, Tombstone, RecipeStats, \
+    TagStats, UploadSession
+
+# Parents come before the rows referencing them
+MODELS = (
+    Tag,
+    Ingredient,
+    Recipe,
+    Recipe.tags.through,
+    Recipe.ingredients.through,
+    Tombstone,
+    RecipeStats,
+    TagStats,
+    UploadSession,
+)
+
+
+def batches(queryset, size):
+    """ Yield the rows of a queryset in lists of at most size """
+    batch = []
+    for obj in queryset.order_by('pk').iterator(chunk_size=size):
+        batch.append(obj)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    """ Django command to move the data of a user to another shard """
+    help = 'Copy the data of a user to another shard and switch them over'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('shard')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--drain', type=float,
+            default=getattr(settings, 'SHARD_MOVE_DRAIN_SECONDS', 30),
+            help='Seconds to let writes already under way finish'
+        )
+
+    def copy(self, model, source, target, user_id, size):
+        """ Copy the rows of a user as they are, keeping ids and timestamps """
+        fields = model._meta.concrete_fields
+        copied = 0
+
+        rows = sharding.user_rows(model, source, user_id)
+
+        for batch in batches(rows, size):
+            taken = model._base_manager.using(target)\
+                .filter(pk__in=[obj.pk for obj in batch])
+            if taken.exists():
+                raise CommandError(
+                    f'{model._meta.label} ids of user {user_id} are '
+                    f'already used on {target}.'
+                )
+
+            model._base_manager.using(target)._insert(
+                batch, fields=fields, raw=True
+            )
+            copied += len(batch)
+
+        return copied
+
+    def handle(self, *args, **options):
+        user_id, target = options['user_id'], options['shard']
+        User = get_user_model()
+
+        if target not in sharding.shards():
+            raise CommandError(f'Unknown shard {target}.')
+
+        try:
+            user = User.objects.using(DEFAULT_DB_ALIAS).get(pk=user_id)
+        except User.DoesNotExist:
+            raise CommandError(f'User {user_id} does not exist.')
+
+        source = sharding.shard_for_user(user_id, fresh=True)
+        if source == target:
+            self.stdout.write(f'User {user_id} is already on {target}')
+            return
+
+        # Writes of the user are refused until the directory is switched.
+        # Those that passed the check before are let finish first, no
+        # request outlives the worker timeout.
+        sharding.assign(user_id, source, moving=True)
+
+        try:
+            time.sleep(options['drain'])
+
+            with transaction.atomic(using=target):
+                if target != DEFAULT_DB_ALIAS:
+                    User.objects.using(target).bulk_create([User(
+                        pk=user.pk,
+                        email=user.email,
+                        password=make_password(None),
+                        is_active=False
+                    )])
+
+                for model in MODELS:
+                    copied = self.copy(
+                        model, source, target, user_id, options['batch_size']
+                    )
+                    self.stdout.write(f'{model._meta.label}: {copied} rows')
+        except BaseException:
+            sharding.assign(user_id, source)
+            raise
+
+        sharding.assign(user_id, target)
+
+        # The copies are identical, so the old rows go without signals
+        with transaction.atomic(using=source):
+            for model in reversed(MODELS):
+                queryset = sharding.user_rows(model, source, user_id)
+                queryset._raw_delete(source)
+
+            if source != DEFAULT_DB_ALIAS:
+                User.objects.using(source).filter(pk=user_id)\
+                    ._raw_delete(source)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Moved user {user_id} from {source} to '
+                               f'{target}')
+        )
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core import purge
+
+
+class Command(BaseCommand):
+    """ Django command to purge users and their data in batches """
+    help = 'Queue the given users for purging and run the queued purges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+        parser.add_argument(
+            '--batch-size', type=int, default=purge.BATCH_SIZE
+        )
+        parser.add_argument(
+            '--retry', action='store_true',
+            help='Run failed purges again'
+        )
+
+    def handle(self, *args, **options):
+        if options['user_ids']:
+            purge.enqueue(
+                get_user_model().objects.filter(pk__in=options['user_ids'])
+            )
+
+        for queued in purge.queued(retry=options['retry']):
+            self.stdout.write(f'Purging {queued.email}...')
+            try:
+                purge.run(queued, options['batch_size'])
+            except Exception as error:
+                self.stderr.write(f'Purge of {queued.email} failed: {error}')
+                continue
+
+            queued.refresh_from_db()
+            self.stdout.write(self.style.SUCCESS(
+                f'Purged {queued.email}: {queued.deleted_rows} rows'
+            ))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.db import sharding
+from recipe import stats
+
+
+class Command(BaseCommand):
+    """ Django command to recompute the recipe statistics of users """
+    help = 'Recompute the recipe statistics of the given users, or of all'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+
+        rebuilt = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            stats.rebuild(user_id, using=sharding.shard_for_user(user_id))
+            rebuilt += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt the statistics of {rebuilt} users')
+        )
@@ -0,0 +1,146 @@
+import multiprocessing
+import os
+import resource
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import OperationalError
+from django.urls import get_resolver
+from gunicorn.app.base import BaseApplication
+
+from core.db.pool import close_pools
+
+
+def memory_usage():
+    """ Return the resident memory of the current process in megabytes """
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def warm_up_resolvers():
+    """ Build the URL resolver caches so forked workers share them """
+    get_resolver().reverse_dict
+
+
+def warm_up_connections(worker):
+    """ Open the database connections of a freshly forked worker """
+    for connection in connections.all():
+        try:
+            connection.ensure_connection()
+            if hasattr(connection, 'pool'):
+                connection.pool.fill()
+        except OperationalError as error:
+            worker.log.warning('Database warm up failed: %s', error)
+
+    # Requests run on other threads, so the pooled connections checked
+    # out on this one go back to the pool for them
+    connections.close_all()
+
+
+def recycle_worker(worker, max_memory):
+    """ Ask a worker to exit gracefully once it uses too much memory """
+    usage = memory_usage()
+
+    if max_memory and usage > max_memory:
+        worker.log.info(
+            'Worker %s uses %.0f MB (limit %s MB), recycling',
+            worker.pid, usage, max_memory
+        )
+        worker.alive = False
+
+
+class Server(BaseApplication):
+    """ Gunicorn application serving a preloaded WSGI application """
+
+    def __init__(self, application, options, max_memory):
+        self.application = application
+        self.options = options
+        self.max_memory = max_memory
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+        max_memory = self.max_memory
+
+        def post_worker_init(worker):
+            warm_up_connections(worker)
+
+        def post_request(worker, req, environ, resp):
+            recycle_worker(worker, max_memory)
+
+        self.cfg.set('post_worker_init', post_worker_init)
+        self.cfg.set('post_request', post_request)
+
+    def load(self):
+        return self.application
+
+
+class Command(BaseCommand):
+    """ Django command to serve the app with preforked Gunicorn workers """
+
+    def add_arguments(self, parser):
+        cpus = multiprocessing.cpu_count()
+
+        parser.add_argument(
+            '--bind',
+            default=os.environ.get('BIND', '0.0.0.0:8000')
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            default=int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1))
+        )
+        parser.add_argument(
+            '--threads', type=int,
+            default=int(os.environ.get('WEB_THREADS', 2))
+        )
+        parser.add_argument(
+            '--max-requests', type=int,
+            default=int(os.environ.get('WEB_MAX_REQUESTS', 1000))
+        )
+        parser.add_argument(
+            '--max-requests-jitter', type=int,
+            default=int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 100))
+        )
+        parser.add_argument(
+            '--max-memory', type=int,
+            default=int(os.environ.get('WEB_MAX_MEMORY', 512)),
+            help='Recycle workers above this resident size in MB, 0 disables'
+        )
+        parser.add_argument(
+            '--timeout', type=int,
+            default=int(os.environ.get('WEB_TIMEOUT', 30))
+        )
+
+    def handle(self, *args, **options):
+        from app.wsgi import application
+
+        warm_up_resolvers()
+        connections.close_all()
+        close_pools()
+
+        self.stdout.write(
+            f"Serving on {options['bind']} with {options['workers']} "
+            f"workers x {options['threads']} threads"
+        )
+
+        Server(
+            application,
+            {
+                'bind': options['bind'],
+                'workers': options['workers'],
+                'threads': options['threads'],
+                'worker_class': 'gthread',
+                'preload_app': True,
+                'max_requests': options['max_requests'],
+                'max_requests_jitter': options['max_requests_jitter'],
+                'timeout': options['timeout'],
+                'accesslog': '-',
+            },
+            options['max_memory']
+        ).run()
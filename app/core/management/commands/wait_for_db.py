@@ -8,15 +8,39 @@ from django.core.management.base import BaseCommand
 class Command(BaseCommand):
     """ Django command to pause execution until db is available """
 
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--timeout', type=int, default=60,
+            help='Give up after this many seconds, 0 waits forever'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=10,
+            help='Longest wait between two attempts in seconds'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
+        deadline = time.monotonic() + options['timeout']
+        delay = 1
 
-        while not db_conn:
+        while True:
             try:
-                db_conn = connections['default']
+                connection = connections[options['database']]
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                break
             except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                if options['timeout'] and time.monotonic() >= deadline:
+                    self.stderr.write(self.style.ERROR(
+                        'Database unavailable, giving up.'
+                    ))
+                    raise
+
+                self.stdout.write(
+                    f'Database unavailable, retrying in {delay:g}s...'
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
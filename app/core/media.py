@@ -0,0 +1,132 @@
+"""
+Delivery of stored files once a view has checked access to them.
+
+With MEDIA_SENDFILE set, the transfer is handed to the front-end server:
+'x-accel-redirect' sends nginx to the file under MEDIA_INTERNAL_URL, an
+internal location aliasing MEDIA_ROOT, and 'x-sendfile' gives Apache or
+lighttpd its path on disk. Otherwise the file is streamed by Django with
+support for single byte ranges, validators and long-lived caching.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import http_date, parse_etags
+
+# Names are random, so a file never changes once written
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """ Read at most length bytes of a file from offset """
+
+    def __init__(self, file, offset, length):
+        self.file = file
+        self.remaining = length
+        file.seek(offset)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def etag(stat):
+    """ Return a strong validator for a file from its modification and size """
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def byte_range(header, size):
+    """ Return the (start, end) of a single byte range, or None for all """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start > end or start >= size:
+        raise ValueError('Unsatisfiable range.')
+
+    return start, end
+
+
+def serve(request, storage, name):
+    """ Return a response delivering a stored file to an allowed caller """
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('File not found.')
+
+    validator = etag(stat)
+    headers = {
+        'ETag': validator,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    if validator in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return HttpResponse(status=304, headers=headers)
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    sendfile = getattr(settings, 'MEDIA_SENDFILE', None)
+
+    if sendfile == 'x-accel-redirect':
+        # nginx handles ranges and conditional requests itself
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_INTERNAL_URL + name
+        )
+        return response
+
+    if sendfile == 'x-sendfile':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Sendfile'] = path
+        return response
+
+    requested = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is not None and if_range != validator:
+        requested = ''
+
+    try:
+        span = byte_range(requested, stat.st_size)
+    except ValueError:
+        return HttpResponse(status=416, headers={
+            **headers,
+            'Content-Range': f'bytes */{stat.st_size}',
+        })
+
+    file = open(path, 'rb')
+    if span is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = span
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    for header, value in headers.items():
+        response[header] = value
+
+    return response
@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+
+
+class PathScopedMiddleware:
+    """
+    Run the SITE_MIDDLEWARE stack for every path but the LEAN_PATHS
+    prefixes. API requests authenticate with tokens, so they skip the
+    session, CSRF, messages and clickjacking middleware entirely.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lean_paths = tuple(settings.LEAN_PATHS)
+        self.view_hooks = []
+        self.template_response_hooks = []
+        self.exception_hooks = []
+
+        # Chained the way django.core.handlers.base loads MIDDLEWARE
+        handler = get_response
+        for path in reversed(settings.SITE_MIDDLEWARE):
+            try:
+                middleware = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if hasattr(middleware, 'process_view'):
+                self.view_hooks.insert(0, middleware.process_view)
+            if hasattr(middleware, 'process_template_response'):
+                self.template_response_hooks.append(
+                    middleware.process_template_response
+                )
+            if hasattr(middleware, 'process_exception'):
+                self.exception_hooks.append(middleware.process_exception)
+
+            handler = convert_exception_to_response(middleware)
+
+        self.site_handler = handler
+
+    def is_lean(self, request):
+        """ Return whether a request skips the site middleware """
+        return request.path_info.startswith(self.lean_paths)
+
+    def __call__(self, request):
+        if self.is_lean(request):
+            return self.get_response(request)
+
+        return self.site_handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_lean(request):
+            return None
+
+        for hook in self.view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+
+    def process_template_response(self, request, response):
+        if not self.is_lean(request):
+            for hook in self.template_response_hooks:
+                response = hook(request, response)
+
+        return response
+
+    def process_exception(self, request, exception):
+        if self.is_lean(request):
+            return None
+
+        for hook in self.exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+
+
+def accepted_encodings(header):
+    """ Return the content codings of an Accept-Encoding header by weight """
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding.lower()] = weight
+
+    return weights
+
+
+class CompressedVariants:
+    """
+    Process-local LRU of compressed bodies keyed by a digest of the raw
+    bytes, bounded by the total size of the bodies held
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least COMPRESSION['MIN_SIZE'] bytes with the
+    best coding the client accepts, brotli when installed, else gzip.
+    Only the LEAN_PATHS prefixes are compressed: site pages carry CSRF
+    tokens next to text echoed from the request, which compression would
+    let an attacker guess (BREACH).
+    Compressed bodies are kept by digest of the raw bytes, so hot
+    responses are compressed once.
+    """
+    defaults = {
+        'MIN_SIZE': 1024,
+        'GZIP_LEVEL': 6,
+        'BROTLI_QUALITY': 4,
+        'CACHE_BYTES': 16 * 1024 * 1024,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = {**self.defaults, **getattr(settings, 'COMPRESSION', {})}
+        self.min_size = options['MIN_SIZE']
+        self.paths = tuple(settings.LEAN_PATHS)
+        self.variants = CompressedVariants(options['CACHE_BYTES'])
+
+        # In order of preference
+        self.encoders = {}
+        if brotli is not None:
+            self.encoders['br'] = lambda data: brotli.compress(
+                data, quality=options['BROTLI_QUALITY']
+            )
+        self.encoders['gzip'] = lambda data: gzip.compress(
+            data, compresslevel=options['GZIP_LEVEL'], mtime=0
+        )
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if not request.path_info.startswith(self.paths) \
+                or response.streaming \
+                or response.has_header('Content-Encoding') \
+                or len(response.content) < self.min_size \
+                or not response.get('Content-Type', '').startswith(
+                    COMPRESSIBLE_TYPES) \
+                or 'no-transform' in response.get('Cache-Control', ''):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        coding = self.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        content = self.compress(response.content, coding)
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        response.headers['Content-Encoding'] = coding
+
+        # The compressed bytes differ, so a strong validator would lie
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+        return response
+
+    def negotiate(self, header):
+        """ Return the preferred coding accepted by a client, if any """
+        weights = accepted_encodings(header)
+        best, best_weight = None, 0.0
+        for coding in self.encoders:
+            weight = weights.get(coding, weights.get('*', 0.0))
+            if weight > best_weight:
+                best, best_weight = coding, weight
+
+        return best
+
+    def compress(self, content, coding):
+        """ Return the compressed content, reusing earlier compressions """
+        key = (hashlib.blake2b(content, digest_size=16).digest(), coding)
+        compressed = self.variants.get(key)
+        if compressed is None:
+            compressed = self.encoders[coding](content)
+            self.variants.set(key, compressed)
+
+        return compressed
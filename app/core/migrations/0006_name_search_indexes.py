@@ -0,0 +1,42 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+TABLES = ('core_tag', 'core_ingredient')
+
+
+def create_indexes(apps, schema_editor):
+    """ Create prefix and trigram indexes on names (PostgreSQL only) """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table in TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_user_name_prefix '
+            f'ON {table} (user_id, UPPER(name) text_pattern_ops)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_name_trgm '
+            f'ON {table} USING gin (name gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    """ Drop the name search indexes (PostgreSQL only) """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table in TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_user_name_prefix')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    """ Create a trigram index for admin title search (PostgreSQL only) """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS core_recipe_title_trgm '
+        'ON core_recipe USING gin (title gin_trgm_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    """ Drop the title search index (PostgreSQL only) """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS core_recipe_title_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_usershard'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.0.1 on 2026-10-19 06:34
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.expressions
+import django.db.models.functions.text
+
+RELATIONS = (('tag', 'tags'), ('ingredient', 'ingredients'))
+
+
+def merge_duplicates(apps, schema_editor):
+    """ Merge tags and ingredients whose names differ in case or spaces """
+    using = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    Tombstone = apps.get_model('core', 'Tombstone')
+
+    for model_name, field_name in RELATIONS:
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field_name).through
+        column = f'{model_name}_id'
+
+        survivors = {}
+        duplicates = {}
+        owners = {}
+        rows = model.objects.using(using)\
+            .order_by('id')\
+            .values_list('id', 'user_id', 'name')
+        for pk, user_id, name in rows.iterator():
+            key = (user_id, name.strip().lower())
+            if key in survivors:
+                duplicates[pk] = survivors[key]
+                owners[pk] = user_id
+            else:
+                survivors[key] = pk
+
+        if not duplicates:
+            continue
+
+        links = through.objects.using(using)\
+            .filter(**{f'{column}__in': list(duplicates)})
+        existing = set(
+            through.objects.using(using)
+            .filter(**{f'{column}__in': set(duplicates.values())})
+            .values_list('recipe_id', column)
+        )
+        moved = list(links.values_list('recipe_id', column))
+        repointed = {
+            (recipe_id, duplicates[old]) for recipe_id, old in moved
+        } - existing
+
+        through.objects.using(using).bulk_create([
+            through(recipe_id=recipe_id, **{column: pk})
+            for recipe_id, pk in repointed
+        ])
+        links.delete()
+        Recipe.objects.using(using)\
+            .filter(pk__in={recipe_id for recipe_id, _ in moved})\
+            .update(updated_at=timezone.now())
+        model.objects.using(using).filter(pk__in=list(duplicates)).delete()
+        Tombstone.objects.using(using).bulk_create([
+            Tombstone(user_id=owners[pk], model=model_name, object_id=pk)
+            for pk in duplicates
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_userpurge'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(django.db.models.expressions.F('user'), django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('name')), name='ingredient_user_name_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(django.db.models.expressions.F('user'), django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('name')), name='tag_user_name_unique'),
+        ),
+    ]
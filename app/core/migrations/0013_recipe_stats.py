@@ -0,0 +1,38 @@
+# Generated by Django 4.0.1 on 2026-10-19 06:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='core.tag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_time_minutes', models.BigIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tagstats',
+            index=models.Index(fields=['user', '-recipe_count'], name='tagstats_user_count_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# Admin search filters with icontains, which PostgreSQL runs as
+# UPPER(column::text) LIKE UPPER(term), so only a trigram index on that
+# expression can serve it. The bare name indexes stay for trigram_similar.
+INDEXES = (
+    ('core_tag', 'name'),
+    ('core_ingredient', 'name'),
+    ('core_recipe', 'title'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    """ Create trigram indexes on upper-cased names (PostgreSQL only) """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_{column}_upper_trgm '
+            f'ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+    schema_editor.execute('DROP INDEX IF EXISTS core_recipe_title_trgm')
+
+
+def drop_indexes(apps, schema_editor):
+    """ Restore the title index searches used before (PostgreSQL only) """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS core_recipe_title_trgm '
+        'ON core_recipe USING gin (title gin_trgm_ops)'
+    )
+    for table, column in INDEXES:
+        schema_editor.execute(
+            f'DROP INDEX IF EXISTS {table}_{column}_upper_trgm'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_uploadsession'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
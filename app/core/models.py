@@ -1,6 +1,7 @@
 import uuid
 import os
 from django.db import models
+from django.db.models.functions import Lower, Trim
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 from django.conf import settings
@@ -56,6 +57,22 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='tag_user_updated_at_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                models.F('user'), Lower(Trim('name')),
+                name='tag_user_name_unique'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -68,6 +85,22 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='ingredient_user_updated_at_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                models.F('user'), Lower(Trim('name')),
+                name='ingredient_user_name_unique'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -86,6 +119,183 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='recipe_user_updated_at_idx'
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_idx'
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_minutes_idx'
+            ),
+            models.Index(
+                fields=['user', 'title', 'id'],
+                name='recipe_user_title_idx'
+            ),
+            models.Index(fields=['image'], name='recipe_image_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so saves can update the per-user statistics by difference
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return self.title
+
+
+class Tombstone(models.Model):
+    """ Record of a deleted object, used by clients to sync deletions """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    model = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'deleted_at'],
+                name='tombstone_user_deleted_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+class RecipeStats(models.Model):
+    """ Running totals of the recipes of a user """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='recipe_stats'
+    )
+    recipe_count = models.IntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    total_time_minutes = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_count} recipes'
+
+
+class TagStats(models.Model):
+    """ Number of recipes of a user using a tag """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    tag = models.OneToOneField(
+        'Tag',
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    recipe_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-recipe_count'],
+                name='tagstats_user_count_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.tag_id}: {self.recipe_count} recipes'
+
+
+class UploadSession(models.Model):
+    """ Resumable upload of an image for a recipe, received in chunks """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['updated_at'],
+                name='uploadsession_updated_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.filename}: {self.received}/{self.size} bytes'
+
+
+class UserShard(models.Model):
+    """ Directory entry mapping a user to the shard holding their data """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    shard = models.CharField(max_length=64)
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.shard}'
+
+
+class UserPurge(models.Model):
+    """ Background deletion of a user and their data, with its progress """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user_id = models.BigIntegerField(unique=True)
+    email = models.EmailField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUSES,
+                              default=PENDING)
+    total_rows = models.PositiveBigIntegerField(default=0)
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Purge of {self.email}'
+
+    @property
+    def progress(self):
+        """ Return the share of rows deleted so far, in percent """
+        if self.status == self.DONE:
+            return 100
+        if not self.total_rows:
+            return 0
+
+        return min(99, 100 * self.deleted_rows // self.total_rows)
@@ -0,0 +1,194 @@
+"""
+Batched deletion of users with large libraries.
+
+Deleting a user through the ORM loads every row of the cascade into
+memory first. A purge deletes the user's rows table by table instead,
+many-to-many rows first, with DELETE statements bounded to a batch of
+ids, records its progress on a UserPurge row and deletes the user once
+nothing else refers to them.
+
+Every batch also refreshes updated_at. A purge left RUNNING by a process
+that died, such as a recycled web worker, stops being refreshed and is
+claimed again once it is older than HEARTBEAT_TIMEOUT.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.db import sharding
+from core.models import Tag, Ingredient, Recipe, Tombstone, UserPurge, \
+    RecipeStats, TagStats, UploadSession
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+HEARTBEAT_TIMEOUT = 5 * 60
+
+# Rows referencing others come first
+MODELS = (
+    UploadSession,
+    TagStats,
+    RecipeStats,
+    Recipe.tags.through,
+    Recipe.ingredients.through,
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+)
+
+
+def enqueue(users):
+    """ Deactivate users and queue the purge of each of them """
+    purges = [
+        UserPurge.objects.get_or_create(
+            user_id=user.pk,
+            defaults={'email': user.email}
+        )[0]
+        for user in users
+    ]
+    get_user_model().objects\
+        .filter(pk__in=[purge.user_id for purge in purges])\
+        .update(is_active=False)
+
+    return purges
+
+
+def delete_batch(model, using, user_id, size):
+    """ Delete up to size rows of a user from a table, return the count """
+    connection = connections[using]
+    ids = sharding.user_rows(model, using, user_id)\
+        .order_by('pk')\
+        .values('pk')[:size]
+    sql, params = ids.query.sql_with_params()
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({sql})', params)
+        return cursor.rowcount
+
+
+def delete_recipes(using, user_id, size):
+    """ Delete the next batch of a user's recipes and their image files """
+    images = list(
+        sharding.user_rows(Recipe, using, user_id)
+        .order_by('pk')
+        .values_list('image', flat=True)[:size]
+    )
+    deleted = delete_batch(Recipe, using, user_id, size)
+    storage = Recipe._meta.get_field('image').storage
+
+    for name in filter(None, images):
+        storage.delete(name)
+
+    return deleted
+
+
+def stalled():
+    """ Return the condition of purges left running by a dead process """
+    timeout = getattr(settings, 'PURGE_HEARTBEAT_TIMEOUT', HEARTBEAT_TIMEOUT)
+
+    return Q(
+        status=UserPurge.RUNNING,
+        updated_at__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+
+
+def queued(retry=False):
+    """ Return the purges to run, with the failed ones if retrying """
+    statuses = [UserPurge.PENDING]
+    if retry:
+        statuses.append(UserPurge.FAILED)
+
+    return UserPurge.objects.filter(Q(status__in=statuses) | stalled())
+
+
+def run(purge, batch_size=BATCH_SIZE):
+    """ Purge a queued user, returning False if another runner has it """
+    claimed = UserPurge.objects\
+        .filter(
+            Q(status__in=[UserPurge.PENDING, UserPurge.FAILED]) | stalled(),
+            pk=purge.pk
+        )\
+        .update(status=UserPurge.RUNNING, error='', updated_at=timezone.now())
+    if not claimed:
+        return False
+
+    using = sharding.shard_for_user(purge.user_id, fresh=True)
+    progress = UserPurge.objects.filter(pk=purge.pk)
+
+    try:
+        progress.update(
+            total_rows=sum(
+                sharding.user_rows(model, using, purge.user_id).count()
+                for model in MODELS
+            ) + 1,
+            updated_at=timezone.now()
+        )
+
+        for model in MODELS:
+            deleted = batch_size
+            while deleted == batch_size:
+                if model is Recipe:
+                    deleted = delete_recipes(using, purge.user_id, batch_size)
+                else:
+                    deleted = delete_batch(model, using, purge.user_id,
+                                           batch_size)
+                progress.update(
+                    deleted_rows=F('deleted_rows') + deleted,
+                    updated_at=timezone.now()
+                )
+
+        get_user_model().objects.filter(pk=purge.user_id).delete()
+    except Exception as error:
+        logger.exception('Purge of user %s failed', purge.user_id)
+        progress.update(
+            status=UserPurge.FAILED,
+            error=str(error),
+            updated_at=timezone.now()
+        )
+        raise
+
+    progress.update(
+        status=UserPurge.DONE,
+        deleted_rows=F('deleted_rows') + 1,
+        updated_at=timezone.now()
+    )
+
+    return True
+
+
+def run_pending(batch_size=BATCH_SIZE):
+    """ Run every queued or stalled purge, return how many were run """
+    count = 0
+    for purge in queued():
+        count += run(purge, batch_size)
+
+    return count
+
+
+def _run_in_background():
+    try:
+        run_pending()
+    except Exception:
+        # Already logged and recorded on the purge
+        pass
+    finally:
+        connections.close_all()
+
+
+def start_background():
+    """ Run the queued purges in a background thread """
+    threading.Thread(
+        target=_run_in_background,
+        name='user-purge',
+        daemon=True
+    ).start()
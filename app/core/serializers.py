@@ -0,0 +1,49 @@
+import json
+
+from rest_framework import serializers
+
+BATCH_MAX_OPERATIONS = 25
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    """ Serializer for a single operation of a batch """
+    id = serializers.RegexField(r'^\w+$', required=False)
+    method = serializers.ChoiceField(
+        choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+    )
+    path = serializers.CharField()
+    body = serializers.JSONField(default=dict)
+    files = serializers.DictField(
+        child=serializers.CharField(),
+        default=dict
+    )
+
+
+class BatchSerializer(serializers.Serializer):
+    """ Serializer for a batch of operations """
+    operations = serializers.ListField(
+        child=BatchOperationSerializer(),
+        min_length=1,
+        max_length=BATCH_MAX_OPERATIONS
+    )
+
+    def to_internal_value(self, data):
+        """ Accept operations as a JSON string in multipart requests """
+        operations = data.get('operations')
+        if isinstance(operations, str):
+            try:
+                operations = json.loads(operations)
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'operations': 'Operations must be valid JSON.'}
+                )
+
+        return super().to_internal_value({'operations': operations})
+
+    def validate_operations(self, operations):
+        """ Check operation IDs are unique """
+        ids = [op['id'] for op in operations if 'id' in op]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Operation IDs must be unique.')
+
+        return operations
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import pre_delete, post_delete, post_save, \
+    post_migrate, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.db import sharding
+from core.models import Tag, Ingredient, Recipe, Tombstone
+
+
+@receiver(post_migrate)
+def reserve_shard_ids(sender, using, **kwargs):
+    """ Keep the ids of each shard apart once its tables exist """
+    if sender.name == 'core':
+        sharding.reserve_id_range(using)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def place_new_user(sender, instance, created, using, raw=False, **kwargs):
+    """ Assign new users to a shard and create their stub on it """
+    if not created or raw or using != DEFAULT_DB_ALIAS \
+            or len(sharding.shards()) < 2:
+        return
+
+    shard = sharding.ring_shard(instance.pk)
+    sharding.assign(instance.pk, shard)
+
+    if shard != DEFAULT_DB_ALIAS:
+        sender.objects.using(shard).bulk_create([sender(
+            pk=instance.pk,
+            email=instance.email,
+            password=make_password(None),
+            is_active=False
+        )])
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_data(sender, instance, using, **kwargs):
+    """ Delete the data of a user living on another shard """
+    if using != DEFAULT_DB_ALIAS or len(sharding.shards()) < 2:
+        return
+
+    shard = sharding.shard_for_user(instance.pk)
+    if shard != DEFAULT_DB_ALIAS:
+        sender.objects.using(shard).filter(pk=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def create_tombstone(sender, instance, using, **kwargs):
+    """ Record deletions so clients can sync them """
+    Tombstone.objects.using(using).create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk
+    )
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def delete_user_tombstones(sender, instance, using, **kwargs):
+    """ Drop the tombstones recorded while cascading a user deletion """
+    Tombstone.objects.using(using).filter(user_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_of_deleted(sender, instance, using, **kwargs):
+    """ Mark the recipes that lose a tag or ingredient as updated """
+    instance.recipe_set.using(using).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes(sender, instance, action, reverse, pk_set, using,
+                  touched=False, **kwargs):
+    """ Mark recipes as updated when their tags or ingredients change """
+    if touched:
+        return
+
+    recipes = Recipe.objects.using(using)
+
+    if reverse and action == 'pre_clear':
+        instance.recipe_set.using(using).update(updated_at=timezone.now())
+    elif action in ('post_add', 'post_remove'):
+        recipe_ids = pk_set if reverse else [instance.pk]
+        recipes.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    elif action == 'post_clear' and not reverse:
+        recipes.filter(pk=instance.pk).update(updated_at=timezone.now())
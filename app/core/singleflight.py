@@ -0,0 +1,128 @@
+"""
+Single-flight execution of identical work.
+
+Callers of Group.do() passing the same key while a call is running wait
+for it and share its result instead of running the function again. Calls
+are coalesced between the threads of a process and, when the group has a
+directory, between the processes of a host: each key maps to one of a
+fixed set of lock files, and the process holding the lock writes the
+result into the file for the processes queued behind it.
+"""
+import fcntl
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from django.conf import settings
+
+STRIPES = 1024
+
+
+class _Call:
+    """ A running call and, once done, its outcome """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+        return self.value
+
+
+class Group:
+    """ Run a function once at a time per key, sharing its result """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+
+        return getattr(settings, 'SINGLE_FLIGHT_DIR', None)
+
+    def do(self, key, fn):
+        """ Return fn(), or the result of the call already running for key """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            return call.result()
+
+        try:
+            call.value = self._run(key, fn)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.value
+
+    def _run(self, key, fn):
+        """ Run fn, coalescing with other processes if configured to """
+        if not self.directory:
+            return fn()
+
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        stripe = int(digest, 16) % STRIPES
+        path = os.path.join(self.directory, f'{stripe}.lock')
+        started = time.time()
+
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+b') as stripe_file:
+            fcntl.flock(stripe_file, fcntl.LOCK_EX)
+            try:
+                shared = self._read(stripe_file, digest, started)
+                if shared is not None:
+                    return shared[0]
+
+                value = fn()
+                self._write(stripe_file, digest, value)
+                return value
+            finally:
+                fcntl.flock(stripe_file, fcntl.LOCK_UN)
+
+    def _read(self, stripe_file, digest, started):
+        """ Return the result left for a key since started, if any """
+        stripe_file.seek(0)
+        try:
+            written_digest, written_at, value = pickle.load(stripe_file)
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            return None
+
+        if written_digest != digest or written_at < started:
+            return None
+
+        return (value,)
+
+    def _write(self, stripe_file, digest, value):
+        """ Leave the result of a key for the processes waiting on it """
+        try:
+            data = pickle.dumps((digest, time.time(), value))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+
+        stripe_file.seek(0)
+        stripe_file.truncate()
+        stripe_file.write(data)
+        stripe_file.flush()
+
+
+group = Group()
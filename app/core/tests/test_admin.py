@@ -3,6 +3,9 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
 
+from core.admin import EstimatedCountPaginator
+from core.models import Tag, Recipe
+
 
 class AdminSiteTests(TestCase):
 
@@ -40,3 +43,35 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_recipes_listed(self):
+        """Test that recipes are listed with their user"""
+        Recipe.objects.create(
+            user=self.user, title='Pancakes', time_minutes=10, price=3
+        )
+        url = reverse('admin:core_recipe_changelist')
+
+        with self.assertNumQueries(4):
+            res = self.client.get(url)
+
+        self.assertContains(res, 'Pancakes')
+        self.assertContains(res, self.user.email)
+
+    def test_recipe_page_change(self):
+        """Test that the recipe edit page does not load every tag"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Pancakes', time_minutes=10, price=3
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Sweet'))
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'admin-autocomplete')
+
+    def test_paginator_counts_small_tables(self):
+        """Test that small or non-PostgreSQL tables get an exact count"""
+        Tag.objects.create(user=self.user, name='Sweet')
+        paginator = EstimatedCountPaginator(Tag.objects.order_by('id'), 10)
+
+        self.assertEqual(paginator.count, 1)
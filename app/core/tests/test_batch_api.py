@@ -0,0 +1,121 @@
+import json
+import tempfile
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+
+BATCH_URL = reverse('core:batch')
+
+
+class BatchApiTests(TestCase):
+    """ Test batch API """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@gmail.com',
+            password='myinsecurepassword!'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def tearDown(self) -> None:
+        for recipe in Recipe.objects.all():
+            recipe.image.delete()
+
+    def test_save_recipe_flow(self) -> None:
+        """ Test later operations can reference earlier results """
+        operations = [
+            {'id': 'tag', 'method': 'POST', 'path': '/api/recipes/tags/',
+             'body': {'name': 'Vegan'}},
+            {'id': 'ingredient', 'method': 'POST',
+             'path': '/api/recipes/ingredients/', 'body': {'name': 'Tofu'}},
+            {'id': 'recipe', 'method': 'POST',
+             'path': '/api/recipes/recipes/',
+             'body': {'title': 'Tofu Bowl', 'time_minutes': 15,
+                      'price': '8.00', 'tags': ['${tag.id}'],
+                      'ingredients': ['${ingredient.id}']}},
+            {'method': 'POST',
+             'path': '/api/recipes/recipes/${recipe.id}/upload-image/',
+             'files': {'image': 'photo'}},
+        ]
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(
+                BATCH_URL,
+                {'operations': json.dumps(operations), 'photo': ntf},
+                format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in res.data['responses']],
+            [201, 201, 201, 200]
+        )
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.tags.get().name, 'Vegan')
+        self.assertEqual(recipe.ingredients.get().name, 'Tofu')
+        self.assertTrue(recipe.image)
+
+    def test_failed_operation_rolls_back(self) -> None:
+        """ Test a failing operation rolls back the whole batch """
+        operations = [
+            {'method': 'POST', 'path': '/api/recipes/tags/',
+             'body': {'name': 'Vegan'}},
+            {'method': 'POST', 'path': '/api/recipes/recipes/',
+             'body': {'title': 'No price'}},
+        ]
+
+        res = self.client.post(
+            BATCH_URL, {'operations': operations}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['responses'][1]['status'], 400)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_unknown_reference(self) -> None:
+        """ Test referencing an unknown result fails """
+        operations = [
+            {'method': 'GET', 'path': '/api/recipes/recipes/${nope.id}/'},
+        ]
+
+        res = self.client.post(
+            BATCH_URL, {'operations': operations}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_path_not_allowed(self) -> None:
+        """ Test only API routes can be used in a batch """
+        operations = [{'method': 'POST', 'path': '/api/batch/'}]
+
+        res = self.client.post(
+            BATCH_URL, {'operations': operations}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_auth_required(self) -> None:
+        """ Test authentication is required for batches """
+        self.client.credentials()
+
+        res = self.client.post(
+            BATCH_URL,
+            {'operations': [{'method': 'GET', 'path': '/api/users/me'}]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,23 +1,136 @@
-from unittest.mock import patch
+from io import StringIO
+from unittest.mock import patch, Mock, MagicMock
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.management.commands.serve import recycle_worker, \
+    warm_up_connections
+from core.models import Recipe
+
 
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """ Test waiting for db when db is ready """
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
             call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+            self.assertEqual(gi.return_value.cursor.call_count, 1)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
-        """ Test waiting for db """
+        """ Test waiting for db backs off between connection attempts """
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
+            gi.return_value.cursor.side_effect = \
+                [OperationalError] * 5 + [MagicMock()]
             call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+            self.assertEqual(gi.return_value.cursor.call_count, 6)
+
+        self.assertEqual(
+            [c[0][0] for c in ts.call_args_list],
+            [1, 2, 4, 8, 10]
+        )
+
+    @patch('time.monotonic', side_effect=[0, 0, 5])
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts, tm):
+        """ Test waiting for db gives up after the timeout """
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value.cursor.side_effect = OperationalError
+            with self.assertRaises(OperationalError):
+                call_command('wait_for_db', timeout=5)
+
+
+class ServeCommandTests(TestCase):
+
+    @patch('core.management.commands.serve.Server.run')
+    def test_serve_preloads_workers(self, run):
+        """ Test serve starts a preforking server with the given options """
+        with patch('core.management.commands.serve.Server.__init__',
+                   return_value=None) as init:
+            call_command('serve', workers=3, threads=4, max_memory=256,
+                         stdout=StringIO())
+
+        application, options, max_memory = init.call_args[0]
+        self.assertEqual(options['workers'], 3)
+        self.assertEqual(options['threads'], 4)
+        self.assertTrue(options['preload_app'])
+        self.assertEqual(max_memory, 256)
+        run.assert_called_once()
+
+    @patch('core.management.commands.serve.connections')
+    def test_warm_up_returns_connections(self, connections):
+        """ Test connections opened by the warm up are closed again """
+        connection = Mock()
+        connections.all.return_value = [connection]
+
+        warm_up_connections(Mock())
+
+        connection.ensure_connection.assert_called_once_with()
+        connection.pool.fill.assert_called_once_with()
+        connections.close_all.assert_called_once_with()
+
+    @patch('core.management.commands.serve.memory_usage', return_value=600)
+    def test_recycle_worker_over_memory_limit(self, mu):
+        """ Test workers above the memory limit are recycled """
+        worker = Mock(alive=True)
+
+        recycle_worker(worker, 512)
+        self.assertFalse(worker.alive)
+
+    @patch('core.management.commands.serve.memory_usage', return_value=100)
+    def test_keep_worker_under_memory_limit(self, mu):
+        """ Test workers under the memory limit keep running """
+        worker = Mock(alive=True)
+
+        recycle_worker(worker, 512)
+        self.assertTrue(worker.alive)
+
+
+class ExpireUploadsCommandTests(TestCase):
+
+    @patch('recipe.uploads.expire', return_value=3)
+    def test_expire_uploads(self, expire):
+        """ Test the command expires idle upload sessions """
+        out = StringIO()
+
+        call_command('expire_uploads', stdout=out)
+
+        expire.assert_called_once_with()
+        self.assertIn('Expired 3 upload sessions', out.getvalue())
+
+
+class BenchmarkCommandTests(TestCase):
+    """ Test the benchmark command """
+
+    def test_prepared_needs_postgresql(self) -> None:
+        """ Test the prepared benchmark refuses other databases """
+        get_user_model().objects.create_user('test@joseloarca.com', 'pass')
+
+        with self.assertRaisesMessage(CommandError, 'needs PostgreSQL'):
+            call_command('benchmark', 'prepared')
+
+    def test_writes(self) -> None:
+        """ Test the writes benchmark reports and rolls back its writes """
+        user = get_user_model().objects.create_user(
+            'test@joseloarca.com', 'pass'
+        )
+        out = StringIO()
+
+        call_command('benchmark', 'writes', repeat=2, stdout=out)
+
+        self.assertIn('update changed', out.getvalue())
+        self.assertFalse(Recipe.objects.filter(user=user).exists())
+
+    def test_middleware(self) -> None:
+        """ Test the middleware benchmark reports both stacks """
+        get_user_model().objects.create_user('test@joseloarca.com', 'pass')
+        out = StringIO()
+
+        call_command('benchmark', 'middleware', repeat=2, stdout=out)
+
+        self.assertIn('full us', out.getvalue())
+        self.assertIn('liveness', out.getvalue())
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+LIVENESS_URL = reverse('core:liveness')
+READINESS_URL = reverse('core:readiness')
+
+
+class HealthApiTests(TestCase):
+    """ Test liveness and readiness probes """
+    databases = '__all__'
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def test_liveness(self) -> None:
+        """ Test the liveness probe answers without authentication """
+        res = self.client.get(LIVENESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_readiness(self) -> None:
+        """ Test the readiness probe reports database latency """
+        res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['databases']['default']['ok'])
+        self.assertIn('latency_ms', res.data['databases']['default'])
+
+    def test_readiness_database_down(self) -> None:
+        """ Test the readiness probe fails when the database is down """
+        with patch('django.db.backends.base.base.BaseDatabaseWrapper.cursor',
+                   side_effect=OperationalError('down')):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(res.data['databases']['default']['ok'])
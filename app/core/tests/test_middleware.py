@@ -0,0 +1,148 @@
+import gzip
+import json
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import middleware
+from core.models import Tag
+
+TAGS_URL = reverse('recipe:tag-list')
+ADMIN_LOGIN_URL = reverse('admin:login')
+
+
+class PathScopedMiddlewareTests(TestCase):
+    """ Test the site middleware runs outside the API only """
+
+    def test_api_skips_site_middleware(self) -> None:
+        """ Test API responses carry no session or framing headers """
+        user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Frame-Options', res)
+        self.assertNotIn('Cookie', res.get('Vary', ''))
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+
+    def test_admin_runs_site_middleware(self) -> None:
+        """ Test admin pages get sessions, CSRF checks and framing headers """
+        client = Client(enforce_csrf_checks=True)
+
+        page = client.get(ADMIN_LOGIN_URL)
+        forged = client.post(ADMIN_LOGIN_URL, {
+            'username': 'test@joseloarca.com',
+            'password': 'testpass',
+        })
+
+        self.assertEqual(page.status_code, status.HTTP_200_OK)
+        self.assertEqual(page['X-Frame-Options'], 'DENY')
+        self.assertTrue(hasattr(page.wsgi_request, 'session'))
+        self.assertEqual(forged.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(COMPRESSION={'MIN_SIZE': 100, 'GZIP_LEVEL': 1})
+class CompressionApiTests(TestCase):
+    """ Test compression of API responses """
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client = APIClient(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.client.force_authenticate(self.user)
+
+    def test_large_response_compressed(self) -> None:
+        """ Test responses over the threshold are gzipped """
+        for number in range(20):
+            Tag.objects.create(user=self.user, name=f'Tag {number}')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        tags = json.loads(gzip.decompress(res.content))
+        self.assertEqual(len(tags), 20)
+
+    def test_site_pages_untouched(self) -> None:
+        """ Test pages with CSRF tokens are never compressed """
+        client = Client(HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+
+        res = client.get(reverse('admin:login'), {'q': 'x' * 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('csrfmiddlewaretoken', res.content.decode())
+        self.assertNotIn('Content-Encoding', res)
+
+    def test_small_response_untouched(self) -> None:
+        """ Test responses under the threshold are sent as they are """
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('Content-Encoding', res)
+        self.assertEqual(res.json(), [])
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """ Test content negotiation and reuse of compressed bodies """
+
+    def setUp(self) -> None:
+        self.body = json.dumps([{'name': 'Tag'}] * 100).encode()
+        self.compression = middleware.CompressionMiddleware(
+            lambda request: HttpResponse(
+                self.body, content_type='application/json'
+            )
+        )
+
+    def request(self, accept_encoding):
+        """ Run a request accepting some encodings through the middleware """
+        request = RequestFactory().get(
+            '/api/', HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+        return self.compression(request)
+
+    def test_negotiation(self) -> None:
+        """ Test quality values are honoured """
+        self.assertEqual(self.compression.negotiate('gzip;q=0.5'), 'gzip')
+        self.assertIsNone(self.compression.negotiate('gzip;q=0, identity'))
+        self.assertIsNone(self.compression.negotiate(''))
+
+        res = self.request('gzip;q=0')
+        self.assertEqual(res.content, self.body)
+
+    def test_hot_responses_compressed_once(self) -> None:
+        """ Test identical bodies reuse the compressed variant """
+        with mock.patch('core.middleware.gzip.compress',
+                        wraps=gzip.compress) as compress:
+            first = self.request('gzip')
+            second = self.request('gzip')
+
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(gzip.decompress(second.content), self.body)
+
+    @skipIf(middleware.brotli is None, 'Brotli is not installed')
+    def test_brotli_preferred(self) -> None:
+        """ Test brotli is chosen over gzip when both are accepted """
+        self.assertEqual(self.compression.negotiate('gzip, br'), 'br')
+        self.assertEqual(
+            self.compression.negotiate('gzip, br;q=0.5'),
+            'gzip'
+        )
+
+        res = self.request('gzip, deflate, br')
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(res.content), self.body)
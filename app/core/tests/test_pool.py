@@ -0,0 +1,71 @@
+from unittest.mock import Mock
+
+from django.test import SimpleTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+def sample_pool(**params):
+    """ Create a pool of mock connections """
+    defaults = {
+        'connect': Mock(side_effect=lambda: Mock()),
+        'check': Mock(return_value=True),
+        'reset': Mock(),
+        'max_size': 2,
+        'timeout': 0.01,
+    }
+    defaults.update(params)
+
+    return ConnectionPool(**defaults)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """ Test the database connection pool """
+
+    def test_connections_reused(self) -> None:
+        """ Test connections given back are handed out again """
+        pool = sample_pool()
+
+        connection = pool.getconn()
+        pool.putconn(connection)
+
+        self.assertIs(pool.getconn(), connection)
+        self.assertEqual(pool.connect.call_count, 1)
+
+    def test_pool_bounded(self) -> None:
+        """ Test no more than max_size connections are opened """
+        pool = sample_pool()
+        pool.getconn()
+        pool.getconn()
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+        self.assertEqual(pool.stats()['saturation'], 1)
+
+    def test_discarded_connections_closed(self) -> None:
+        """ Test discarded connections are closed and free a slot """
+        pool = sample_pool(max_size=1)
+        connection = pool.getconn()
+
+        pool.putconn(connection, discard=True)
+
+        connection.close.assert_called_once()
+        self.assertIsNot(pool.getconn(), connection)
+
+    def test_unhealthy_idle_connection_replaced(self) -> None:
+        """ Test idle connections failing the health check are replaced """
+        pool = sample_pool(check=Mock(return_value=False), check_interval=0)
+        connection = pool.getconn()
+        pool.putconn(connection)
+
+        self.assertIsNot(pool.getconn(), connection)
+        connection.close.assert_called_once()
+
+    def test_fill(self) -> None:
+        """ Test the pool can be filled up to its minimum size """
+        pool = sample_pool(min_size=2)
+
+        pool.fill()
+
+        self.assertEqual(pool.stats()['idle'], 2)
@@ -0,0 +1,62 @@
+from django.test import SimpleTestCase
+
+from core.db.backends.postgresql import prepared
+
+
+class StatementCacheTests(SimpleTestCase):
+    """ Test the per-connection cache of prepared statements """
+
+    def test_prepared_after_threshold(self) -> None:
+        """ Test queries are prepared once seen often enough """
+        statements = prepared.StatementCache(max_size=10, threshold=2)
+
+        self.assertEqual(statements.use('SELECT 1'), (None, False))
+        name, prepare = statements.use('SELECT 1')
+        self.assertTrue(prepare)
+        self.assertEqual(statements.use('SELECT 1'), (name, False))
+        self.assertEqual(statements.hits, 1)
+
+    def test_least_recently_used_evicted(self) -> None:
+        """ Test the oldest statement is evicted and queued for DEALLOCATE """
+        statements = prepared.StatementCache(max_size=2, threshold=1)
+        first, _ = statements.use('SELECT 1')
+        statements.use('SELECT 2')
+        statements.use('SELECT 1')
+
+        statements.use('SELECT 3')
+
+        self.assertEqual(list(statements.statements), ['SELECT 1', 'SELECT 3'])
+        self.assertEqual(len(statements.evicted), 1)
+        self.assertNotEqual(statements.evicted[0], first)
+
+    def test_unpreparable_queries_skipped(self) -> None:
+        """ Test queries that failed to prepare run as they are """
+        statements = prepared.StatementCache(max_size=10, threshold=1)
+        name, _ = statements.use('SELECT $1')
+
+        statements.discard('SELECT $1', preparable=False)
+
+        self.assertEqual(statements.evicted, [name])
+        self.assertEqual(statements.use('SELECT $1'), (None, False))
+
+    def test_discarded_statements_prepared_again(self) -> None:
+        """ Test a statement that failed to execute is prepared anew """
+        statements = prepared.StatementCache(max_size=10, threshold=1)
+        name, _ = statements.use('SELECT 1')
+
+        statements.discard('SELECT 1')
+
+        self.assertEqual(statements.evicted, [name])
+        new_name, prepare = statements.use('SELECT 1')
+        self.assertTrue(prepare)
+        self.assertNotEqual(new_name, name)
+
+    def test_to_positional(self) -> None:
+        """ Test placeholders become positional parameters """
+        sql = "SELECT * FROM t WHERE a = %s AND b LIKE '%%x' AND c = %s"
+
+        self.assertEqual(
+            prepared.to_positional(sql),
+            "SELECT * FROM t WHERE a = $1 AND b LIKE '%x' AND c = $2"
+        )
+        self.assertEqual(prepared.placeholders(sql), 2)
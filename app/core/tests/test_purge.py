@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import purge
+from core.models import Tag, Ingredient, Recipe, Tombstone, UserPurge
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def sample_library(user, recipes=3):
+    """ Create recipes with tags, ingredients and images for a user """
+    tag = Tag.objects.create(user=user, name='Vegan')
+    ingredient = Ingredient.objects.create(user=user, name='Salt')
+
+    for number in range(recipes):
+        recipe = Recipe.objects.create(
+            user=user, title=f'Recipe {number}', time_minutes=5, price=1
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        recipe.image.save('sample.jpg', ContentFile(b'image'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PurgeTests(TestCase):
+    """ Test purging users with their data """
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@joseloarca.com',
+            'testpass'
+        )
+        sample_library(self.user)
+        sample_library(self.other, recipes=1)
+
+    def test_purge_in_batches(self) -> None:
+        """ Test a purge deletes every row, file and the user in batches """
+        images = [recipe.image.path for recipe in self.user.recipe_set.all()]
+        queued, = purge.enqueue([self.user])
+
+        self.assertTrue(purge.run(queued, batch_size=2))
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, UserPurge.DONE)
+        self.assertEqual(queued.deleted_rows, queued.total_rows)
+        self.assertEqual(queued.progress, 100)
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
+        self.assertFalse(Recipe.objects.filter(user_id=self.user.pk).exists())
+        self.assertFalse(Tag.objects.filter(user_id=self.user.pk).exists())
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertFalse(any(os.path.exists(path) for path in images))
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 1)
+        self.assertEqual(
+            Recipe.tags.through.objects
+            .filter(recipe__user=self.other).count(),
+            1
+        )
+
+    def test_enqueue_deactivates_users(self) -> None:
+        """ Test queued users can no longer log in """
+        purge.enqueue([self.user])
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(UserPurge.objects.get().status, UserPurge.PENDING)
+
+    def test_purge_claimed_once(self) -> None:
+        """ Test a purge already running is not run again """
+        queued, = purge.enqueue([self.user])
+        UserPurge.objects.update(status=UserPurge.RUNNING)
+
+        self.assertFalse(purge.run(queued))
+
+    def test_stalled_purge_reclaimed(self) -> None:
+        """ Test a purge left running by a dead process is run again """
+        queued, = purge.enqueue([self.user])
+        UserPurge.objects.update(
+            status=UserPurge.RUNNING,
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(purge.run_pending(), 1)
+
+        self.assertEqual(UserPurge.objects.get().status, UserPurge.DONE)
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
+
+    def test_admin_action(self) -> None:
+        """ Test the admin action queues purges for the background """
+        admin = get_user_model().objects.create_superuser(
+            'admin@joseloarca.com',
+            'adminpass'
+        )
+        self.client.force_login(admin)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('admin:core_user_changelist'), {
+                'action': 'purge_users',
+                '_selected_action': [self.user.pk],
+            })
+
+        self.assertEqual(callbacks, [purge.start_background])
+        self.assertEqual(UserPurge.objects.get().user_id, self.user.pk)
+
+    def test_purge_command(self) -> None:
+        """ Test the command purges the given users """
+        out = StringIO()
+
+        call_command('purge_users', self.user.pk, batch_size=2, stdout=out)
+
+        self.assertIn('Purged test@joseloarca.com', out.getvalue())
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
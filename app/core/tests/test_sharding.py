@@ -0,0 +1,160 @@
+from collections import Counter
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import routing, sharding
+from core.db.routers import ShardRouter
+from core.models import Tag, Recipe, UserShard
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(DATABASE_SHARDS=['default', 'shard1', 'shard2'])
+class ShardingTests(SimpleTestCase):
+    """ Test the placement of users on shards """
+
+    def test_ring_spreads_users(self) -> None:
+        """ Test users are spread over every shard """
+        placement = Counter(sharding.ring_shard(pk) for pk in range(3000))
+
+        self.assertEqual(set(placement), {'default', 'shard1', 'shard2'})
+        self.assertGreater(min(placement.values()), 500)
+
+    def test_adding_a_shard_only_moves_users_to_it(self) -> None:
+        """ Test a new shard only takes users, it does not reshuffle """
+        before = {pk: sharding.ring_shard(pk) for pk in range(1000)}
+
+        with self.settings(
+                DATABASE_SHARDS=['default', 'shard1', 'shard2', 'shard3']):
+            after = {pk: sharding.ring_shard(pk) for pk in range(1000)}
+
+        moved = [pk for pk in before if before[pk] != after[pk]]
+        self.assertTrue(moved)
+        self.assertTrue(all(after[pk] == 'shard3' for pk in moved))
+
+    def test_sharded_models(self) -> None:
+        """ Test user data and its M2M tables are sharded, users are not """
+        self.assertTrue(sharding.is_sharded(Tag))
+        self.assertTrue(sharding.is_sharded(Recipe.tags.through))
+        self.assertFalse(sharding.is_sharded(get_user_model()))
+        self.assertFalse(sharding.is_sharded(UserShard))
+
+    def test_router_uses_request_shard(self) -> None:
+        """ Test sharded models follow the shard of the current request """
+        router = ShardRouter()
+
+        with routing.request_scope() as state:
+            state.shard = 'shard2'
+
+            self.assertEqual(router.db_for_read(Tag), 'shard2')
+            self.assertIsNone(router.db_for_read(get_user_model()))
+
+    @override_settings(DATABASE_SHARDS=['default'])
+    def test_router_idle_with_one_shard(self) -> None:
+        """ Test the router leaves routing alone without extra shards """
+        with routing.request_scope() as state:
+            state.shard = 'default'
+
+            self.assertIsNone(ShardRouter().db_for_read(Tag))
+
+
+@skipUnless(
+    len(settings.DATABASE_SHARDS) > 1,
+    'needs more than one shard'
+)
+class ShardingApiTests(TransactionTestCase):
+    """ Test the API on sharded user data """
+    databases = '__all__'
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_new_user_placed_on_shard(self) -> None:
+        """ Test new users get a directory entry and a stub on their shard """
+        entry = UserShard.objects.get(user=self.user)
+
+        self.assertEqual(entry.shard, sharding.ring_shard(self.user.pk))
+        self.assertTrue(
+            get_user_model().objects.using(entry.shard)
+            .filter(pk=self.user.pk).exists()
+        )
+
+    def test_data_stored_on_user_shard(self) -> None:
+        """ Test created objects land on the shard of their user """
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        shard = sharding.shard_for_user(self.user.pk)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            Tag.objects.using(shard).filter(pk=res.data['id']).exists()
+        )
+        for other in set(settings.DATABASE_SHARDS) - {shard}:
+            self.assertFalse(Tag.objects.using(other).exists())
+
+    def test_writes_refused_while_moving(self) -> None:
+        """ Test writes get a 503 while the user's data is being moved """
+        sharding.assign(
+            self.user.pk, sharding.shard_for_user(self.user.pk), moving=True
+        )
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', res)
+        self.assertEqual(
+            self.client.get(TAGS_URL).status_code,
+            status.HTTP_200_OK
+        )
+
+    def test_writes_see_moves_past_the_cache(self) -> None:
+        """ Test writes read the directory, not a cached entry """
+        shard = sharding.shard_for_user(self.user.pk)
+        UserShard.objects.filter(user=self.user).update(moving=True)
+        self.assertEqual(sharding.directory(self.user.pk), (shard, False))
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_move_user_shard(self) -> None:
+        """ Test moving a user keeps their data and ids """
+        tag = self.client.post(TAGS_URL, {'name': 'Vegan'}).data
+        recipe = self.client.post(RECIPES_URL, {
+            'title': 'Salad',
+            'time_minutes': 5,
+            'price': '2.00',
+            'tags': [tag['id']],
+        }).data
+        source = sharding.shard_for_user(self.user.pk)
+        target = next(
+            shard for shard in settings.DATABASE_SHARDS if shard != source
+        )
+
+        call_command(
+            'move_user_shard', self.user.pk, target, drain=0,
+            stdout=StringIO()
+        )
+
+        self.assertEqual(sharding.directory(self.user.pk), (target, False))
+        self.assertFalse(Tag.objects.using(source).exists())
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['id'], recipe['id'])
+        self.assertEqual(res.data[0]['tags'], [tag['id']])
@@ -0,0 +1,98 @@
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import singleflight
+
+
+class SingleFlightTests(SimpleTestCase):
+    """ Test coalescing identical work in flight """
+
+    def run_concurrently(self, groups, key, fn, count=5):
+        """ Call fn through groups from many threads at once """
+        results, errors = [], []
+        started = threading.Barrier(count)
+
+        def call(group):
+            started.wait()
+            try:
+                results.append(group.do(key, fn))
+            except Exception as error:
+                errors.append(error)
+
+        threads = [
+            threading.Thread(target=call, args=(groups[i % len(groups)],))
+            for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results, errors
+
+    def slow(self, calls, value='result'):
+        """ Return a function counting its calls and releasing on demand """
+        release = threading.Event()
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return value
+
+        threading.Timer(0.2, release.set).start()
+        return fn
+
+    def test_threads_share_result(self) -> None:
+        """ Test concurrent calls with the same key run once """
+        calls = []
+
+        results, _ = self.run_concurrently(
+            [singleflight.Group(directory='')], 'key', self.slow(calls)
+        )
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+
+    def test_errors_shared(self) -> None:
+        """ Test the callers waiting on a failed call get its error """
+        release = threading.Event()
+        threading.Timer(0.2, release.set).start()
+
+        def fail():
+            release.wait(5)
+            raise ValueError('failed')
+
+        results, errors = self.run_concurrently(
+            [singleflight.Group(directory='')], 'key', fail
+        )
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 5)
+
+    def test_later_calls_run_again(self) -> None:
+        """ Test results are not kept once the call is over """
+        group = singleflight.Group(directory='')
+        fn = mock.Mock(side_effect=[1, 2])
+
+        self.assertEqual(group.do('key', fn), 1)
+        self.assertEqual(group.do('key', fn), 2)
+
+    def test_processes_share_result(self) -> None:
+        """ Test groups sharing a directory coalesce like processes """
+        calls = []
+        with tempfile.TemporaryDirectory() as directory:
+            groups = [
+                singleflight.Group(directory=directory) for _ in range(5)
+            ]
+
+            results, _ = self.run_concurrently(
+                groups, 'key', self.slow(calls)
+            )
+            later = groups[0].do('key', lambda: 'fresh')
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(later, 'fresh')
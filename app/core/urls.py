@@ -0,0 +1,11 @@
+from django.urls import path
+
+from core import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('api/batch/', views.BatchView.as_view(), name='batch'),
+    path('health/live', views.LivenessView.as_view(), name='liveness'),
+    path('health/ready', views.ReadinessView.as_view(), name='readiness'),
+]
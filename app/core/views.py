@@ -0,0 +1,89 @@
+from contextlib import ExitStack
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from rest_framework import views, status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.response import Response
+
+from core import batch, health
+from core.db import sharding
+from core.serializers import BatchSerializer
+
+
+class BatchView(views.APIView):
+    """ Run a list of API operations in a single transaction """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        """
+        Run the operations in order, stopping and rolling back everything
+        at the first one that fails
+        """
+        serializer = BatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = {}
+        responses = []
+        databases = {
+            DEFAULT_DB_ALIAS,
+            sharding.shard_for_user(request.user.pk, fresh=True)
+        }
+
+        with ExitStack() as stack:
+            for using in databases:
+                stack.enter_context(transaction.atomic(using=using))
+
+            for operation in serializer.validated_data['operations']:
+                response = batch.run_operation(request, operation, results)
+                data = getattr(response, 'data', None)
+                responses.append({
+                    'id': operation.get('id'),
+                    'status': response.status_code,
+                    'body': data,
+                })
+
+                if response.status_code >= 400:
+                    for using in databases:
+                        transaction.set_rollback(True, using=using)
+                    return Response(
+                        {'responses': responses},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                if 'id' in operation:
+                    results[operation['id']] = data
+
+        return Response({'responses': responses}, status=status.HTTP_200_OK)
+
+
+class LivenessView(views.APIView):
+    """ Report that the process is up and answering requests """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        return Response({'status': 'ok'}, status=status.HTTP_200_OK)
+
+
+class ReadinessView(views.APIView):
+    """ Report whether every database is reachable and has capacity """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        databases = {alias: health.check_database(alias)
+                     for alias in connections}
+        ready = all(check['ok'] for check in databases.values())
+
+        return Response(
+            {'status': 'ok' if ready else 'unavailable',
+             'databases': databases},
+            status=status.HTTP_200_OK if ready
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
@@ -0,0 +1,153 @@
+from django.db import connections
+from django.db.models import BooleanField, Case, Count, Q, Value, When
+
+from core.models import Tag, Ingredient
+
+from recipe.cache import UserIndexCache
+
+
+class Trie:
+    """ Prefix tree over lowercased names """
+
+    def __init__(self):
+        self.root = {}
+        self.entries = {}
+
+    def insert(self, entry):
+        """ Add an entry with an id, a name and a usage count """
+        node = self.root
+        for char in entry['name'].lower():
+            node = node.setdefault(char, {})
+
+        node.setdefault(None, []).append(entry)
+        self.entries[entry['id']] = entry
+
+    def _collect(self, node):
+        """ Return every entry stored under a node """
+        entries = []
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char is None:
+                    entries.extend(child)
+                else:
+                    stack.append(child)
+
+        return entries
+
+    def prefix(self, term):
+        """ Return the entries whose name starts with term """
+        node = self.root
+        for char in term:
+            node = node.get(char)
+            if node is None:
+                return []
+
+        return self._collect(node)
+
+    def fuzzy(self, term, max_distance):
+        """
+        Return the entries with a name prefix within max_distance edits of
+        term, computing one Levenshtein row per trie node
+        """
+        entries = []
+        stack = [
+            (char, child, list(range(len(term) + 1)))
+            for char, child in self.root.items() if char is not None
+        ]
+
+        while stack:
+            char, node, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i in range(1, len(term) + 1):
+                row.append(min(
+                    row[i - 1] + 1,
+                    previous[i] + 1,
+                    previous[i - 1] + (term[i - 1] != char)
+                ))
+
+            if row[-1] <= max_distance:
+                entries.extend(self._collect(node))
+            elif min(row) <= max_distance:
+                stack.extend(
+                    (next_char, child, row)
+                    for next_char, child in node.items()
+                    if next_char is not None
+                )
+
+        return entries
+
+    def search(self, term, limit):
+        """ Return prefix matches first, then typo-tolerant matches """
+        def rank(entry):
+            return -entry['usage'], entry['name'].lower()
+
+        matches = sorted(self.prefix(term), key=rank)
+        seen = {entry['id'] for entry in matches}
+
+        if len(matches) < limit and len(term) > 2:
+            fuzzy = [
+                entry
+                for entry in self.fuzzy(term, 1 if len(term) < 6 else 2)
+                if entry['id'] not in seen
+            ]
+            matches += sorted(fuzzy, key=rank)
+
+        return [dict(entry) for entry in matches[:limit]]
+
+
+def usage_queryset(model, user_id):
+    """ Return the objects of a user annotated with their recipe count """
+    return model.objects\
+        .filter(user_id=user_id)\
+        .annotate(usage=Count('recipe'))
+
+
+def trie_builder(model):
+    """ Return a function building the name trie of a user """
+    def build(user_id):
+        trie = Trie()
+        for entry in usage_queryset(model, user_id)\
+                .values('id', 'name', 'usage'):
+            trie.insert(entry)
+
+        return trie
+
+    return build
+
+
+tries = {
+    model: UserIndexCache(
+        f'autocomplete:{model._meta.model_name}',
+        trie_builder(model)
+    )
+    for model in (Tag, Ingredient)
+}
+
+
+def search_database(model, user_id, term, limit):
+    """ Search names with the prefix and trigram indexes of PostgreSQL """
+    return list(
+        usage_queryset(model, user_id)
+        .filter(Q(name__istartswith=term) | Q(name__trigram_similar=term))
+        .annotate(prefix=Case(
+            When(name__istartswith=term, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField()
+        ))
+        .order_by('-prefix', '-usage', 'name')
+        .values('id', 'name', 'usage')[:limit]
+    )
+
+
+def suggest(model, user_id, term, limit):
+    """ Return up to limit names of a user matching term, most used first """
+    term = term.strip().lower()
+    queryset = model.objects.all()
+
+    if connections[queryset.db].vendor == 'postgresql':
+        return search_database(model, user_id, term, limit)
+
+    return tries[model].get(user_id).search(term, limit)
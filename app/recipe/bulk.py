@@ -0,0 +1,160 @@
+"""
+Set-based updates and deletes of many recipes at once.
+
+The recipes are selected once, then each change is a single statement
+over all of them, all in one transaction. These statements bypass the
+model signals, so the tombstones, timestamps, per-user indexes and
+statistics those signals maintain are kept up to date here.
+"""
+import os
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from core.models import Recipe, Tombstone, UploadSession
+
+from recipe import pantry, autocomplete, stats, uploads
+
+RELATIONS = ('tags', 'ingredients')
+
+
+def select(user, ids=None, tags=None, ingredients=None):
+    """ Return the ids of the recipes of a user matching the criteria """
+    recipes = Recipe.objects.filter(user=user)
+
+    if ids is not None:
+        recipes = recipes.filter(pk__in=ids)
+    if tags:
+        recipes = recipes.filter(tags__id__in=tags)
+    if ingredients:
+        recipes = recipes.filter(ingredients__id__in=ingredients)
+
+    return list(recipes.order_by().values_list('pk', flat=True).distinct())
+
+
+def invalidate_indexes(user_id, using=None):
+    """ Drop the cached pantry and autocomplete indexes of a user """
+    pantry.indexes.invalidate(user_id, using)
+    for trie in autocomplete.tries.values():
+        trie.invalidate(user_id, using)
+
+
+def add_related(using, recipe_ids, name, related_ids):
+    """ Relate every recipe to every object, return the rows inserted """
+    field = Recipe._meta.get_field(name)
+    through = field.remote_field.through
+    connection = connections[using]
+    quote = connection.ops.quote_name
+
+    table = quote(through._meta.db_table)
+    source = quote(field.m2m_column_name())
+    target = quote(field.m2m_reverse_name())
+    recipes = ', '.join(['%s'] * len(recipe_ids))
+    related = ', '.join(['%s'] * len(related_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({source}, {target}) '
+            f'SELECT r.id, t.id '
+            f'FROM {quote(Recipe._meta.db_table)} r, '
+            f'{quote(field.related_model._meta.db_table)} t '
+            f'WHERE r.id IN ({recipes}) AND t.id IN ({related}) '
+            f'AND NOT EXISTS (SELECT 1 FROM {table} x '
+            f'WHERE x.{source} = r.id AND x.{target} = t.id)',
+            [*recipe_ids, *related_ids]
+        )
+        return cursor.rowcount
+
+
+def remove_related(using, recipe_ids, name, related_ids=None):
+    """ Unrelate recipes from objects, or from all, return rows deleted """
+    field = Recipe._meta.get_field(name)
+    rows = field.remote_field.through.objects\
+        .using(using)\
+        .filter(**{f'{field.m2m_column_name()}__in': recipe_ids})
+
+    if related_ids is not None:
+        rows = rows.filter(**{f'{field.m2m_reverse_name()}__in': related_ids})
+
+    return rows.delete()[0]
+
+
+def update(user, recipe_ids, fields, add=None, remove=None):
+    """
+    Set fields on recipes and add or remove tags and ingredients, return
+    the number of recipes and relation rows affected
+    """
+    add, remove = add or {}, remove or {}
+    using = router.db_for_write(Recipe)
+    recipes = Recipe.objects.using(using).filter(user=user, pk__in=recipe_ids)
+    counts = {'updated': 0}
+
+    if not recipe_ids:
+        return counts
+
+    with transaction.atomic(using=using):
+        counts['updated'] = recipes.update(**fields, updated_at=timezone.now())
+
+        for name in RELATIONS:
+            if add.get(name):
+                counts[f'{name}_added'] = add_related(
+                    using, recipe_ids, name, [obj.pk for obj in add[name]]
+                )
+            if remove.get(name):
+                counts[f'{name}_removed'] = remove_related(
+                    using, recipe_ids, name, [obj.pk for obj in remove[name]]
+                )
+
+        if set(fields) & set(stats.TOTALS) or add.get('tags') or \
+                remove.get('tags'):
+            stats.invalidate(using, user.pk)
+
+    if any(add.values()) or any(remove.values()):
+        invalidate_indexes(user.pk, using)
+
+    return counts
+
+
+def delete(user, recipe_ids):
+    """ Delete recipes with their relations and files, return the count """
+    using = router.db_for_write(Recipe)
+    recipes = Recipe.objects.using(using).filter(user=user, pk__in=recipe_ids)
+
+    if not recipe_ids:
+        return 0
+
+    with transaction.atomic(using=using):
+        images = list(
+            recipes.exclude(image='').values_list('image', flat=True)
+        )
+        for name in RELATIONS:
+            remove_related(using, recipe_ids, name)
+
+        # Upload sessions refer to the recipes, so they go first
+        sessions = UploadSession.objects.using(using)\
+            .filter(recipe_id__in=recipe_ids)
+        partials = [uploads.partial_path(session) for session in sessions]
+        sessions._raw_delete(using)
+
+        deleted = recipes._raw_delete(using)
+        Tombstone.objects.using(using).bulk_create([
+            Tombstone(user=user, model='recipe', object_id=pk)
+            for pk in recipe_ids
+        ])
+        stats.invalidate(using, user.pk)
+
+        def delete_images():
+            storage = Recipe._meta.get_field('image').storage
+            for image in filter(None, images):
+                storage.delete(image)
+            for path in partials:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+        transaction.on_commit(delete_images, using=using)
+
+    invalidate_indexes(user.pk, using)
+
+    return deleted
@@ -0,0 +1,150 @@
+import random
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Versions expire so idle users do not fill the cache, a lost version
+# only makes workers rebuild their index
+VERSION_SECONDS = 24 * 60 * 60
+
+
+class UserIndexCache:
+    """
+    Process-local cache of per-user indexes, up to max_users of them.
+
+    Each index is tagged with a version counter kept in the shared Django
+    cache, so a write handled by another worker makes the local copy stale
+    and it is rebuilt lazily on the next read. A counter missing from the
+    cache, evicted or expired, starts again from a random value, so it
+    never comes back to a version a worker still holds.
+
+    Changes made inside a transaction are only published once it commits.
+    Until then the local copy of the user is dropped, and indexes read by
+    the thread holding the transaction are built without being kept, so
+    nothing seen from uncommitted rows outlives a rollback.
+    """
+
+    def __init__(self, name, build, max_users=1000):
+        self.name = name
+        self.build = build
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _version_key(self, user_id):
+        return f'{self.name}:{user_id}:version'
+
+    def _version(self, user_id):
+        """ Return the shared version for a user, starting one if missing """
+        key = self._version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, random.getrandbits(62), VERSION_SECONDS)
+            version = cache.get(key)
+
+        return version
+
+    def _bump(self, user_id):
+        """ Increment and return the shared version for a user """
+        key = self._version_key(user_id)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.add(key, random.getrandbits(62), VERSION_SECONDS)
+            return cache.incr(key)
+
+    def _pending(self):
+        """ Return the uncommitted changes of this thread by user """
+        if not hasattr(self._local, 'pending'):
+            self._local.pending = {}
+
+        return self._local.pending
+
+    def _in_transaction(self, user_id):
+        """ Return whether this thread has uncommitted changes of a user """
+        changes = self._pending().get(user_id, [])
+
+        # Callbacks of rolled back transactions are dropped by Django
+        changes[:] = [
+            (connection, callback) for connection, callback in changes
+            if any(entry[1] is callback
+                   for entry in connection.run_on_commit)
+        ]
+        if not changes:
+            self._pending().pop(user_id, None)
+
+        return bool(changes)
+
+    def _on_commit(self, user_id, change, using):
+        """ Run a change now, or once the open transaction commits """
+        connection = transaction.get_connection(using)
+        if not connection.in_atomic_block:
+            change()
+            return
+
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+        def publish():
+            changes = self._pending().get(user_id, [])
+            changes[:] = [item for item in changes if item[1] is not publish]
+            change()
+
+        self._pending().setdefault(user_id, []).append((connection, publish))
+        transaction.on_commit(publish, using=using)
+
+    def get(self, user_id):
+        """ Return the index for a user, building it if missing or stale """
+        if self._in_transaction(user_id):
+            return self.build(user_id)
+
+        version = self._version(user_id)
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is not None and entry[0] == version:
+                self._indexes.move_to_end(user_id)
+                return entry[1]
+
+        index = self.build(user_id)
+        self._keep(user_id, version, index)
+
+        return index
+
+    def _keep(self, user_id, version, index):
+        """ Hold the index of a user, dropping the least recently used """
+        with self._lock:
+            self._indexes[user_id] = (version, index)
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+
+    def update(self, user_id, func, using=None):
+        """ Apply an incremental change to the loaded index of a user """
+        def change():
+            version = self._bump(user_id)
+
+            with self._lock:
+                entry = self._indexes.pop(user_id, None)
+            if entry is not None and entry[0] == version - 1:
+                func(entry[1])
+                self._keep(user_id, version, entry[1])
+
+        self._on_commit(user_id, change, using)
+
+    def invalidate(self, user_id, using=None):
+        """ Drop the index of a user so it is rebuilt on next access """
+        def change():
+            self._bump(user_id)
+
+            with self._lock:
+                self._indexes.pop(user_id, None)
+
+        self._on_commit(user_id, change, using)
+
+    def clear(self):
+        """ Drop every index held by this process """
+        with self._lock:
+            self._indexes.clear()
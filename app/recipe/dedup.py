@@ -0,0 +1,92 @@
+"""
+Tags and ingredients are unique per user by their trimmed, lowercased
+name. Creating one with a taken name returns the existing row, and rows
+that mean the same thing can be merged into one.
+"""
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from core.models import Tag, Ingredient, Recipe, Tombstone, TagStats
+
+from recipe import bulk, stats
+
+RELATIONS = {Tag: 'tags', Ingredient: 'ingredients'}
+
+
+def by_name(model, user, name):
+    """ Return the objects of a user matching a name, using its index """
+    return model.objects\
+        .annotate(key=Lower(Trim('name')))\
+        .filter(user=user, key=name.strip().lower())
+
+
+def get_or_create(model, user, name):
+    """ Return the object of a user with a name, creating it if needed """
+    existing = by_name(model, user, name).first()
+    if existing is not None:
+        return existing, False
+
+    try:
+        with transaction.atomic(using=router.db_for_write(model)):
+            return model.objects.create(user=user, name=name.strip()), True
+    except IntegrityError:
+        # Created concurrently under the same name
+        return by_name(model, user, name).get(), False
+
+
+def merge(survivor, duplicates):
+    """
+    Move the recipes of duplicates to survivor and delete the duplicates,
+    returning how many were merged and how many recipes they touched
+    """
+    model = type(survivor)
+    field = Recipe._meta.get_field(RELATIONS[model])
+    through = field.remote_field.through
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+
+    table = quote(through._meta.db_table)
+    source = quote(field.m2m_column_name())
+    target = quote(field.m2m_reverse_name())
+    ids = [obj.pk for obj in duplicates if obj.pk != survivor.pk]
+    placeholders = ', '.join(['%s'] * len(ids))
+    links = through.objects.using(using)\
+        .filter(**{f'{field.m2m_reverse_name()}__in': ids})
+
+    if not ids:
+        return {'merged': 0, 'recipes': 0}
+
+    with transaction.atomic(using=using):
+        recipes = Recipe.objects.using(using)\
+            .filter(pk__in=links.values(field.m2m_column_name()))\
+            .update(updated_at=timezone.now())
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({source}, {target}) '
+                f'SELECT DISTINCT x.{source}, %s FROM {table} x '
+                f'WHERE x.{target} IN ({placeholders}) '
+                f'AND NOT EXISTS (SELECT 1 FROM {table} y '
+                f'WHERE y.{source} = x.{source} AND y.{target} = %s)',
+                [survivor.pk, *ids, survivor.pk]
+            )
+
+        links.delete()
+        if model is Tag:
+            TagStats.objects.using(using).filter(tag_id__in=ids).delete()
+            stats.invalidate(using, survivor.user_id)
+        model.objects.using(using).filter(pk__in=ids)._raw_delete(using)
+        Tombstone.objects.using(using).bulk_create([
+            Tombstone(
+                user_id=survivor.user_id,
+                model=model._meta.model_name,
+                object_id=pk
+            )
+            for pk in ids
+        ])
+
+    bulk.invalidate_indexes(survivor.user_id, using)
+
+    return {'merged': len(ids), 'recipes': recipes}
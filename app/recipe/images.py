@@ -0,0 +1,179 @@
+"""
+Resized variants of recipe images, rendered on demand.
+
+Variants are written under VARIANTS_DIR in MEDIA_ROOT and have their
+access time set each time they are served, so access times order them by
+last use. Their modification times stay those of the render, which the
+validators they are served with are made from.
+
+Each process keeps a running total of the bytes it has rendered on top
+of the size it last scanned, and only scans the directory again when
+that may be over the size cap or once EVICT_INTERVAL seconds have passed;
+the scan deletes the least recently used variants over the cap.
+
+Concurrent requests for a missing variant share a single render: threads
+through a single-flight group, processes through a lock file per variant
+next to it.
+"""
+import fcntl
+import os
+import tempfile
+import threading
+import time
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+
+from core import singleflight
+
+VARIANTS_DIR = 'variants/recipe'
+
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True}),
+    'webp': ('webp', {'quality': 80}),
+    'png': ('png', {'optimize': True}),
+}
+
+renders = singleflight.Group()
+
+_cached_bytes = 0
+_scanned_at = None
+_usage_lock = threading.Lock()
+
+
+def options():
+    """ Return the allowed widths and formats and the cache size cap """
+    return {
+        'WIDTHS': [160, 320, 640, 1280],
+        'FORMATS': ['jpeg', 'webp', 'png'],
+        'CACHE_BYTES': 512 * 1024 * 1024,
+        'EVICT_INTERVAL': 5 * 60,
+        **getattr(settings, 'IMAGE_VARIANTS', {}),
+    }
+
+
+def variant_name(image_name, width, image_format):
+    """ Return the storage name of a variant of an image """
+    # The whole file name is kept, so the image is known from the variant
+    original = os.path.basename(image_name)
+    extension = FORMATS[image_format][0]
+
+    return f'{VARIANTS_DIR}/{original}-{width}.{extension}'
+
+
+def lock_path(path):
+    """ Return the lock file of the render of a variant """
+    directory, name = os.path.split(path)
+
+    return os.path.join(directory, f'.{name}.lock')
+
+
+def render(storage, image_name, name, width, image_format):
+    """ Write a variant of an image no wider than width """
+    with storage.open(image_name) as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+
+    if image.width > width:
+        height = max(round(image.height * width / image.width), 1)
+        image = image.resize((width, height), Image.LANCZOS)
+
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Written aside and moved in place, so a variant is never half written
+    fd, temporary = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            image.save(output, format=image_format.upper(),
+                       **FORMATS[image_format][1])
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def evict(storage, max_bytes, keep=None):
+    """ Delete the least recently used variants over the size cap """
+    global _cached_bytes, _scanned_at
+    directory = storage.path(VARIANTS_DIR)
+    try:
+        entries = [
+            entry for entry in os.scandir(directory)
+            if entry.is_file() and not entry.name.startswith('.')
+        ]
+    except FileNotFoundError:
+        return 0
+
+    files = sorted(
+        (entry.stat().st_atime, entry.stat().st_size, entry.path)
+        for entry in entries
+    )
+    size = sum(file_size for _, file_size, _ in files)
+    evicted = 0
+
+    for _, file_size, path in files:
+        if size <= max_bytes:
+            break
+        if path == keep:
+            continue
+        for evicted_path in (path, lock_path(path)):
+            try:
+                os.unlink(evicted_path)
+            except FileNotFoundError:
+                pass
+        size -= file_size
+        evicted += 1
+
+    with _usage_lock:
+        _cached_bytes = size
+        _scanned_at = time.monotonic()
+
+    return evicted
+
+
+def track(storage, path):
+    """ Count a new variant, evicting if the cache may be over its cap """
+    global _cached_bytes
+    config = options()
+    size = os.path.getsize(path)
+
+    with _usage_lock:
+        due = _scanned_at is None or \
+            time.monotonic() - _scanned_at >= config['EVICT_INTERVAL']
+        if not due and _cached_bytes + size <= config['CACHE_BYTES']:
+            _cached_bytes += size
+            return 0
+
+    return evict(storage, config['CACHE_BYTES'], keep=path)
+
+
+def variant(storage, image_name, width, image_format):
+    """ Return the name of a variant of an image, rendering it if needed """
+    name = variant_name(image_name, width, image_format)
+    path = storage.path(name)
+
+    try:
+        # Marks the variant as recently used, keeping its ETag
+        os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        return name
+    except FileNotFoundError:
+        pass
+
+    def render_once():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(lock_path(path), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(path):
+                return name
+            render(storage, image_name, name, width, image_format)
+
+        track(storage, path)
+
+        return name
+
+    return renders.do(('recipe-image', name), render_once)
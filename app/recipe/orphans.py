@@ -0,0 +1,135 @@
+"""
+Collection of recipe image files no recipe refers to.
+
+Replacing the image of a recipe, or deleting the recipe, leaves its old
+file behind. collect() streams the files under IMAGES_DIR and checks them
+against Recipe.image on every shard a batch of names per query, then
+deletes, or moves under QUARANTINE_DIR, those no recipe uses. Only files
+older than the grace period are considered, which covers images written
+by requests whose recipe is not committed yet. Resized variants of
+images no recipe uses any more are collected the same way, looked up by
+the image name their own name starts with.
+"""
+import itertools
+import os
+import time
+
+from django.conf import settings
+
+from core.db import sharding
+from core.models import Recipe
+from recipe import images
+
+IMAGES_DIR = 'uploads/recipe'
+
+QUARANTINE_DIR = 'quarantine'
+
+BATCH_SIZE = 1000
+
+
+def options():
+    """ Return the grace period and whether orphans are quarantined """
+    return {
+        'GRACE_PERIOD': 24 * 60 * 60,
+        'QUARANTINE': False,
+        **getattr(settings, 'MEDIA_GC', {}),
+    }
+
+
+def scan(directory):
+    """ Yield the files under a directory, without listing it whole """
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan(entry.path)
+            elif entry.is_file(follow_symlinks=False) and \
+                    not entry.name.startswith('.'):
+                yield entry
+
+
+def candidates(storage, directory, cutoff):
+    """ Yield the (name, size) of the files under a directory before cutoff """
+    for entry in scan(storage.path(directory)):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime < cutoff:
+            name = os.path.relpath(entry.path, storage.location)
+            yield name.replace(os.sep, '/'), stat.st_size
+
+
+def batches(iterable, size):
+    """ Yield the items of an iterable in lists of at most size """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def variant_image(name):
+    """ Return the name of the image a variant was rendered from """
+    original = os.path.splitext(os.path.basename(name))[0]
+
+    return f'{IMAGES_DIR}/{original.rpartition("-")[0]}'
+
+
+def used_images(names):
+    """ Return those of the names a recipe on any shard has as its image """
+    used = set()
+    for using in sharding.shards():
+        used.update(
+            Recipe._base_manager.using(using)
+            .filter(image__in=names)
+            .values_list('image', flat=True)
+        )
+
+    return used
+
+
+def remove(storage, name, quarantine):
+    """ Delete a file, or move it under QUARANTINE_DIR """
+    path = storage.path(name)
+    if not quarantine:
+        os.unlink(path)
+        return
+
+    target = storage.path(f'{QUARANTINE_DIR}/{name}')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+
+
+def collect(grace_period=None, quarantine=None, dry_run=False,
+            batch_size=BATCH_SIZE):
+    """ Remove orphaned images and variants, return the count and bytes """
+    config = options()
+    if grace_period is None:
+        grace_period = config['GRACE_PERIOD']
+    if quarantine is None:
+        quarantine = config['QUARANTINE']
+
+    storage = Recipe._meta.get_field('image').storage
+    cutoff = time.time() - grace_period
+    sweeps = (
+        (IMAGES_DIR, lambda name: name, used_images),
+        (images.VARIANTS_DIR, variant_image, used_images),
+    )
+    removed = reclaimed = 0
+
+    for directory, key, used in sweeps:
+        files = candidates(storage, directory, cutoff)
+        for batch in batches(files, batch_size):
+            kept = used({key(name) for name, _ in batch})
+            for name, size in batch:
+                if key(name) in kept:
+                    continue
+                if not dry_run:
+                    try:
+                        remove(storage, name, quarantine)
+                    except FileNotFoundError:
+                        continue
+                removed += 1
+                reclaimed += size
+
+    return removed, reclaimed
@@ -0,0 +1,96 @@
+"""
+Keyset pagination of recipe lists.
+
+Each page continues after the (ordering field, id) of the last recipe
+served, so a page is a range scan of the (user, field, id) index however
+deep the client has paged, and rows added or removed meanwhile do not
+shift the pages.
+"""
+import base64
+import binascii
+import json
+
+from django.core import exceptions
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.response import Response
+
+from core.models import Recipe
+
+DEFAULT_LIMIT = 50
+
+
+def ordering_field(ordering):
+    """ Split an ordering into its field name and whether it descends """
+    return ordering.lstrip('-'), ordering.startswith('-')
+
+
+def encode_cursor(ordering, recipe):
+    """ Encode the position after a recipe for an ordering """
+    field, _ = ordering_field(ordering)
+    position = [ordering, str(getattr(recipe, field)), recipe.pk]
+
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(ordering, cursor):
+    """ Decode a position for an ordering, raising ValueError if bad """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        cursor_ordering, value, pk = position
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('Malformed cursor.')
+
+    if cursor_ordering != ordering:
+        raise ValueError('Cursor was issued for another ordering.')
+
+    field, _ = ordering_field(ordering)
+    try:
+        return Recipe._meta.get_field(field).to_python(value), int(pk)
+    except (exceptions.ValidationError, TypeError, ValueError):
+        raise ValueError('Malformed cursor.')
+
+
+def after(queryset, ordering, position):
+    """ Filter the recipes that come after a position in an ordering """
+    field, descending = ordering_field(ordering)
+    value, pk = position
+    lookup = 'lt' if descending else 'gt'
+
+    if field == 'id':
+        return queryset.filter(**{f'pk__{lookup}': pk})
+
+    # The bound the OR implies lets the (user, field) index be range scanned
+    return queryset.filter(
+        Q(**{f'{field}__{lookup}e': value}),
+        Q(**{f'{field}__{lookup}': value}) |
+        Q(**{field: value, f'pk__{lookup}': pk})
+    )
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Paginate recipes when a limit or cursor is given, returning the page
+    with the cursor of the next one
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        query = view.get_list_query()
+        if 'limit' not in query and 'cursor' not in query:
+            return None
+
+        self.ordering = query['ordering']
+        limit = query.get('limit', DEFAULT_LIMIT)
+        if 'cursor' in query:
+            queryset = after(queryset, self.ordering, query['cursor'])
+
+        recipes = list(queryset[:limit + 1])
+        self.next_cursor = None
+        if len(recipes) > limit:
+            recipes = recipes[:limit]
+            self.next_cursor = encode_cursor(self.ordering, recipes[-1])
+
+        return recipes
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.next_cursor, 'results': data})
@@ -0,0 +1,101 @@
+from core.models import Recipe
+
+from recipe.cache import UserIndexCache
+
+
+class PantryIndex:
+    """
+    Bitset index of the ingredients used by each recipe of a user.
+
+    Every ingredient gets a bit position and every recipe a mask of the
+    bits of its ingredients, so checking whether a recipe is covered by a
+    pantry is a single AND NOT over two integers.
+    """
+
+    def __init__(self):
+        self.bits = {}
+        self.ingredients = []
+        self.masks = {}
+
+    def mask(self, ingredient_ids, create=False):
+        """ Return the bitmask for a collection of ingredient IDs """
+        mask = 0
+
+        for ingredient_id in ingredient_ids:
+            bit = self.bits.get(ingredient_id)
+            if bit is None:
+                if not create:
+                    continue
+                bit = self.bits[ingredient_id] = len(self.ingredients)
+                self.ingredients.append(ingredient_id)
+            mask |= 1 << bit
+
+        return mask
+
+    def ingredient_ids(self, mask):
+        """ Return the ingredient IDs set in a bitmask """
+        return [
+            ingredient_id
+            for bit, ingredient_id in enumerate(self.ingredients)
+            if mask >> bit & 1
+        ]
+
+    def add(self, recipe_id, ingredient_ids):
+        """ Add ingredients to a recipe """
+        self.masks[recipe_id] = self.masks.get(recipe_id, 0) | \
+            self.mask(ingredient_ids, create=True)
+
+    def remove(self, recipe_id, ingredient_ids):
+        """ Remove ingredients from a recipe """
+        self.masks[recipe_id] = self.masks.get(recipe_id, 0) & \
+            ~self.mask(ingredient_ids)
+
+    def discard(self, recipe_id):
+        """ Remove a recipe from the index """
+        self.masks.pop(recipe_id, None)
+
+    def match(self, ingredient_ids, max_missing=0):
+        """
+        Return (recipe_id, missing ingredient IDs) for every recipe that is
+        covered by the given ingredients except for at most max_missing
+        """
+        have = self.mask(ingredient_ids)
+        matches = []
+
+        for recipe_id, mask in list(self.masks.items()):
+            missing = mask & ~have
+            if not missing:
+                matches.append((recipe_id, []))
+            elif max_missing and bin(missing).count('1') <= max_missing:
+                matches.append((recipe_id, self.ingredient_ids(missing)))
+
+        return matches
+
+
+def build_index(user_id):
+    """ Build the pantry index of a user with a single query """
+    index = PantryIndex()
+    rows = Recipe.objects\
+        .filter(user_id=user_id)\
+        .values_list('id', 'ingredients')
+
+    for recipe_id, ingredient_id in rows:
+        index.masks.setdefault(recipe_id, 0)
+        if ingredient_id is not None:
+            index.add(recipe_id, [ingredient_id])
+
+    return index
+
+
+indexes = UserIndexCache('pantry', build_index)
+
+
+def match_recipes(user_id, ingredient_ids, max_missing=0):
+    """
+    Return a list of (recipe_id, missing ingredient IDs) ordered by the
+    number of missing ingredients and then by newest recipe first
+    """
+    matches = indexes.get(user_id).match(ingredient_ids, max_missing)
+    matches.sort(key=lambda match: (len(match[1]), -match[0]))
+
+    return matches
@@ -1,9 +1,70 @@
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import get_available_image_extensions
+from django.db import router, transaction
 from rest_framework import serializers
 
-from core.models import Tag, Ingredient, Recipe
+from core.models import Tag, Ingredient, Recipe, UploadSession
+
+from recipe import relations, pagination, images, uploads
+
+
+class SparseFieldsMixin:
+    """
+    Serializer limited to the fields named in its 'fields' context, that
+    nests the relations named in its 'expand' context
+    """
+    expandable = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        for name in self.context.get('expand', ()):
+            if name in self.expandable:
+                self.fields[name] = self.expandable[name](
+                    many=True,
+                    read_only=True
+                )
+
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsQuerySerializer(serializers.Serializer):
+    """ Serializer for ?fields= and ?expand= parameters """
+
+    def get_fields(self):
+        # Declared here as 'fields' is taken on serializer classes
+        return {
+            'fields': serializers.CharField(required=False),
+            'expand': serializers.CharField(required=False),
+        }
+
+    def names(self, value, available, label):
+        """ Split a comma separated list of names and check each of them """
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = sorted(set(names) - set(available))
+        if unknown:
+            raise serializers.ValidationError(
+                f'Unknown {label}: {", ".join(unknown)}.'
+            )
+
+        return names
+
+    def validate_fields(self, value):
+        serializer_class = self.context['serializer_class']
+        return self.names(value, serializer_class().fields, 'fields')
 
+    def validate_expand(self, value):
+        serializer_class = self.context['serializer_class']
+        expandable = getattr(serializer_class, 'expandable', {})
+        return self.names(value, expandable, 'relations')
 
-class TagSerializer(serializers.ModelSerializer):
+
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Serializer for tag objects """
 
     class Meta:
@@ -12,7 +73,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Serializer for ingredient objects """
 
     class Meta:
@@ -21,15 +82,62 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class MergeSerializer(serializers.Serializer):
+    """ Serializer for the duplicates merged into a tag or ingredient """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=1000
+    )
+
+
+class AutocompleteQuerySerializer(serializers.Serializer):
+    """ Serializer for autocomplete parameters """
+    q = serializers.CharField(max_length=255)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class PrimaryKeysField(serializers.ManyRelatedField):
+    """ List of primary keys validated with a single query """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+
+        pks = []
+        for item in data:
+            try:
+                pks.append(pk_field.to_python(item))
+            except ValidationError:
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+
+        return [objects[pk] for pk in pks]
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Serializer for recipe objects """
-    ingredients = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Ingredient.objects.all()
+    expandable = {
+        'tags': TagSerializer,
+        'ingredients': IngredientSerializer,
+    }
+    ingredients = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Ingredient.objects.all()
+        )
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()
+        )
     )
 
     class Meta:
@@ -38,6 +146,126 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'time_minutes', 'price', 'link')
         read_only_fields = ('id',)
 
+    def pop_relations(self, validated_data):
+        """ Take the many-to-many values out of the validated data """
+        return {
+            name: validated_data.pop(name)
+            for name in ('ingredients', 'tags') if name in validated_data
+        }
+
+    def create(self, validated_data):
+        """ Create a recipe and its relations with one INSERT per table """
+        related = self.pop_relations(validated_data)
+
+        with transaction.atomic(using=router.db_for_write(Recipe)):
+            recipe = Recipe.objects.create(**validated_data)
+            for name, objects in related.items():
+                relations.set_related(recipe, name, objects, created=True)
+
+        return recipe
+
+    def update(self, instance, validated_data):
+        """ Update a recipe, writing only the relations that changed """
+        related = self.pop_relations(validated_data)
+
+        with transaction.atomic(using=instance._state.db):
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+
+            for name, objects in related.items():
+                relations.set_related(instance, name, objects)
+
+        return instance
+
+
+class RecipeBulkFilterSerializer(serializers.Serializer):
+    """ Serializer for the criteria selecting recipes of a bulk action """
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+
+class RecipeBulkDeleteSerializer(serializers.Serializer):
+    """ Serializer for deleting many recipes """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    filter = RecipeBulkFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        """ Require exactly one way of selecting recipes """
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError(
+                'Select recipes with either ids or filter.'
+            )
+
+        return attrs
+
+
+class RecipeBulkSetSerializer(serializers.ModelSerializer):
+    """ Serializer for the fields set on many recipes """
+
+    class Meta:
+        model = Recipe
+        fields = ('title', 'time_minutes', 'price', 'link')
+        extra_kwargs = {
+            'title': {'required': False},
+            'time_minutes': {'required': False},
+            'price': {'required': False},
+        }
+
+
+class RecipeBulkUpdateSerializer(RecipeBulkDeleteSerializer):
+    """ Serializer for updating many recipes """
+    set = RecipeBulkSetSerializer(required=False)
+    add_tags = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()
+        ),
+        required=False
+    )
+    remove_tags = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()
+        ),
+        required=False
+    )
+    add_ingredients = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Ingredient.objects.all()
+        ),
+        required=False
+    )
+    remove_ingredients = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Ingredient.objects.all()
+        ),
+        required=False
+    )
+
+    def __init__(self, *args, **kwargs):
+        """ Only accept tags and ingredients of the requesting user """
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request is not None:
+            for name, field in self.fields.items():
+                if isinstance(field, PrimaryKeysField):
+                    field.child_relation.queryset = field.child_relation\
+                        .queryset.filter(user=request.user)
+
+    def validate(self, attrs):
+        """ Require at least one change """
+        attrs = super().validate(attrs)
+        if not set(attrs) - {'ids', 'filter'}:
+            raise serializers.ValidationError('No changes given.')
+
+        return attrs
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """ Serializer for recipe details """
@@ -45,6 +273,112 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class RecipeListQuerySerializer(serializers.Serializer):
+    """ Serializer for recipe list ordering, range and page parameters """
+    ordering = serializers.ChoiceField(
+        choices=[
+            f'{direction}{field}'
+            for field in ('id', 'price', 'time_minutes', 'title')
+            for direction in ('', '-')
+        ],
+        default='-id'
+    )
+    min_price = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False
+    )
+    max_price = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False
+    )
+    min_time_minutes = serializers.IntegerField(min_value=0, required=False)
+    max_time_minutes = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=1000, required=False
+    )
+    cursor = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        """ Decode the cursor for the requested ordering """
+        if 'cursor' in attrs:
+            try:
+                attrs['cursor'] = pagination.decode_cursor(
+                    attrs['ordering'],
+                    attrs['cursor']
+                )
+            except ValueError as error:
+                raise serializers.ValidationError({'cursor': str(error)})
+
+        return attrs
+
+
+class RecipeMultiGetSerializer(serializers.Serializer):
+    """ Serializer for the recipes fetched at once by ID """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """ Serializer for recipes matched against a pantry """
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_ingredients',)
+
+    def get_missing_ingredients(self, obj):
+        """ Return the IDs of the ingredients missing from the pantry """
+        return self.context.get('missing', {}).get(obj.id, [])
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """ Serializer for pantry matching parameters """
+    ingredients = serializers.CharField(allow_blank=True, default='')
+    max_missing = serializers.IntegerField(min_value=0, default=0)
+
+    def validate_ingredients(self, value):
+        """ Convert a comma separated list of IDs to integers """
+        try:
+            return [int(str_id) for str_id in value.split(',') if str_id]
+        except ValueError:
+            raise serializers.ValidationError(
+                'Ingredients must be a comma separated list of IDs.'
+            )
+
+
+class ChangesQuerySerializer(serializers.Serializer):
+    """ Serializer for change feed parameters """
+    since = serializers.RegexField(r'^\d+\.\d+\.\d+$', required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class RecipeImageVariantQuerySerializer(serializers.Serializer):
+    """ Serializer for the size and format of a resized recipe image """
+    width = serializers.IntegerField()
+    format = serializers.CharField(default='jpeg')
+
+    def validate_width(self, value):
+        """ Allow the configured widths only """
+        if value not in images.options()['WIDTHS']:
+            raise serializers.ValidationError(
+                f'Width must be one of {images.options()["WIDTHS"]}.'
+            )
+
+        return value
+
+    def validate_format(self, value):
+        """ Allow the configured formats only """
+        if value not in images.options()['FORMATS']:
+            raise serializers.ValidationError(
+                f'Format must be one of {images.options()["FORMATS"]}.'
+            )
+
+        return value
+
+
+class StatsQuerySerializer(serializers.Serializer):
+    """ Serializer for recipe statistics parameters """
+    top = serializers.IntegerField(min_value=0, max_value=50, default=5)
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """ Serializer for uploading images to recipes """
 
@@ -52,3 +386,43 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """ Serializer for resumable recipe image uploads """
+    offset = serializers.IntegerField(source='received', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'filename', 'size', 'checksum', 'offset')
+        read_only_fields = ('id',)
+
+    def validate_filename(self, value):
+        """ Allow the extensions of the image formats supported """
+        extension = value.rpartition('.')[2].lower()
+        if '.' not in value or \
+                extension not in get_available_image_extensions():
+            raise serializers.ValidationError(
+                'The file name must have an image extension.'
+            )
+
+        return value
+
+    def validate_size(self, value):
+        """ Allow uploads up to the configured size """
+        if not 0 < value <= uploads.options()['MAX_SIZE']:
+            raise serializers.ValidationError(
+                f'Size must be between 1 and '
+                f'{uploads.options()["MAX_SIZE"]} bytes.'
+            )
+
+        return value
+
+    def validate_checksum(self, value):
+        """ Require the SHA-256 of the file as hex """
+        if not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError(
+                'Checksum must be the hex SHA-256 of the file.'
+            )
+
+        return value.lower()
@@ -0,0 +1,147 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, \
+    m2m_changed
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe, TagStats
+
+from recipe import pantry, autocomplete, stats
+
+
+@receiver(post_save, sender=Recipe)
+def index_new_recipe(sender, instance, created, using, **kwargs):
+    """ Add newly created recipes to the pantry index """
+    if created:
+        pantry.indexes.update(
+            instance.user_id,
+            lambda index: index.masks.setdefault(instance.id, 0),
+            using
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, using, **kwargs):
+    """ Remove deleted recipes from the pantry and autocomplete indexes """
+    pantry.indexes.update(
+        instance.user_id,
+        lambda index: index.discard(instance.id),
+        using
+    )
+
+    for trie in autocomplete.tries.values():
+        trie.invalidate(instance.user_id, using)
+
+
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient(sender, instance, using, **kwargs):
+    """ Rebuild the pantry index when one of its ingredients goes away """
+    pantry.indexes.invalidate(instance.user_id, using)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def index_recipe_ingredients(sender, instance, action, reverse, pk_set,
+                             using, **kwargs):
+    """ Keep the pantry index in sync with recipe ingredients """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear' and reverse:
+        pantry.indexes.invalidate(instance.user_id, using)
+        return
+
+    if reverse:
+        pairs = [(recipe_id, [instance.pk]) for recipe_id in pk_set]
+    else:
+        pairs = [(instance.pk, pk_set or [])]
+
+    def apply(index):
+        for recipe_id, ingredient_ids in pairs:
+            if action == 'post_add':
+                index.add(recipe_id, ingredient_ids)
+            elif action == 'post_remove':
+                index.remove(recipe_id, ingredient_ids)
+            else:
+                index.masks[recipe_id] = 0
+
+    pantry.indexes.update(instance.user_id, apply, using)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def index_name(sender, instance, created, using, **kwargs):
+    """ Keep the autocomplete tries in sync with tag and ingredient names """
+    if created:
+        entry = {'id': instance.id, 'name': instance.name, 'usage': 0}
+        autocomplete.tries[sender].update(
+            instance.user_id,
+            lambda trie: trie.insert(entry),
+            using
+        )
+    else:
+        autocomplete.tries[sender].invalidate(instance.user_id, using)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def unindex_name(sender, instance, using, **kwargs):
+    """ Rebuild the autocomplete trie when a name goes away """
+    autocomplete.tries[sender].invalidate(instance.user_id, using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_name_usage(sender, instance, action, reverse, model, pk_set,
+                     using, **kwargs):
+    """ Keep the usage counts of the autocomplete tries up to date """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    trie_cache = autocomplete.tries[type(instance) if reverse else model]
+
+    if action == 'post_clear':
+        trie_cache.invalidate(instance.user_id, using)
+        return
+
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        deltas = {instance.pk: delta * len(pk_set)}
+    else:
+        deltas = {pk: delta for pk in pk_set}
+
+    def apply(trie):
+        for pk, change in deltas.items():
+            entry = trie.entries.get(pk)
+            if entry is not None:
+                entry['usage'] += change
+
+    trie_cache.update(instance.user_id, apply, using)
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(sender, instance, created, using, raw=False,
+                 update_fields=None, **kwargs):
+    """ Keep the recipe statistics of the user up to date """
+    if not raw:
+        stats.recipe_saved(instance, created, using, update_fields)
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_recipe(sender, instance, using, **kwargs):
+    """ Remove a deleted recipe from the statistics of the user """
+    stats.recipe_deleted(instance, using)
+
+
+@receiver(post_save, sender=Tag)
+def create_tag_stats(sender, instance, created, using, raw=False, **kwargs):
+    """ Start counting the recipes of new tags """
+    if created and not raw:
+        TagStats.objects.using(using).create(
+            user_id=instance.user_id,
+            tag=instance
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def count_tag_recipes(sender, instance, action, reverse, pk_set, using,
+                      **kwargs):
+    """ Keep the recipe counts of tags up to date """
+    stats.tags_changed(instance, action, reverse, pk_set, using)
@@ -0,0 +1,170 @@
+"""
+Per-user recipe statistics kept in summary tables.
+
+RecipeStats holds the recipe count and the price and time totals of a
+user, TagStats the number of recipes using each tag. Model signals adjust
+them by difference as recipes and their tags change, so reading them is a
+primary key lookup instead of an aggregate over the user's recipes.
+
+Set-based writes invalidate the totals of the user instead, and a user
+without totals has them rebuilt exactly on the next read.
+"""
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+
+from core.models import Tag, Recipe, RecipeStats, TagStats
+
+TOTALS = ('price', 'time_minutes')
+
+
+def totals(recipe):
+    """ Return the price and time of a recipe as stored """
+    return (
+        Recipe._meta.get_field('price').to_python(recipe.price),
+        int(recipe.time_minutes),
+    )
+
+
+def adjust(using, user_id, count=0, price=0, time_minutes=0):
+    """ Add to the totals of a user, if they have been built """
+    if not (count or price or time_minutes):
+        return
+
+    RecipeStats.objects.using(using).filter(user_id=user_id).update(
+        recipe_count=F('recipe_count') + count,
+        total_price=F('total_price') + Decimal(price),
+        total_time_minutes=F('total_time_minutes') + time_minutes
+    )
+
+
+def adjust_tags(using, user_id, tag_ids, delta):
+    """ Add delta to the recipe counts of tags """
+    tags = TagStats.objects.using(using).filter(tag_id__in=tag_ids)
+    if tags.update(recipe_count=F('recipe_count') + delta) == len(tag_ids):
+        return
+
+    # Tags created without signals get their count from scratch
+    missing = Tag.objects.using(using)\
+        .filter(pk__in=tag_ids)\
+        .exclude(pk__in=tags.values('tag_id'))\
+        .annotate(recipe_count=Count('recipe'))
+    TagStats.objects.using(using).bulk_create([
+        TagStats(user_id=user_id, tag=tag, recipe_count=tag.recipe_count)
+        for tag in missing
+    ], ignore_conflicts=True)
+
+
+def recipe_saved(recipe, created, using, update_fields=None):
+    """ Count a new recipe, or the change of an existing one """
+    price, time_minutes = totals(recipe)
+    loaded = getattr(recipe, '_loaded_values', None)
+
+    if created:
+        adjust(using, recipe.user_id, 1, price, time_minutes)
+    elif loaded is not None and (
+            update_fields is None or set(update_fields) & set(TOTALS)):
+        adjust(
+            using,
+            recipe.user_id,
+            price=price - loaded.get('price', price),
+            time_minutes=time_minutes - loaded.get(
+                'time_minutes', time_minutes
+            )
+        )
+
+    recipe._loaded_values = {
+        **(loaded or {}), 'price': price, 'time_minutes': time_minutes
+    }
+
+
+def recipe_deleted(recipe, using):
+    """ Uncount a recipe about to be deleted, along with its tags """
+    price, time_minutes = totals(recipe)
+    adjust(using, recipe.user_id, -1, -price, -time_minutes)
+    TagStats.objects.using(using)\
+        .filter(tag__recipe=recipe)\
+        .update(recipe_count=F('recipe_count') - 1)
+
+
+def tags_changed(instance, action, reverse, pk_set, using):
+    """ Count the recipes gaining or losing tags, from either side """
+    tags = TagStats.objects.using(using)
+
+    if action == 'pre_clear' and reverse:
+        tags.filter(tag=instance).update(recipe_count=0)
+    elif action == 'pre_clear':
+        tags.filter(tag__recipe=instance)\
+            .update(recipe_count=F('recipe_count') - 1)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            adjust_tags(using, instance.user_id, [instance.pk],
+                        delta * len(pk_set))
+        else:
+            adjust_tags(using, instance.user_id, list(pk_set), delta)
+
+
+def invalidate(using, user_id):
+    """ Drop the totals of a user, to be rebuilt on the next read """
+    RecipeStats.objects.using(using).filter(user_id=user_id).delete()
+
+
+def rebuild(user_id, using=None):
+    """ Recompute the statistics of a user from their recipes """
+    using = using or router.db_for_write(RecipeStats)
+    recipes = Recipe.objects.using(using).filter(user_id=user_id)
+    tags = Tag.objects.using(using)\
+        .filter(user_id=user_id)\
+        .annotate(recipe_count=Count('recipe'))
+
+    with transaction.atomic(using=using):
+        stats, _ = RecipeStats.objects.using(using).update_or_create(
+            user_id=user_id,
+            defaults=recipes.aggregate(
+                recipe_count=Count('pk'),
+                total_price=Coalesce(Sum('price'), Decimal(0)),
+                total_time_minutes=Coalesce(Sum('time_minutes'), 0)
+            )
+        )
+        TagStats.objects.using(using).filter(user_id=user_id).delete()
+        TagStats.objects.using(using).bulk_create([
+            TagStats(user_id=user_id, tag=tag, recipe_count=tag.recipe_count)
+            for tag in tags
+        ])
+
+    return stats
+
+
+def summary(user, top=5):
+    """ Return the statistics of a user with their most used tags """
+    stats = RecipeStats.objects.filter(user=user).first()
+    if stats is None:
+        stats = rebuild(user.pk)
+
+    count = stats.recipe_count
+    top_tags = TagStats.objects\
+        .filter(user=user, recipe_count__gt=0)\
+        .select_related('tag')\
+        .order_by('-recipe_count', 'tag__name')[:top]
+
+    return {
+        'recipe_count': count,
+        'average_price': (
+            (stats.total_price / count).quantize(Decimal('0.01'))
+            if count else None
+        ),
+        'average_time_minutes': (
+            round(stats.total_time_minutes / count, 1) if count else None
+        ),
+        'top_tags': [
+            {
+                'id': tag_stats.tag_id,
+                'name': tag_stats.tag.name,
+                'recipe_count': tag_stats.recipe_count,
+            }
+            for tag_stats in top_tags
+        ],
+    }
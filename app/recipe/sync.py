@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+
+from core.models import Tag, Ingredient, Recipe, Tombstone
+
+from recipe import serializers
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# Kinds are ranked so that, for rows changed at the same instant, tags and
+# ingredients are sent before the recipes that reference them.
+KINDS = (
+    ('tags', Tag, 'updated_at'),
+    ('ingredients', Ingredient, 'updated_at'),
+    ('recipes', Recipe, 'updated_at'),
+    ('deleted', Tombstone, 'deleted_at'),
+)
+
+
+def horizon(using):
+    """
+    Return the time before which every change is committed. Rows are
+    stamped before they commit, so a row stamped earlier may still commit
+    after one stamped later. Changes stamped since the oldest transaction
+    that has written, less SYNC_COMMIT_MARGIN seconds for the time between
+    stamping and writing, are held back until they are settled, so the
+    cursor never passes over them.
+    """
+    oldest = datetime.now(timezone.utc)
+    connection = connections[using]
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT MIN(xact_start) FROM pg_stat_activity '
+                'WHERE datname = current_database() '
+                'AND backend_xid IS NOT NULL AND pid <> pg_backend_pid()'
+            )
+            started = cursor.fetchone()[0]
+        if started is not None:
+            oldest = min(oldest, started)
+
+    margin = getattr(settings, 'SYNC_COMMIT_MARGIN', 1)
+
+    return oldest - timedelta(seconds=margin)
+
+
+def format_cursor(timestamp, rank, pk):
+    """ Encode a position in the change feed """
+    return f'{(timestamp - EPOCH) // MICROSECOND}.{rank}.{pk}'
+
+
+def parse_cursor(cursor):
+    """ Decode a position in the change feed, raising ValueError if bad """
+    microseconds, rank, pk = (int(part) for part in cursor.split('.'))
+
+    return EPOCH + microseconds * MICROSECOND, rank, pk
+
+
+def changed_after(queryset, field, rank, position):
+    """ Filter rows of a kind that come after a (timestamp, rank, id) """
+    if position is None:
+        return queryset
+
+    timestamp, cursor_rank, pk = position
+    if rank > cursor_rank:
+        return queryset.filter(**{f'{field}__gte': timestamp})
+    if rank < cursor_rank:
+        return queryset.filter(**{f'{field}__gt': timestamp})
+
+    return queryset.filter(
+        Q(**{f'{field}__gt': timestamp}) |
+        Q(**{field: timestamp, 'pk__gt': pk})
+    )
+
+
+def serialize(kind, objects):
+    """ Return the compact representation of changed rows """
+    if kind == 'deleted':
+        return [{'type': obj.model, 'id': obj.object_id} for obj in objects]
+
+    serializer_class = {
+        'tags': serializers.TagSerializer,
+        'ingredients': serializers.IngredientSerializer,
+        'recipes': serializers.RecipeSerializer,
+    }[kind]
+
+    return serializer_class(objects, many=True).data
+
+
+def changes(user, cursor, limit):
+    """
+    Return up to limit rows changed after cursor, merged across kinds in
+    (timestamp, kind, id) order, with the cursor of the last row sent
+    """
+    position = parse_cursor(cursor) if cursor else None
+    settled = horizon(router.db_for_read(Recipe))
+    rows = []
+
+    for rank, (kind, model, field) in enumerate(KINDS):
+        queryset = model.objects.filter(user=user, **{f'{field}__lt': settled})
+        if model is Recipe:
+            queryset = queryset.prefetch_related('tags', 'ingredients')
+
+        queryset = changed_after(queryset, field, rank, position)\
+            .order_by(field, 'pk')[:limit + 1]
+        rows += [(getattr(obj, field), rank, obj.pk, obj) for obj in queryset]
+
+    rows.sort(key=lambda row: row[:3])
+    batch = rows[:limit]
+
+    result = {kind: [] for kind, _, _ in KINDS}
+    for _, rank, _, obj in batch:
+        result[KINDS[rank][0]].append(obj)
+
+    data = {kind: serialize(kind, objects) for kind, objects in result.items()}
+    data['cursor'] = format_cursor(*batch[-1][:3]) if batch else cursor
+    data['has_more'] = len(rows) > limit
+
+    return data
@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe import autocomplete
+
+TAGS_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+INGREDIENTS_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
+
+
+class TrieTests(TestCase):
+    """ Test the in-process autocomplete trie """
+
+    def setUp(self) -> None:
+        self.trie = autocomplete.Trie()
+        for pk, name, usage in ((1, 'Salt', 3), (2, 'Salmon', 5),
+                                (3, 'Sugar', 1), (4, 'Basil', 0)):
+            self.trie.insert({'id': pk, 'name': name, 'usage': usage})
+
+    def test_prefix_ranked_by_usage(self) -> None:
+        """ Test prefix matches are ranked by usage """
+        names = [entry['name'] for entry in self.trie.search('sal', 10)]
+
+        self.assertEqual(names, ['Salmon', 'Salt'])
+
+    def test_fuzzy_matches_typos(self) -> None:
+        """ Test names with a typo in the prefix are suggested """
+        names = [entry['name'] for entry in self.trie.search('sapt', 10)]
+
+        self.assertIn('Salt', names)
+        self.assertNotIn('Basil', names)
+
+    def test_limit(self) -> None:
+        """ Test the number of suggestions is limited """
+        self.assertEqual(len(self.trie.search('s', 1)), 1)
+
+
+class AutocompleteApiTests(TestCase):
+    """ Test autocomplete API """
+
+    def setUp(self) -> None:
+        for trie_cache in autocomplete.tries.values():
+            trie_cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@gmail.com',
+            password='myinsecurepassword!'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_autocomplete_tags(self) -> None:
+        """ Test tags are suggested by prefix and ranked by usage """
+        Tag.objects.create(user=self.user, name='Dinner')
+        dessert = Tag.objects.create(user=self.user, name='Dessert')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Flan', time_minutes=60, price=5.00
+        )
+        recipe.tags.add(dessert)
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'D'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(s['name'], s['usage']) for s in res.data],
+            [('Dessert', 1), ('Dinner', 0)]
+        )
+
+    def test_autocomplete_follows_changes(self) -> None:
+        """ Test suggestions are refreshed when names change """
+        self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'q': 'to'})
+        ingredient = Ingredient.objects.create(user=self.user, name='Tomato')
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'q': 'to'})
+        self.assertEqual([s['id'] for s in res.data], [ingredient.id])
+
+        ingredient.name = 'Potato'
+        ingredient.save()
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'q': 'to'})
+        self.assertEqual(len(res.data), 0)
+
+    def test_rolled_back_names_forgotten(self) -> None:
+        """ Test names of a rolled back transaction are not suggested """
+        self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'veg'})
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                Tag.objects.create(user=self.user, name='Vegan')
+                res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'veg'})
+                self.assertEqual(len(res.data), 1)
+                raise DatabaseError('Rolled back')
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'veg'})
+        self.assertEqual(res.data, [])
+
+    def test_committed_names_cached(self) -> None:
+        """ Test changes are published to the cache once committed """
+        trie_cache = autocomplete.tries[Tag]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='Vegan')
+            self.assertIsNot(
+                trie_cache.get(self.user.id), trie_cache.get(self.user.id)
+            )
+
+        self.assertIs(
+            trie_cache.get(self.user.id), trie_cache.get(self.user.id)
+        )
+
+    def test_autocomplete_limited_to_user(self) -> None:
+        """ Test names of other users are never suggested """
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='myinsecurepassword!'
+        )
+        Tag.objects.create(user=other, name='Vegan')
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 've'})
+
+        self.assertEqual(len(res.data), 0)
+
+    def test_autocomplete_requires_query(self) -> None:
+        """ Test a search term is required """
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,145 @@
+import os
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe, Tombstone, UploadSession
+from recipe import uploads
+
+BULK_UPDATE_URL = reverse('recipe:recipe-bulk-update')
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
+
+
+def sample_recipe(user, **params):
+    """ Create and return a sample recipe """
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class BulkRecipeApiTests(TestCase):
+    """ Test the bulk recipe actions """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.other = get_user_model().objects.create_user(
+            'other@joseloarca.com',
+            'testpass'
+        )
+        self.recipes = [sample_recipe(self.user) for _ in range(3)]
+        self.foreign = sample_recipe(self.other)
+
+    def test_set_price_by_ids(self) -> None:
+        """ Test re-pricing the selected recipes only """
+        ids = [self.recipes[0].id, self.recipes[1].id, self.foreign.id]
+
+        res = self.client.post(BULK_UPDATE_URL, {
+            'ids': ids,
+            'set': {'price': '7.50'},
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['updated'], 2)
+        prices = dict(Recipe.objects.values_list('id', 'price'))
+        self.assertEqual(prices[self.recipes[0].id], Decimal('7.50'))
+        self.assertEqual(prices[self.recipes[2].id], Decimal('5.00'))
+        self.assertEqual(prices[self.foreign.id], Decimal('5.00'))
+
+    def test_add_and_remove_relations_by_filter(self) -> None:
+        """ Test adding a tag and removing an ingredient by filter """
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        for recipe in self.recipes[:2]:
+            recipe.ingredients.add(salt)
+        self.recipes[0].tags.add(vegan)
+
+        res = self.client.post(BULK_UPDATE_URL, {
+            'filter': {'ingredients': [salt.id]},
+            'add_tags': [vegan.id],
+            'remove_ingredients': [salt.id],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['updated'], 2)
+        self.assertEqual(res.data['tags_added'], 1)
+        self.assertEqual(res.data['ingredients_removed'], 2)
+        self.assertEqual(vegan.recipe_set.count(), 2)
+        self.assertFalse(salt.recipe_set.exists())
+
+    def test_foreign_tags_rejected(self) -> None:
+        """ Test tags of another user cannot be added """
+        tag = Tag.objects.create(user=self.other, name='Theirs')
+
+        res = self.client.post(BULK_UPDATE_URL, {
+            'ids': [self.recipes[0].id],
+            'add_tags': [tag.id],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(tag.recipe_set.exists())
+
+    def test_selection_and_changes_required(self) -> None:
+        """ Test a bulk update needs one selection and some change """
+        no_selection = self.client.post(BULK_UPDATE_URL, {
+            'set': {'price': '1.00'},
+        }, format='json')
+        no_change = self.client.post(BULK_UPDATE_URL, {
+            'ids': [self.recipes[0].id],
+        }, format='json')
+
+        self.assertEqual(
+            no_selection.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(no_change.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete(self) -> None:
+        """ Test deleting recipes records tombstones and drops relations """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipes[0].tags.add(tag)
+        ids = [self.recipes[0].id, self.recipes[1].id, self.foreign.id]
+
+        res = self.client.post(BULK_DELETE_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['deleted'], 2)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('id', flat=True)),
+            sorted([self.recipes[2].id, self.foreign.id])
+        )
+        self.assertFalse(tag.recipe_set.exists())
+        self.assertEqual(
+            sorted(Tombstone.objects.values_list('object_id', flat=True)),
+            sorted(ids[:2])
+        )
+
+    def test_bulk_delete_with_open_upload(self) -> None:
+        """ Test deleting recipes drops their upload sessions and chunks """
+        session = uploads.create(self.recipes[0], 'photo.png', 10, 'a' * 64)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                BULK_DELETE_URL,
+                {'ids': [self.recipes[0].id]},
+                format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['deleted'], 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(uploads.partial_path(session)))
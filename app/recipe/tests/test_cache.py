@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from recipe.cache import UserIndexCache
+
+
+class UserIndexCacheTests(SimpleTestCase):
+    """ Test the process-local cache of per-user indexes """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.data = {1: 'first', 2: 'second', 3: 'third'}
+        self.builds = []
+
+    def build(self, user_id):
+        """ Return the index of a user, recording the build """
+        self.builds.append(user_id)
+        return self.data[user_id]
+
+    def test_evicted_version_not_reused(self) -> None:
+        """ Test a version lost from the cache never matches an old index """
+        writer = UserIndexCache('test', self.build)
+        reader = UserIndexCache('test', self.build)
+        writer.invalidate(1)
+        self.assertEqual(reader.get(1), 'first')
+
+        cache.clear()
+        self.data[1] = 'changed'
+        writer.invalidate(1)
+
+        self.assertEqual(reader.get(1), 'changed')
+
+    def test_least_recently_used_dropped(self) -> None:
+        """ Test only max_users indexes are held """
+        indexes = UserIndexCache('test', self.build, max_users=2)
+        indexes.get(1)
+        indexes.get(2)
+        indexes.get(1)
+
+        indexes.get(3)
+        indexes.get(1)
+        indexes.get(2)
+
+        self.assertEqual(self.builds, [1, 2, 3, 2])
@@ -0,0 +1,149 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe, Tombstone
+
+CHANGES_URL = reverse('recipe:changes')
+
+
+def sample_recipe(user, **params):
+    """ Create and return a sample recipe """
+    defaults = {
+        'title': 'My sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(SYNC_COMMIT_MARGIN=0)
+class ChangesApiTests(TestCase):
+    """ Test change feed API """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@gmail.com',
+            password='myinsecurepassword!'
+        )
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, **params):
+        """ Request the change feed and return the response data """
+        if since:
+            params['since'] = since
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res.data
+
+    def test_initial_sync(self) -> None:
+        """ Test a sync without cursor returns every object """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+
+        data = self.sync()
+
+        self.assertEqual([t['id'] for t in data['tags']], [tag.id])
+        self.assertEqual(
+            [i['id'] for i in data['ingredients']], [ingredient.id]
+        )
+        self.assertEqual(data['recipes'][0]['tags'], [tag.id])
+        self.assertFalse(data['has_more'])
+
+        data = self.sync(data['cursor'])
+        self.assertEqual(data['recipes'], [])
+        self.assertEqual(data['tags'], [])
+
+    def test_sync_returns_only_changes(self) -> None:
+        """ Test only objects changed after the cursor are returned """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user)
+        cursor = self.sync()['cursor']
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        data = self.sync(cursor)
+
+        self.assertEqual(data['tags'][0]['name'], 'Vegetarian')
+        self.assertEqual(data['recipes'], [])
+
+        recipe.tags.add(tag)
+        data = self.sync(data['cursor'])
+
+        self.assertEqual([r['id'] for r in data['recipes']], [recipe.id])
+
+    def test_sync_deletions(self) -> None:
+        """ Test deleted objects are returned as tombstones """
+        recipe = sample_recipe(self.user)
+        cursor = self.sync()['cursor']
+        recipe_id = recipe.id
+
+        recipe.delete()
+        data = self.sync(cursor)
+
+        self.assertEqual(
+            data['deleted'],
+            [{'type': 'recipe', 'id': recipe_id}]
+        )
+
+    def test_sync_batches(self) -> None:
+        """ Test changes are returned in batches of the requested size """
+        for name in ('Breakfast', 'Lunch', 'Dinner'):
+            Tag.objects.create(user=self.user, name=name)
+
+        data = self.sync(limit=2)
+        self.assertEqual(len(data['tags']), 2)
+        self.assertTrue(data['has_more'])
+
+        data = self.sync(data['cursor'], limit=2)
+        self.assertEqual([t['name'] for t in data['tags']], ['Dinner'])
+        self.assertFalse(data['has_more'])
+
+    def test_sync_limited_to_user(self) -> None:
+        """ Test changes of other users are not returned """
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='myinsecurepassword!'
+        )
+        sample_recipe(other).delete()
+
+        data = self.sync()
+
+        self.assertEqual(data['recipes'], [])
+        self.assertEqual(data['deleted'], [])
+
+    def test_unsettled_changes_held_back(self) -> None:
+        """ Test rows that may still be committing are sent later """
+        Tag.objects.create(user=self.user, name='Breakfast')
+
+        with self.settings(SYNC_COMMIT_MARGIN=60):
+            data = self.sync()
+
+        self.assertEqual(data['tags'], [])
+        self.assertIsNone(data['cursor'])
+
+        data = self.sync(data['cursor'])
+        self.assertEqual([t['name'] for t in data['tags']], ['Breakfast'])
+
+    def test_invalid_cursor(self) -> None:
+        """ Test an invalid cursor returns a bad request """
+        res = self.client.get(CHANGES_URL, {'since': 'yesterday'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_deletion_leaves_no_tombstones(self) -> None:
+        """ Test deleting a user does not record tombstones """
+        sample_recipe(self.user)
+
+        self.user.delete()
+
+        self.assertFalse(Tombstone.objects.exists())
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe, Tombstone
+
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def merge_url(ingredient_id):
+    """ Return the URL merging duplicates into an ingredient """
+    return reverse('recipe:ingredient-merge', args=[ingredient_id])
+
+
+class DedupApiTests(TestCase):
+    """ Test unique names and merging of tags and ingredients """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_create_returns_existing(self) -> None:
+        """ Test creating a name that differs in case or spaces """
+        first = self.client.post(INGREDIENTS_URL, {'name': 'Salt'})
+        second = self.client.post(INGREDIENTS_URL, {'name': ' salt '})
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_names_unique_per_user(self) -> None:
+        """ Test the database refuses duplicate names of a user only """
+        other = get_user_model().objects.create_user(
+            'other@joseloarca.com',
+            'testpass'
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=other, name='vegan')
+
+        with self.assertRaises(IntegrityError):
+            Tag.objects.create(user=self.user, name='VEGAN ')
+
+    def test_merge(self) -> None:
+        """ Test merging moves recipes to the survivor and deletes the rest """
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        sea_salt = Ingredient.objects.create(user=self.user, name='Sea salt')
+        fleur = Ingredient.objects.create(user=self.user, name='Fleur de sel')
+        both = Recipe.objects.create(
+            user=self.user, title='Fries', time_minutes=20, price=2
+        )
+        both.ingredients.add(salt, sea_salt)
+        one = Recipe.objects.create(
+            user=self.user, title='Caramel', time_minutes=30, price=3
+        )
+        one.ingredients.add(fleur)
+
+        res = self.client.post(
+            merge_url(salt.id),
+            {'ids': [sea_salt.id, fleur.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'merged': 2, 'recipes': 2})
+        self.assertEqual(list(Ingredient.objects.all()), [salt])
+        self.assertEqual(
+            sorted(salt.recipe_set.values_list('id', flat=True)),
+            [both.id, one.id]
+        )
+        self.assertEqual(
+            sorted(Tombstone.objects.values_list('object_id', flat=True)),
+            [sea_salt.id, fleur.id]
+        )
+
+    def test_merge_unknown_ids(self) -> None:
+        """ Test merging refuses objects of other users """
+        other = get_user_model().objects.create_user(
+            'other@joseloarca.com',
+            'testpass'
+        )
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        theirs = Ingredient.objects.create(user=other, name='Sea salt')
+
+        res = self.client.post(
+            merge_url(salt.id), {'ids': [theirs.id]}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Ingredient.objects.filter(pk=theirs.pk).exists())
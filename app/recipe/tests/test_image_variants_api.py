@@ -0,0 +1,186 @@
+import fcntl
+import os
+import shutil
+import threading
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import images
+
+
+def image_url(recipe_id):
+    """ Return the URL of a resized recipe image """
+    return reverse('recipe:recipe-image', args=[recipe_id])
+
+
+class ImageVariantApiTests(TestCase):
+    """ Test serving resized recipe images """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=10,
+            price=5
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'orange').save(buffer, format='PNG')
+        self.recipe.image.save('sample.png', ContentFile(buffer.getvalue()))
+        self.storage = self.recipe.image.storage
+
+    def tearDown(self) -> None:
+        self.recipe.image.delete()
+        shutil.rmtree(
+            self.storage.path(images.VARIANTS_DIR), ignore_errors=True
+        )
+
+    def get_image(self, **params):
+        """ Request a variant and return the response and decoded image """
+        res = self.client.get(
+            image_url(self.recipe.id), params, HTTP_ACCEPT='image/*'
+        )
+        if res.status_code != status.HTTP_200_OK:
+            return res, None
+
+        return res, Image.open(BytesIO(b''.join(res.streaming_content)))
+
+    def test_resize(self) -> None:
+        """ Test the image is scaled to the width in the format asked """
+        res, image = self.get_image(width=160, format='webp')
+
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertEqual(image.format, 'WEBP')
+        self.assertEqual(image.size, (160, 80))
+
+    def test_unchanged_variant_not_modified(self) -> None:
+        """ Test a variant already held by the client is not sent again """
+        first, _ = self.get_image(width=160)
+
+        res = self.client.get(
+            image_url(self.recipe.id), {'width': 160},
+            HTTP_ACCEPT='image/*', HTTP_IF_NONE_MATCH=first['ETag']
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], first['ETag'])
+
+    def test_rendered_once(self) -> None:
+        """ Test variants are served from disk once rendered """
+        with mock.patch.object(images, 'render',
+                               wraps=images.render) as render:
+            self.get_image(width=320)
+            res, image = self.get_image(width=320)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(image.size, (320, 160))
+
+    def test_concurrent_requests_render_once(self) -> None:
+        """ Test requests for a missing variant share one render """
+        started = threading.Barrier(4)
+        names = []
+        render = images.render
+
+        def slow_render(*args):
+            threading.Event().wait(0.2)
+            return render(*args)
+
+        def request():
+            started.wait()
+            names.append(images.variant(
+                self.storage, self.recipe.image.name, 640, 'png'
+            ))
+
+        with mock.patch.object(images, 'render',
+                               side_effect=slow_render) as mocked:
+            threads = [threading.Thread(target=request) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(len(set(names)), 1)
+
+    def test_render_waits_for_other_processes(self) -> None:
+        """ Test a variant rendered behind the lock is not rendered again """
+        path = self.storage.path(
+            images.variant_name(self.recipe.image.name, 160, 'jpeg')
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        names = []
+
+        def request():
+            names.append(images.variant(
+                self.storage, self.recipe.image.name, 160, 'jpeg'
+            ))
+
+        with mock.patch.object(images, 'render') as render, \
+                open(images.lock_path(path), 'a') as lock:
+            # Held through a file of its own, as another process would
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+
+            with open(path, 'wb') as variant:
+                variant.write(b'rendered elsewhere')
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            thread.join()
+
+        render.assert_not_called()
+        self.assertEqual(len(names), 1)
+
+    def test_disallowed_size_rejected(self) -> None:
+        """ Test widths and formats outside the allowlist are refused """
+        width, _ = self.get_image(width=333)
+        image_format, _ = self.get_image(width=160, format='gif')
+
+        self.assertEqual(width.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            image_format.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_least_recently_used_evicted(self) -> None:
+        """ Test older variants are deleted once over the size cap """
+        self.get_image(width=160)
+        first = self.storage.path(
+            images.variant_name(self.recipe.image.name, 160, 'jpeg')
+        )
+        os.utime(first, (0, 0))
+        size = os.path.getsize(first)
+
+        with override_settings(IMAGE_VARIANTS={'CACHE_BYTES': size}):
+            res, _ = self.get_image(width=320)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(os.path.exists(first))
+
+    def test_directory_scanned_when_due(self) -> None:
+        """ Test renders under the size cap do not scan the directory """
+        with mock.patch.object(images, '_scanned_at', None), \
+                mock.patch.object(images, 'evict',
+                                  wraps=images.evict) as evict:
+            self.get_image(width=160)
+            self.get_image(width=320)
+
+        self.assertEqual(evict.call_count, 1)
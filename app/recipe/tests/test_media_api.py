@@ -0,0 +1,96 @@
+from io import BytesIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+class MediaApiTests(TestCase):
+    """ Test serving recipe images to their owners """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=10,
+            price=5
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+        self.recipe.image.save('sample.png', ContentFile(self.content))
+        self.url = self.recipe.image.url
+
+    def tearDown(self) -> None:
+        self.recipe.image.delete()
+
+    def test_owner_gets_image(self) -> None:
+        """ Test the owner downloads the image with cache validators """
+        res = self.client.get(self.url, HTTP_ACCEPT='image/png')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertIn('immutable', res['Cache-Control'])
+
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self) -> None:
+        """ Test single byte ranges are served partially """
+        res = self.client.get(self.url, HTTP_RANGE='bytes=4-11')
+        suffix = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        invalid = self.client.get(
+            self.url, HTTP_RANGE=f'bytes={len(self.content)}-'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), self.content[4:12])
+        self.assertEqual(
+            res['Content-Range'], f'bytes 4-11/{len(self.content)}'
+        )
+        self.assertEqual(b''.join(suffix.streaming_content), self.content[-4:])
+        self.assertEqual(
+            invalid.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+
+    def test_other_users_refused(self) -> None:
+        """ Test images are only served to the owner of the recipe """
+        other = get_user_model().objects.create_user(
+            'other@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(self.url)
+        anonymous = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self) -> None:
+        """ Test the transfer can be handed to nginx """
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected-media/{self.recipe.image.name}'
+        )
+        self.assertEqual(res.content, b'')
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from core.models import Recipe
+from recipe import images, orphans
+
+
+class OrphanedMediaTests(TestCase):
+    """ Test collecting recipe images no recipe refers to """
+
+    def setUp(self) -> None:
+        # A media root of its own, so files left by other tests don't count
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=10,
+            price=5
+        )
+        self.storage = Recipe._meta.get_field('image').storage
+        self.recipe.image.save('used.png', ContentFile(b'used'))
+
+    def write(self, name, content=b'orphan', age=2 * 86400):
+        """ Write a file last modified age seconds ago """
+        path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        os.utime(path, (time.time() - age,) * 2)
+
+        return name
+
+    def test_old_orphans_deleted(self) -> None:
+        """ Test orphans past the grace period are deleted """
+        old = self.write('uploads/recipe/old-orphan.png', b'12345')
+        young = self.write('uploads/recipe/young-orphan.png', age=60)
+        os.utime(self.storage.path(self.recipe.image.name),
+                 (time.time() - 2 * 86400,) * 2)
+
+        removed, reclaimed = orphans.collect(grace_period=86400)
+
+        self.assertEqual((removed, reclaimed), (1, 5))
+        self.assertFalse(self.storage.exists(old))
+        self.assertTrue(self.storage.exists(young))
+        self.assertTrue(self.storage.exists(self.recipe.image.name))
+
+    def test_orphans_quarantined(self) -> None:
+        """ Test orphans can be moved aside instead of deleted """
+        old = self.write('uploads/recipe/old-orphan.png')
+
+        orphans.collect(grace_period=86400, quarantine=True)
+
+        self.assertFalse(self.storage.exists(old))
+        self.assertTrue(
+            self.storage.exists(f'{orphans.QUARANTINE_DIR}/{old}')
+        )
+
+    def test_orphaned_variants_deleted(self) -> None:
+        """ Test variants are deleted once their image is unused """
+        used = self.write(
+            images.variant_name(self.recipe.image.name, 160, 'jpeg')
+        )
+        orphaned = self.write(f'{images.VARIANTS_DIR}/gone.png-160.jpg')
+
+        removed, _ = orphans.collect(grace_period=86400)
+
+        self.assertEqual(removed, 1)
+        self.assertTrue(self.storage.exists(used))
+        self.assertFalse(self.storage.exists(orphaned))
+
+    def test_lookups_batched(self) -> None:
+        """ Test files are checked against recipes a batch per query """
+        for number in range(5):
+            self.write(f'uploads/recipe/orphan-{number}.png')
+
+        with self.assertNumQueries(3):
+            removed, _ = orphans.collect(grace_period=86400, batch_size=2)
+
+        self.assertEqual(removed, 5)
+
+    def test_command_dry_run(self) -> None:
+        """ Test a dry run reports orphans without removing them """
+        old = self.write('uploads/recipe/old-orphan.png', b'12345')
+        out = StringIO()
+
+        call_command('collect_media', grace_period=86400, dry_run=True,
+                     stdout=out)
+
+        self.assertTrue(self.storage.exists(old))
+        self.assertIn('Would remove 1 orphaned files', out.getvalue())
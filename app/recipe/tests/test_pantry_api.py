@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Ingredient
+
+from recipe import pantry
+
+PANTRY_URL = reverse('recipe:recipe-pantry')
+
+
+def sample_recipe(user, ingredients, **params):
+    """ Create and return a sample recipe with ingredients """
+    defaults = {
+        'title': 'My sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.ingredients.add(*ingredients)
+
+    return recipe
+
+
+class PantryApiTests(TestCase):
+    """ Test pantry matching API """
+
+    def setUp(self) -> None:
+        pantry.indexes.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@gmail.com',
+            password='myinsecurepassword!'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.corn = Ingredient.objects.create(user=self.user, name='Corn')
+        self.beans = Ingredient.objects.create(user=self.user, name='Beans')
+        self.cheese = Ingredient.objects.create(user=self.user, name='Cheese')
+
+    def test_fully_covered_recipes(self) -> None:
+        """ Test only recipes covered by the pantry are returned """
+        tortillas = sample_recipe(self.user, [self.corn], title='Tortillas')
+        sample_recipe(self.user, [self.corn, self.beans], title='Frijoles')
+
+        res = self.client.get(PANTRY_URL, {'ingredients': f'{self.corn.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [tortillas.id])
+        self.assertEqual(res.data[0]['missing_ingredients'], [])
+
+    def test_near_covered_recipes(self) -> None:
+        """ Test recipes missing up to max_missing ingredients """
+        tortillas = sample_recipe(self.user, [self.corn], title='Tortillas')
+        frijoles = sample_recipe(
+            self.user, [self.corn, self.beans], title='Frijoles'
+        )
+        sample_recipe(
+            self.user, [self.corn, self.beans, self.cheese], title='Pupusas'
+        )
+
+        res = self.client.get(
+            PANTRY_URL,
+            {'ingredients': f'{self.corn.id}', 'max_missing': 1}
+        )
+
+        self.assertEqual(
+            [r['id'] for r in res.data],
+            [tortillas.id, frijoles.id]
+        )
+        self.assertEqual(res.data[1]['missing_ingredients'], [self.beans.id])
+
+    def test_pantry_queries_bounded(self) -> None:
+        """ Test matched recipes are fetched in a fixed number of queries """
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(20):
+                sample_recipe(self.user, [self.corn, self.beans],
+                              title=f'Recipe {number}')
+        params = {'ingredients': f'{self.corn.id},{self.beans.id}'}
+        self.client.get(PANTRY_URL, params)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(PANTRY_URL, params)
+
+        self.assertEqual(len(res.data), 20)
+
+    def test_rolled_back_recipes_forgotten(self) -> None:
+        """ Test recipes of a rolled back transaction are not matched """
+        query = {'ingredients': f'{self.corn.id}'}
+        self.client.get(PANTRY_URL, query)
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                ghost = sample_recipe(self.user, [self.corn])
+                res = self.client.get(PANTRY_URL, query)
+                self.assertEqual([r['id'] for r in res.data], [ghost.id])
+                raise DatabaseError('Rolled back')
+
+        self.assertNotIn(ghost.id, pantry.indexes.get(self.user.id).masks)
+
+    def test_index_follows_ingredient_changes(self) -> None:
+        """ Test the index is updated when recipe ingredients change """
+        recipe = sample_recipe(self.user, [self.corn, self.beans])
+        params = {'ingredients': f'{self.corn.id}'}
+
+        res = self.client.get(PANTRY_URL, params)
+        self.assertEqual(len(res.data), 0)
+
+        recipe.ingredients.remove(self.beans)
+        res = self.client.get(PANTRY_URL, params)
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+        self.cheese.recipe_set.add(recipe)
+        res = self.client.get(PANTRY_URL, params)
+        self.assertEqual(len(res.data), 0)
+
+        self.cheese.delete()
+        res = self.client.get(PANTRY_URL, params)
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+    def test_pantry_limited_to_user(self) -> None:
+        """ Test recipes of other users are never matched """
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='myinsecurepassword!'
+        )
+        sample_recipe(other, [])
+
+        res = self.client.get(PANTRY_URL, {'ingredients': ''})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 0)
+
+    def test_invalid_pantry_params(self) -> None:
+        """ Test invalid parameters return a bad request """
+        res = self.client.get(PANTRY_URL, {'ingredients': 'a,b'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
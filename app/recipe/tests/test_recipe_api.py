@@ -1,19 +1,25 @@
 import tempfile
 import os
+from unittest import mock
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import singleflight
 from core.models import Recipe, Tag, Ingredient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+MULTI_GET_URL = reverse('recipe:recipe-multi-get')
 
 
 def image_upload_url(recipe_id):
@@ -211,6 +217,124 @@ class RecipesApiTests(TestCase):
 
         self.assertEqual(len(tags), 0)
 
+    def test_create_recipe_statements(self) -> None:
+        """ Test creating a recipe writes each table with one statement """
+        tags = [sample_tag(user=self.user, name=name) for name in 'abc']
+        ingredient = sample_ingredient(user=self.user)
+        payload = {
+            'title': 'Poke',
+            'tags': [tag.id for tag in tags],
+            'ingredients': [ingredient.id],
+            'time_minutes': 20,
+            'price': 12.00
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        statements = [query['sql'].split()[0] for query in queries]
+        self.assertEqual(
+            [sql for sql in statements if sql in ('SELECT', 'INSERT')],
+            ['SELECT', 'SELECT', 'INSERT', 'INSERT', 'INSERT']
+        )
+        self.assertEqual(sorted(res.data['tags']), [tag.id for tag in tags])
+
+    def test_update_unchanged_relations(self) -> None:
+        """ Test updating a recipe does not rewrite unchanged relations """
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+        recipe.tags.add(tag)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(detail_url(recipe.id), {
+                'title': 'Renamed',
+                'tags': [tag.id],
+            })
+
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith(('INSERT', 'DELETE'))
+        ])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Renamed')
+
+    def test_create_recipe_unknown_tag(self) -> None:
+        """ Test unknown tags are rejected """
+        payload = {
+            'title': 'Poke',
+            'tags': [1234],
+            'time_minutes': 20,
+            'price': 12.00
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_multi_get(self) -> None:
+        """ Test fetching recipes by ID in order, reporting missing ones """
+        first = sample_recipe(user=self.user, title='First')
+        second = sample_recipe(user=self.user, title='Second')
+        second.tags.add(sample_tag(user=self.user))
+        second.ingredients.add(sample_ingredient(user=self.user))
+        other = get_user_model().objects.create_user(
+            'other@joseloarca.com',
+            'testpass'
+        )
+        foreign = sample_recipe(user=other)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(MULTI_GET_URL, {
+                'ids': f'{second.id},{foreign.id},{first.id},9999'
+            })
+
+        serializer = RecipeDetailSerializer([second, first], many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], serializer.data)
+        self.assertEqual(res.data['missing'], [foreign.id, 9999])
+
+    def test_multi_get_post(self) -> None:
+        """ Test IDs can be posted, and must be integers """
+        recipe = sample_recipe(user=self.user)
+
+        res = self.client.post(
+            MULTI_GET_URL, {'ids': [recipe.id]}, format='json'
+        )
+        invalid = self.client.get(MULTI_GET_URL, {'ids': 'one,two'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['id'], recipe.id)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_identical_reads_coalesced(self) -> None:
+        """ Test a list in flight for the same user and query is shared """
+        cache.clear()
+        sample_recipe(user=self.user)
+        shared = (200, b'[]', {'Content-Type': 'application/json'})
+
+        with mock.patch.object(
+                singleflight.group, 'do', return_value=shared) as do:
+            res = self.client.get(RECIPES_URL, {'ordering': 'title'})
+
+        self.assertEqual(res.json(), [])
+        user_id, path, _ = do.call_args[0][0]
+        self.assertEqual(user_id, self.user.id)
+        self.assertEqual(path, f'{RECIPES_URL}?ordering=title')
+
+    def test_reads_after_writes_not_coalesced(self) -> None:
+        """ Test a user who just wrote reads on their own """
+        self.client.post(RECIPES_URL, {
+            'title': 'Poke', 'time_minutes': 20, 'price': 12.00
+        })
+
+        with mock.patch.object(singleflight.group, 'do') as do:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 1)
+        do.assert_not_called()
+
 
 class RecipeImageUploadTests(TestCase):
 
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import pagination
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeOrderingApiTests(TestCase):
+    """ Test ordering, range filters and keyset pages of recipes """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=minutes,
+                price=price
+            )
+            for title, minutes, price in (
+                ('Stew', 90, 12),
+                ('Salad', 10, 6),
+                ('Pasta', 25, 8),
+                ('Toast', 5, 2),
+                ('Curry', 25, 9),
+            )
+        ]
+
+    def titles(self, res):
+        """ Return the titles of a list response, paginated or not """
+        recipes = res.data['results'] if 'results' in res.data else res.data
+        return [recipe['title'] for recipe in recipes]
+
+    def test_ordering(self) -> None:
+        """ Test recipes are sorted by the field, ties by id """
+        by_time = self.client.get(RECIPES_URL, {'ordering': 'time_minutes'})
+        by_price = self.client.get(RECIPES_URL, {'ordering': '-price'})
+
+        self.assertEqual(
+            self.titles(by_time),
+            ['Toast', 'Salad', 'Pasta', 'Curry', 'Stew']
+        )
+        self.assertEqual(
+            self.titles(by_price),
+            ['Stew', 'Curry', 'Pasta', 'Salad', 'Toast']
+        )
+
+    def test_range_filters(self) -> None:
+        """ Test filtering by maximum time and price range """
+        res = self.client.get(RECIPES_URL, {
+            'max_time_minutes': 30,
+            'min_price': '5.00',
+            'max_price': '8.50',
+            'ordering': 'title',
+        })
+
+        self.assertEqual(self.titles(res), ['Pasta', 'Salad'])
+
+    def test_keyset_pages(self) -> None:
+        """ Test paging follows cursors across equal values """
+        titles = []
+        params = {'ordering': '-time_minutes', 'limit': 2}
+        while True:
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            titles += self.titles(res)
+            if res.data['next'] is None:
+                break
+            params['cursor'] = res.data['next']
+
+        self.assertEqual(
+            titles,
+            ['Stew', 'Curry', 'Pasta', 'Salad', 'Toast']
+        )
+
+    def test_cursor_bounds_ordering_field(self) -> None:
+        """ Test a cursor also bounds the ordering field on its own """
+        queryset = pagination.after(
+            Recipe.objects.all(), '-time_minutes', (25, 3)
+        )
+
+        self.assertIn('"time_minutes" <= 25 AND', str(queryset.query))
+
+    def test_invalid_parameters(self) -> None:
+        """ Test unknown orderings and mismatched cursors are refused """
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'price', 'limit': 1}
+        )
+
+        unknown = self.client.get(RECIPES_URL, {'ordering': 'link'})
+        mismatched = self.client.get(
+            RECIPES_URL, {'ordering': 'title', 'cursor': res.data['next']}
+        )
+        malformed = self.client.get(RECIPES_URL, {'cursor': 'nonsense'})
+
+        self.assertEqual(unknown.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(mismatched.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(malformed.status_code, status.HTTP_400_BAD_REQUEST)
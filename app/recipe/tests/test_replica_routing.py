@@ -0,0 +1,96 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import routing
+from core.db.routers import ReplicaRouter
+from core.models import Tag
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    """ Test the read replica router """
+
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_primary_by_default(self) -> None:
+        """ Test reads outside a replica scope use the primary """
+        self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+        with routing.request_scope():
+            self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_replica_reads(self) -> None:
+        """ Test reads use a replica when the request asks for it """
+        with routing.request_scope() as state:
+            state.use_replica = True
+
+            self.assertEqual(self.router.db_for_read(Tag), 'replica')
+
+    def test_reads_after_write_go_to_primary(self) -> None:
+        """ Test reads after a write in the same request use the primary """
+        with routing.request_scope() as state:
+            state.use_replica = True
+            self.assertEqual(self.router.db_for_write(Tag), 'default')
+
+            self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_nested_scope_reports_writes(self) -> None:
+        """ Test writes in a nested scope are seen by the outer one """
+        with routing.request_scope() as outer:
+            with routing.request_scope():
+                self.router.db_for_write(Tag)
+
+            self.assertTrue(outer.wrote)
+
+    def test_no_migrations_on_replicas(self) -> None:
+        """ Test migrations never run on a replica """
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@skipUnless('replica' in settings.DATABASES, 'No replica configured')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingApiTests(TransactionTestCase):
+    """ Test API reads are sent to the replica """
+    databases = '__all__'
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@gmail.com',
+            password='myinsecurepassword!'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_reads_replica(self) -> None:
+        """ Test listing tags queries the replica """
+        with CaptureQueriesContext(connections['replica']) as queries:
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(queries.captured_queries)
+
+    def test_reads_stick_to_primary_after_write(self) -> None:
+        """ Test a user reads from the primary right after writing """
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        with CaptureQueriesContext(connections['replica']) as queries:
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data[0]['name'], 'Vegan')
+        self.assertFalse(queries.captured_queries)
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """ Return recipe detail URL """
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsApiTests(TestCase):
+    """ Test the ?fields= and ?expand= parameters """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Salt'
+        )
+        for title in ('Fries', 'Salad', 'Soup'):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=10,
+                price=5
+            )
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(self.ingredient)
+
+    def test_fields_narrow_response_and_columns(self) -> None:
+        """ Test only the requested fields are returned and selected """
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [set(recipe) for recipe in res.data],
+            [{'id', 'title'}] * 3
+        )
+        sql = [query['sql'] for query in queries.captured_queries]
+        recipe_queries = [query for query in sql if 'core_recipe' in query]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('"link"', recipe_queries[0])
+        self.assertNotIn('"image"', recipe_queries[0])
+
+    def test_relations_prefetched_once(self) -> None:
+        """ Test listing relations costs one query each, not one per row """
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'], [self.tag.id])
+
+    def test_expand_nests_relations(self) -> None:
+        """ Test expanded relations are returned as objects """
+        res = self.client.get(
+            RECIPES_URL,
+            {'fields': 'title,tags', 'expand': 'tags'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data[0],
+            {'title': 'Soup', 'tags': [{'id': self.tag.id, 'name': 'Vegan'}]}
+        )
+
+    def test_retrieve_and_attributes(self) -> None:
+        """ Test detail and attribute endpoints accept fields """
+        recipe = Recipe.objects.first()
+
+        detail = self.client.get(detail_url(recipe.id), {'fields': 'price'})
+        tags = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(detail.data, {'price': '5.00'})
+        self.assertEqual(tags.data, [{'name': 'Vegan'}])
+
+    def test_unknown_fields_rejected(self) -> None:
+        """ Test unknown fields and relations are refused """
+        fields = self.client.get(RECIPES_URL, {'fields': 'id,user'})
+        expand = self.client.get(TAGS_URL, {'expand': 'recipes'})
+
+        self.assertEqual(fields.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(expand.status_code, status.HTTP_400_BAD_REQUEST)
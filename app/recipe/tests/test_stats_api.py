@@ -0,0 +1,116 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe, RecipeStats, TagStats
+
+STATS_URL = reverse('recipe:stats')
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_UPDATE_URL = reverse('recipe:recipe-bulk-update')
+
+
+def detail_url(recipe_id):
+    """ Return recipe detail URL """
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class StatsApiTests(TestCase):
+    """ Test the recipe statistics of users """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+
+    def create_recipe(self, **params):
+        """ Create a recipe through the API """
+        payload = {'title': 'Sample', 'time_minutes': 10, 'price': '5.00'}
+        payload.update(params)
+
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        return res.data['id']
+
+    def assertStatsExact(self) -> None:
+        """ Assert the incremental statistics match a rebuild """
+        stats = RecipeStats.objects.get(user=self.user)
+        counts = dict(TagStats.objects.values_list('tag_id', 'recipe_count'))
+
+        call_command('rebuild_stats', self.user.pk, stdout=StringIO())
+
+        rebuilt = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(
+            (stats.recipe_count, stats.total_price, stats.total_time_minutes),
+            (rebuilt.recipe_count, rebuilt.total_price,
+             rebuilt.total_time_minutes)
+        )
+        self.assertEqual(
+            counts,
+            dict(TagStats.objects.values_list('tag_id', 'recipe_count'))
+        )
+
+    def test_summary(self) -> None:
+        """ Test the summary reports averages and most used tags """
+        self.create_recipe(tags=[self.vegan.id, self.quick.id])
+        self.create_recipe(
+            tags=[self.vegan.id], time_minutes=25, price='8.00'
+        )
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['average_price'], Decimal('6.50'))
+        self.assertEqual(res.data['average_time_minutes'], 17.5)
+        top_tags = res.data['top_tags']
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in top_tags],
+            [('Vegan', 2), ('Quick', 1)]
+        )
+
+    def test_incremental_changes(self) -> None:
+        """ Test updates, tag changes and deletions keep totals exact """
+        self.client.get(STATS_URL)
+        first = self.create_recipe(tags=[self.vegan.id])
+        second = self.create_recipe(tags=[self.quick.id])
+
+        self.client.patch(detail_url(first), {
+            'price': '12.50',
+            'tags': [self.quick.id],
+        })
+        Recipe.objects.get(pk=second).tags.add(self.vegan)
+        self.quick.recipe_set.clear()
+        self.client.delete(detail_url(second))
+
+        self.assertStatsExact()
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).total_price,
+            Decimal('12.50')
+        )
+
+    def test_bulk_changes_invalidate(self) -> None:
+        """ Test set-based updates rebuild the totals on the next read """
+        recipe_id = self.create_recipe()
+
+        self.client.post(BULK_UPDATE_URL, {
+            'ids': [recipe_id],
+            'set': {'time_minutes': 40},
+            'add_tags': [self.vegan.id],
+        }, format='json')
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['average_time_minutes'], 40)
+        self.assertEqual(res.data['top_tags'][0]['name'], 'Vegan')
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, UploadSession
+from recipe import uploads
+
+
+def uploads_url(recipe_id):
+    """ Return the URL opening upload sessions for a recipe """
+    return reverse('recipe:recipe-start-upload', args=[recipe_id])
+
+
+def upload_url(recipe_id, upload_id):
+    """ Return the URL of an upload session """
+    return reverse('recipe:recipe-upload', args=[recipe_id, upload_id])
+
+
+def complete_url(recipe_id, upload_id):
+    """ Return the URL finishing an upload session """
+    return reverse('recipe:recipe-complete-upload',
+                   args=[recipe_id, upload_id])
+
+
+class UploadSessionApiTests(TestCase):
+    """ Test resumable chunked image uploads """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=10,
+            price=5
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), 'teal').save(buffer, format='PNG')
+        self.data = buffer.getvalue()
+
+    def tearDown(self) -> None:
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            self.recipe.image.delete()
+        for session in UploadSession.objects.all():
+            uploads.discard(session)
+
+    def start(self, data=None, **payload):
+        """ Open an upload session for the sample image """
+        data = self.data if data is None else data
+        res = self.client.post(uploads_url(self.recipe.id), {
+            'filename': 'photo.png',
+            'size': len(data),
+            'checksum': hashlib.sha256(data).hexdigest(),
+            **payload,
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        return res.data['id']
+
+    def send(self, upload_id, start, chunk, size=None):
+        """ Send the bytes of a chunk starting at an offset """
+        size = len(self.data) if size is None else size
+        return self.client.put(
+            upload_url(self.recipe.id, upload_id),
+            chunk,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(chunk) - 1}'
+                               f'/{size}'
+        )
+
+    def test_chunked_upload(self) -> None:
+        """ Test an image sent in chunks becomes the recipe image """
+        upload_id = self.start()
+        middle = len(self.data) // 2
+
+        res = self.send(upload_id, 0, self.data[:middle])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], middle)
+
+        res = self.send(upload_id, middle, self.data[middle:])
+        self.assertEqual(res.data['offset'], len(self.data))
+
+        res = self.client.post(complete_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+        with self.recipe.image.open() as image:
+            self.assertEqual(image.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.listdir(
+            self.recipe.image.storage.path(uploads.PARTIAL_DIR)
+        ))
+
+    def test_resume_from_offset(self) -> None:
+        """ Test a chunk at the wrong offset is refused with the offset """
+        upload_id = self.start()
+        self.send(upload_id, 0, self.data[:100])
+
+        res = self.send(upload_id, 50, self.data[50:150])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 100)
+
+        res = self.client.get(upload_url(self.recipe.id, upload_id))
+        self.assertEqual(res.data['offset'], 100)
+
+        self.send(upload_id, 100, self.data[100:])
+        res = self.client.post(complete_url(self.recipe.id, upload_id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_range_outside_upload_rejected(self) -> None:
+        """ Test a chunk past the declared size is refused """
+        upload_id = self.start()
+
+        res = self.send(upload_id, 0, self.data + b'extra')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_incomplete_upload_not_attached(self) -> None:
+        """ Test an upload missing bytes cannot be completed """
+        upload_id = self.start()
+        self.send(upload_id, 0, self.data[:100])
+
+        res = self.client.post(complete_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_checksum_mismatch_discards_upload(self) -> None:
+        """ Test a file not matching its checksum is not attached """
+        upload_id = self.start(checksum='0' * 64)
+        self.send(upload_id, 0, self.data)
+
+        res = self.client.post(complete_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('checksum', res.data)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_not_an_image_rejected(self) -> None:
+        """ Test a file that is not an image is not attached """
+        data = b'not an image' * 10
+        upload_id = self.start(data=data)
+        self.send(upload_id, 0, data, size=len(data))
+
+        res = self.client.post(complete_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(UPLOAD_SESSIONS={'MAX_SIZE': 100})
+    def test_size_limited(self) -> None:
+        """ Test sessions cannot be opened for files over the size cap """
+        res = self.client.post(uploads_url(self.recipe.id), {
+            'filename': 'photo.png',
+            'size': 101,
+            'checksum': 'a' * 64,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_other_users_upload_not_found(self) -> None:
+        """ Test the uploads of other users cannot be written to """
+        upload_id = self.start()
+        other = get_user_model().objects.create_user(
+            'other@joseloarca.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.send(upload_id, 0, self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cancel_upload(self) -> None:
+        """ Test cancelling an upload deletes it and its bytes """
+        upload_id = self.start()
+        session = UploadSession.objects.get(pk=upload_id)
+
+        res = self.client.delete(upload_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(uploads.partial_path(session)))
+
+    def test_idle_sessions_expire(self) -> None:
+        """ Test idle sessions and stray partial files are deleted """
+        idle = UploadSession.objects.get(pk=self.start())
+        active = UploadSession.objects.get(pk=self.start())
+        stray = uploads.partial_path(idle) + '0'
+        open(stray, 'wb').close()
+
+        long_ago = timezone.now() - timedelta(days=2)
+        UploadSession.objects.filter(pk=idle.pk).update(updated_at=long_ago)
+        for path in (uploads.partial_path(idle), stray):
+            os.utime(path, (time.time() - 2 * 86400,) * 2)
+
+        self.assertEqual(uploads.expire(), 1)
+
+        self.assertFalse(UploadSession.objects.filter(pk=idle.pk).exists())
+        self.assertFalse(os.path.exists(uploads.partial_path(idle)))
+        self.assertFalse(os.path.exists(stray))
+        self.assertTrue(os.path.exists(uploads.partial_path(active)))
@@ -0,0 +1,272 @@
+"""
+Resumable, chunked uploads of recipe images.
+
+A client opens a session with the size and SHA-256 of its file, then
+sends the file in chunks, each naming its bytes in a Content-Range
+header. Chunks are streamed onto a partial file under PARTIAL_DIR in
+MEDIA_ROOT, never held in memory whole, and the session records how many
+bytes have arrived so an interrupted upload resumes from there. Once all
+bytes are in, the checksum is verified and the partial file is moved in
+place as the recipe image without being copied.
+
+Sessions idle for longer than EXPIRE_AFTER seconds are deleted, along
+with their partial files, by expire(). It runs in a background thread
+when sessions are opened, at most once every SWEEP_INTERVAL seconds per
+process, and from the expire_uploads command.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+
+from PIL import Image
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import exceptions, status
+
+from core.db import sharding
+from core.models import Recipe, UploadSession, recipe_image_file_path
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_DIR = 'uploads/partial'
+
+BLOCK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+_swept_at = None
+_sweep_lock = threading.Lock()
+
+
+class UploadConflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The chunk does not start at the upload offset.'
+    default_code = 'upload_conflict'
+
+    def __init__(self, offset):
+        super().__init__()
+        # Kept a number, so clients can resume from it
+        self.detail = {'detail': self.detail, 'offset': offset}
+
+
+def options():
+    """ Return the size cap and expiry settings of upload sessions """
+    return {
+        'MAX_SIZE': 20 * 1024 * 1024,
+        'EXPIRE_AFTER': 24 * 60 * 60,
+        'SWEEP_INTERVAL': 60 * 60,
+        **getattr(settings, 'UPLOAD_SESSIONS', {}),
+    }
+
+
+def storage():
+    """ Return the storage recipe images are saved to """
+    return Recipe._meta.get_field('image').storage
+
+
+def partial_path(session):
+    """ Return the path on disk of the bytes received for a session """
+    return storage().path(f'{PARTIAL_DIR}/{session.pk}')
+
+
+def content_range(header, size):
+    """ Return the (start, end) of a Content-Range within an upload """
+    match = CONTENT_RANGE_RE.match(header.strip())
+    if not match:
+        raise exceptions.ValidationError(
+            {'content_range': ['Expected "bytes <start>-<end>/<size>".']}
+        )
+
+    start, end, total = map(int, match.groups())
+    if total != size or start > end or end >= size:
+        raise exceptions.ValidationError(
+            {'content_range': ['The range is outside the upload.']}
+        )
+
+    return start, end
+
+
+def create(recipe, filename, size, checksum):
+    """ Open an upload session for an image of a recipe """
+    session = UploadSession.objects.create(
+        user_id=recipe.user_id,
+        recipe=recipe,
+        filename=filename,
+        size=size,
+        checksum=checksum
+    )
+
+    path = partial_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Truncates any stale file left under a reused id
+    open(path, 'wb').close()
+
+    return session
+
+
+def append(session, start, end, stream):
+    """ Write the bytes start to end of an upload, read from stream """
+    try:
+        partial = open(partial_path(session), 'r+b')
+    except FileNotFoundError:
+        raise Http404('Upload not found.')
+
+    with partial:
+        # Chunks of a session are written one at a time
+        try:
+            fcntl.flock(partial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict(session.received)
+
+        session.refresh_from_db(fields=['received'])
+        if start != session.received:
+            raise UploadConflict(session.received)
+
+        partial.seek(start)
+        partial.truncate()
+        remaining = end - start + 1
+        try:
+            while remaining:
+                block = stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                partial.write(block)
+                remaining -= len(block)
+        finally:
+            # Whatever arrived is kept, so a dropped chunk resumes from it
+            partial.flush()
+            os.fsync(partial.fileno())
+            session.received = partial.tell()
+            session.save(update_fields=['received', 'updated_at'])
+
+    if remaining:
+        raise exceptions.ValidationError(
+            {'content_range': ['The chunk is shorter than its range.']}
+        )
+
+    return session
+
+
+def discard(session):
+    """ Delete an upload session and the bytes received for it """
+    try:
+        os.unlink(partial_path(session))
+    except FileNotFoundError:
+        pass
+
+    session.delete()
+
+
+def complete(session):
+    """ Verify a fully received upload and make it the recipe image """
+    if session.received != session.size:
+        raise exceptions.ValidationError(
+            {'offset': [f'Only {session.received} of {session.size} bytes '
+                        f'have been received.']}
+        )
+
+    path = partial_path(session)
+    try:
+        partial = open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404('Upload not found.')
+
+    with partial:
+        try:
+            fcntl.flock(partial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict(session.received)
+
+        digest = hashlib.sha256()
+        for block in iter(lambda: partial.read(BLOCK_SIZE), b''):
+            digest.update(block)
+
+        if digest.hexdigest() != session.checksum:
+            discard(session)
+            raise exceptions.ValidationError(
+                {'checksum': ['The file received does not match the '
+                              'checksum, upload it again.']}
+            )
+
+        try:
+            partial.seek(0)
+            Image.open(partial).verify()
+        except Exception:
+            discard(session)
+            raise exceptions.ValidationError(
+                {'image': ['The file received is not a valid image.']}
+            )
+
+        recipe = session.recipe
+        name = storage().get_available_name(
+            recipe_image_file_path(recipe, session.filename)
+        )
+        target = storage().path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    recipe.image = name
+    recipe.save()
+    session.delete()
+
+    return recipe
+
+
+def expire(now=None):
+    """ Delete idle upload sessions and partial files, return the count """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=options()['EXPIRE_AFTER'])
+
+    # Chunks touch both, so anything idle is expired or left by a deleted
+    # recipe or purged user
+    try:
+        with os.scandir(storage().path(PARTIAL_DIR)) as entries:
+            for entry in entries:
+                if entry.stat().st_mtime < cutoff.timestamp():
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        pass
+    except FileNotFoundError:
+        pass
+
+    return sum(
+        UploadSession.objects.using(using)
+        .filter(updated_at__lt=cutoff)
+        .delete()[1].get(UploadSession._meta.label, 0)
+        for using in sharding.shards()
+    )
+
+
+def _expire_in_background():
+    try:
+        expire()
+    except Exception:
+        logger.exception('Expiring upload sessions failed')
+    finally:
+        connections.close_all()
+
+
+def start_background():
+    """ Expire idle sessions in a background thread, if due """
+    global _swept_at
+    with _sweep_lock:
+        now = time.monotonic()
+        if _swept_at is not None and \
+                now - _swept_at < options()['SWEEP_INTERVAL']:
+            return
+        _swept_at = now
+
+    threading.Thread(
+        target=_expire_in_background,
+        name='upload-expiry',
+        daemon=True
+    ).start()
@@ -1,12 +1,19 @@
+from django.db import transaction
+from django.http import Http404, HttpResponse
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework import viewsets, mixins, status
+from rest_framework import viewsets, mixins, status, views, exceptions
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 
-from core.models import Tag, Ingredient, Recipe
+from core import singleflight, media
+from core.db import routing, sharding
+from core.models import Tag, Ingredient, Recipe, UploadSession
 
-from recipe import serializers
+from recipe import serializers, pantry, autocomplete, sync, bulk, dedup, \
+    pagination, stats, images, uploads
 
 
 def params_to_ints(qs):
@@ -14,7 +21,170 @@ def params_to_ints(qs):
     return [int(str_id) for str_id in qs.split(',')]
 
 
-class BaseRecipeAttributesViewSet(viewsets.GenericViewSet,
+class DataMoving(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your data is being moved, please retry shortly.'
+    default_code = 'data_moving'
+    wait = 5
+
+
+class FirstRendererNegotiation(BaseContentNegotiation):
+    """ Negotiation that accepts any Accept header, for file downloads """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class DatabaseRoutingMixin:
+    """
+    Route the queries of a request to the shard of the authenticated user,
+    and serve list and retrieve from a read replica unless the user wrote
+    recently enough that the replica may not have caught up
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        with routing.request_scope() as state:
+            response = super().dispatch(request, *args, **kwargs)
+
+        user = getattr(self.request, 'user', None)
+        if state.wrote and user is not None and user.is_authenticated:
+            routing.pin_to_primary(user.pk)
+
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        state = routing.current()
+        state.shard, moving = sharding.directory(
+            request.user.pk,
+            fresh=request.method not in SAFE_METHODS
+        )
+
+        if moving and request.method not in SAFE_METHODS:
+            raise DataMoving()
+
+        if getattr(self, 'action', None) in self.replica_actions and \
+                not routing.pinned_to_primary(request.user.pk):
+            state.use_replica = True
+
+
+class CoalescedReadsMixin:
+    """
+    Run identical concurrent list and retrieve requests of a user once,
+    sharing the rendered response between them
+    """
+    coalesced_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        if request.method == 'GET' and \
+                getattr(self, 'action', None) in self.coalesced_actions:
+            self.get = self.coalesce(self.get)
+
+    def coalesce(self, handler):
+        """ Wrap a handler so identical requests in flight share its result """
+        def coalesced(request, *args, **kwargs):
+            # Requests that must see their own recent writes run alone
+            if routing.current().wrote or \
+                    routing.pinned_to_primary(request.user.pk):
+                return handler(request, *args, **kwargs)
+
+            rendered = []
+
+            def render():
+                response = self.finalize_response(
+                    request,
+                    handler(request, *args, **kwargs),
+                    *args,
+                    **kwargs
+                )
+                response.render()
+                rendered.append(response)
+                return (
+                    response.status_code,
+                    response.content,
+                    dict(response.items())
+                )
+
+            status_code, content, headers = singleflight.group.do(
+                (
+                    request.user.pk,
+                    request.get_full_path(),
+                    request.META.get('HTTP_ACCEPT'),
+                ),
+                render
+            )
+
+            # The request that did the work keeps its own response
+            if rendered:
+                return rendered[0]
+
+            return HttpResponse(content, status=status_code, headers=headers)
+
+        return coalesced
+
+
+class SparseFieldsetsMixin:
+    """
+    Narrow list and retrieve responses to the fields asked with ?fields=,
+    nest the relations asked with ?expand=, and load only the columns and
+    relations those responses need
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        """ Return the requested fields, or None for all, and expansions """
+        if not hasattr(self, '_sparse_fields'):
+            query = serializers.SparseFieldsQuerySerializer(
+                data=self.request.query_params,
+                context={'serializer_class': self.get_serializer_class()}
+            )
+            if not query.is_valid():
+                raise exceptions.ValidationError(query.errors)
+
+            self._sparse_fields = (
+                query.validated_data.get('fields') or None,
+                query.validated_data.get('expand', []),
+            )
+
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        """ Pass the requested fields and expansions to the serializer """
+        context = super().get_serializer_context()
+        if self.action in self.sparse_actions:
+            context['fields'], context['expand'] = self.get_sparse_fields()
+
+        return context
+
+    def prune_queryset(self, queryset, *required):
+        """ Select only the columns and prefetch only the relations shown """
+        if self.action not in self.sparse_actions:
+            return queryset
+
+        fields, _ = self.get_sparse_fields()
+        if fields is None:
+            fields = list(self.get_serializer_class()().fields)
+
+        meta = queryset.model._meta
+        columns = {field.name for field in meta.concrete_fields}
+        relations = {field.name for field in meta.many_to_many}
+
+        return queryset\
+            .only(*[name for name in fields if name in columns], *required)\
+            .prefetch_related(*[name for name in fields if name in relations])
+
+
+class BaseRecipeAttributesViewSet(DatabaseRoutingMixin,
+                                  CoalescedReadsMixin,
+                                  SparseFieldsetsMixin,
+                                  viewsets.GenericViewSet,
                                   mixins.ListModelMixin,
                                   mixins.CreateModelMixin):
     """ Manage recipe attributes in the database """
@@ -32,14 +202,75 @@ class BaseRecipeAttributesViewSet(viewsets.GenericViewSet,
         if assigned_only:
             queryset = queryset.filter(recipe__isnull=False)
 
-        return queryset\
+        return self.prune_queryset(queryset)\
             .filter(user=self.request.user)\
             .order_by('-name')\
             .distinct()
 
-    def perform_create(self, serializer):
-        """ Create a new object """
-        serializer.save(user=self.request.user)
+    def create(self, request, *args, **kwargs):
+        """ Create a new object, or return the one with the same name """
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        obj, created = dedup.get_or_create(
+            self.queryset.model,
+            request.user,
+            serializer.validated_data['name']
+        )
+
+        return Response(
+            self.get_serializer(obj).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    @action(methods=['POST'], detail=True)
+    def merge(self, request, pk=None):
+        """ Merge duplicates into this object and delete them """
+        survivor = self.get_object()
+        serializer = serializers.MergeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = set(serializer.validated_data['ids']) - {survivor.pk}
+        duplicates = list(
+            self.queryset.model.objects
+            .filter(user=request.user, pk__in=ids)
+        )
+        missing = ids - {obj.pk for obj in duplicates}
+        if missing:
+            return Response(
+                {'ids': [f'Unknown IDs: {sorted(missing)}.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        counts = dedup.merge(survivor, duplicates)
+
+        return Response(counts, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """ Suggest names by prefix or close spelling, most used first """
+        query = serializers.AutocompleteQuerySerializer(
+            data=request.query_params
+        )
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        suggestions = autocomplete.suggest(
+            self.queryset.model,
+            request.user.id,
+            query.validated_data['q'],
+            query.validated_data['limit']
+        )
+
+        return Response(suggestions, status=status.HTTP_200_OK)
 
 
 class TagViewSet(BaseRecipeAttributesViewSet):
@@ -54,18 +285,55 @@ class IngredientViewSet(BaseRecipeAttributesViewSet):
     serializer_class = serializers.IngredientSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(DatabaseRoutingMixin,
+                    CoalescedReadsMixin,
+                    SparseFieldsetsMixin,
+                    viewsets.ModelViewSet):
     """ Manage recipes in the database """
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = pagination.KeysetPagination
+
+    def get_list_query(self):
+        """ Return the validated ordering, range and page parameters """
+        if not hasattr(self, '_list_query'):
+            query = serializers.RecipeListQuerySerializer(
+                data=self.request.query_params
+            )
+            if not query.is_valid():
+                raise exceptions.ValidationError(query.errors)
+
+            self._list_query = query.validated_data
+
+        return self._list_query
 
     def get_queryset(self):
         """ Retrieve the recipes for the authenticated user """
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
+        ordering = ['-id']
+
+        if self.action == 'list':
+            query = self.get_list_query()
+            ranges = {
+                'price__gte': query.get('min_price'),
+                'price__lte': query.get('max_price'),
+                'time_minutes__gte': query.get('min_time_minutes'),
+                'time_minutes__lte': query.get('max_time_minutes'),
+            }
+            queryset = queryset.filter(**{
+                lookup: value for lookup, value in ranges.items()
+                if value is not None
+            })
+
+            # Ties are broken by id so the order matches the indexes
+            field, descending = pagination.ordering_field(query['ordering'])
+            ordering = [query['ordering']]
+            if field != 'id':
+                ordering.append('-id' if descending else 'id')
 
         if tags:
             tag_ids = params_to_ints(tags)
@@ -75,7 +343,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_ids = params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return queryset.filter(user=self.request.user).order_by('-id')
+        return self.prune_queryset(queryset, ordering[0].lstrip('-'))\
+            .filter(user=self.request.user)\
+            .order_by(*ordering)
 
     def get_serializer_class(self):
         """ Return the appropriate serializer class """
@@ -83,6 +353,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'pantry':
+            return serializers.PantryRecipeSerializer
+        elif self.action == 'bulk_update':
+            return serializers.RecipeBulkUpdateSerializer
+        elif self.action == 'bulk_delete':
+            return serializers.RecipeBulkDeleteSerializer
+        elif self.action == 'multi_get':
+            return serializers.RecipeDetailSerializer
+        elif self.action in ('start_upload', 'upload', 'upload_chunk'):
+            return serializers.UploadSessionSerializer
+        elif self.action == 'complete_upload':
+            return serializers.RecipeImageSerializer
 
         return self.serializer_class
 
@@ -107,3 +389,258 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=True, url_path='image',
+            content_negotiation_class=FirstRendererNegotiation)
+    def image(self, request, pk=None):
+        """ Return the image of a recipe resized to an allowed width """
+        query = serializers.RecipeImageVariantQuerySerializer(
+            data=request.query_params
+        )
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        recipe = self.get_object()
+        if not recipe.image:
+            raise Http404('The recipe has no image.')
+
+        storage = recipe.image.storage
+        name = images.variant(
+            storage,
+            recipe.image.name,
+            query.validated_data['width'],
+            query.validated_data['format']
+        )
+
+        return media.serve(request, storage, name)
+
+    def get_upload(self, upload_id):
+        """ Return an upload session of the recipe in the URL """
+        recipe = self.get_object()
+        session = get_object_or_404(
+            UploadSession.objects.filter(recipe=recipe),
+            pk=upload_id
+        )
+        session.recipe = recipe
+
+        return session
+
+    @action(methods=['POST'], detail=True, url_path='uploads')
+    def start_upload(self, request, pk=None):
+        """ Open a resumable upload of an image for a recipe """
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        session = uploads.create(recipe, **serializer.validated_data)
+        transaction.on_commit(uploads.start_background)
+
+        return Response(
+            self.get_serializer(session).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(methods=['GET'], detail=True,
+            url_path=r'uploads/(?P<upload_id>\d+)')
+    def upload(self, request, pk=None, upload_id=None):
+        """ Return the offset an upload resumes from """
+        session = self.get_upload(upload_id)
+
+        return Response(self.get_serializer(session).data)
+
+    @upload.mapping.put
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """ Append the chunk in the body at the range it names """
+        session = self.get_upload(upload_id)
+        start, end = uploads.content_range(
+            request.META.get('HTTP_CONTENT_RANGE', ''),
+            session.size
+        )
+        if request.META.get('CONTENT_LENGTH') != str(end - start + 1):
+            raise exceptions.ValidationError(
+                {'content_range': ['The range does not match the body.']}
+            )
+
+        # Read straight from the request, never parsed into memory
+        uploads.append(session, start, end, request.stream)
+
+        return Response(self.get_serializer(session).data)
+
+    @upload.mapping.delete
+    def cancel_upload(self, request, pk=None, upload_id=None):
+        """ Abandon an upload and delete the bytes received """
+        uploads.discard(self.get_upload(upload_id))
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(methods=['POST'], detail=True,
+            url_path=r'uploads/(?P<upload_id>\d+)/complete')
+    def complete_upload(self, request, pk=None, upload_id=None):
+        """ Verify a finished upload and attach it as the recipe image """
+        recipe = uploads.complete(self.get_upload(upload_id))
+
+        return Response(self.get_serializer(recipe).data)
+
+    @action(methods=['GET'], detail=False, url_path='pantry')
+    def pantry(self, request):
+        """ List the recipes that can be cooked with the given ingredients """
+        query = serializers.PantryQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        matches = pantry.match_recipes(
+            request.user.id,
+            query.validated_data['ingredients'],
+            query.validated_data['max_missing']
+        )
+        recipes = Recipe.objects\
+            .filter(user=request.user)\
+            .prefetch_related('tags', 'ingredients')\
+            .in_bulk([recipe_id for recipe_id, _ in matches])
+
+        serializer = self.get_serializer_class()(
+            [recipes[recipe_id] for recipe_id, _ in matches
+             if recipe_id in recipes],
+            many=True,
+            context={'request': request, 'missing': dict(matches)}
+        )
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['GET', 'POST'], detail=False, url_path='multi-get')
+    def multi_get(self, request):
+        """ Return many recipes by ID in the requested order """
+        if request.method == 'GET':
+            ids = request.query_params.get('ids', '')
+            data = {'ids': [str_id for str_id in ids.split(',') if str_id]}
+        else:
+            data = request.data
+
+        query = serializers.RecipeMultiGetSerializer(data=data)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = list(dict.fromkeys(query.validated_data['ids']))
+        recipes = Recipe.objects\
+            .filter(user=request.user)\
+            .prefetch_related('tags', 'ingredients')\
+            .in_bulk(ids)
+
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in ids if recipe_id in recipes],
+            many=True
+        )
+
+        return Response({
+            'results': serializer.data,
+            'missing': [recipe_id for recipe_id in ids
+                        if recipe_id not in recipes],
+        }, status=status.HTTP_200_OK)
+
+    def select_for_bulk(self, data):
+        """ Return the ids of the recipes selected by a bulk action """
+        return bulk.select(
+            self.request.user, ids=data.get('ids'), **data.get('filter', {})
+        )
+
+    @action(methods=['POST'], detail=False, url_path='bulk-update')
+    def bulk_update(self, request):
+        """ Update many recipes at once and return the affected counts """
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = serializer.validated_data
+        counts = bulk.update(
+            request.user,
+            self.select_for_bulk(data),
+            data.get('set', {}),
+            add={
+                'tags': data.get('add_tags'),
+                'ingredients': data.get('add_ingredients'),
+            },
+            remove={
+                'tags': data.get('remove_tags'),
+                'ingredients': data.get('remove_ingredients'),
+            }
+        )
+
+        return Response(counts, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """ Delete many recipes at once and return how many were deleted """
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        deleted = bulk.delete(
+            request.user,
+            self.select_for_bulk(serializer.validated_data)
+        )
+
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+class ChangesView(DatabaseRoutingMixin, views.APIView):
+    """ List the recipes, tags and ingredients changed since a cursor """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """ Return the next batch of changes for the authenticated user """
+        query = serializers.ChangesQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = sync.changes(
+            request.user,
+            query.validated_data.get('since'),
+            query.validated_data['limit']
+        )
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class StatsView(DatabaseRoutingMixin, views.APIView):
+    """ Show the recipe statistics of the authenticated user """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """ Return recipe count, averages and most used tags """
+        query = serializers.StatsQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = stats.summary(request.user, query.validated_data['top'])
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class RecipeImageView(DatabaseRoutingMixin, views.APIView):
+    """ Serve recipe images to the users owning the recipes """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, path):
+        """ Return the image if one of the user's recipes has it """
+        if not Recipe.objects.filter(user=request.user, image=path).exists():
+            raise Http404('No such image.')
+
+        return media.serve(
+            request,
+            Recipe._meta.get_field('image').storage,
+            path
+        )